@@ -0,0 +1,281 @@
+"""Stand-in package index serving distributions from local directories.
+
+This implements just enough of the simple repository API (PEP 503, and the
+JSON form from PEP 691) for pip to install from it, and of the legacy upload
+API for Twine to upload to it, so benchmarks do not depend on the network (or
+PyPI's response time).
+
+Run this as a script to serve directories manually::
+
+    python benchmarks/_index.py DIRECTORY [--uploads DIRECTORY]
+"""
+
+import argparse
+import contextlib
+import email.message
+import email.parser
+import email.policy
+import hashlib
+import html
+import http.server
+import json
+import pathlib
+import re
+import shutil
+import threading
+import urllib.parse
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+_SIMPLE_JSON = "application/vnd.pypi.simple.v1+json"
+
+
+def _canonicalize(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def _get_project_name(filename: str) -> str:
+    if filename.endswith(".whl"):
+        return filename.split("-", 1)[0]
+    for suffix in (".tar.gz", ".zip"):
+        if filename.endswith(suffix):
+            return filename[: -len(suffix)].rsplit("-", 1)[0]
+    raise ValueError(filename)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    server: "_IndexServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_links(self, title: str, links: Dict[str, str]):
+        anchors = "".join(
+            f'<a href="{html.escape(href)}">{html.escape(text)}</a><br>\n'
+            for text, href in links.items()
+        )
+        body = (
+            f"<!DOCTYPE html>\n<html><head><title>{html.escape(title)}"
+            f"</title></head><body>\n{anchors}</body></html>\n"
+        )
+        self._send(200, "text/html", body.encode("utf-8"))
+
+    def _send_json(self, data: Dict[str, Any]):
+        body = json.dumps(data).encode("utf-8")
+        self._send(200, _SIMPLE_JSON, body)
+
+    def _wants_json(self) -> bool:
+        # Good enough for pip and Setl, which both prefer JSON if they ask.
+        return _SIMPLE_JSON in self.headers.get("Accept", "")
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        parts = [urllib.parse.unquote(p) for p in path.split("/") if p]
+        projects = self.server.list_projects()
+        if parts == ["simple"]:
+            links = {name: f"/simple/{name}/" for name in sorted(projects)}
+            self._send_links("Simple index", links)
+        elif len(parts) == 2 and parts[0] == "simple":
+            files = projects.get(_canonicalize(parts[1]))
+            if files is None:
+                self._send(404, "text/plain", b"Not Found")
+                return
+            if self._wants_json():
+                entries = [
+                    {
+                        "filename": f.name,
+                        "url": f"/files/{f.name}",
+                        "hashes": {"sha256": self.server.hash_file(f)},
+                    }
+                    for f in files
+                ]
+                meta = {"api-version": "1.0"}
+                self._send_json(
+                    {
+                        "meta": meta,
+                        "name": _canonicalize(parts[1]),
+                        "files": entries,
+                    }
+                )
+                return
+            links = {
+                f.name: f"/files/{f.name}#sha256={self.server.hash_file(f)}"
+                for f in files
+            }
+            self._send_links(f"Links for {parts[1]}", links)
+        elif len(parts) == 2 and parts[0] == "files":
+            target = next(
+                (
+                    f
+                    for fs in projects.values()
+                    for f in fs
+                    if f.name == parts[1]
+                ),
+                pathlib.Path(),
+            )
+            if not target.is_file():
+                self._send(404, "text/plain", b"Not Found")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(target.stat().st_size))
+            self.end_headers()
+            with target.open("rb") as f:
+                shutil.copyfileobj(f, self.wfile)
+        else:
+            self._send(404, "text/plain", b"Not Found")
+
+    def _read_form(self) -> Dict[str, email.message.EmailMessage]:
+        length = int(self.headers["Content-Length"])
+        content_type = self.headers["Content-Type"]
+        data = f"Content-Type: {content_type}\r\n\r\n".encode("latin-1")
+        data += self.rfile.read(length)
+        parser = email.parser.BytesParser(policy=email.policy.HTTP)
+        message = parser.parsebytes(data)
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            fields[name] = part
+        return fields
+
+    def do_POST(self):
+        path = urllib.parse.urlsplit(self.path).path
+        uploads = self.server.uploads
+        if path.rstrip("/") != "/legacy" or uploads is None:
+            self._send(404, "text/plain", b"Not Found")
+            return
+        if self.server.take_failure():
+            self._send(503, "text/plain", b"Service Unavailable")
+            return
+
+        fields = self._read_form()
+        content = fields.get("content")
+        if content is None or not content.get_filename():
+            self._send(400, "text/plain", b"Missing content")
+            return
+        filename = content.get_filename()
+        data = content.get_payload(decode=True)
+        digest = fields.get("sha256_digest")
+        expected = digest.get_payload(decode=True).decode() if digest else None
+        if expected and hashlib.sha256(data).hexdigest() != expected:
+            self._send(400, "text/plain", b"Digest mismatch")
+            return
+        target = uploads.joinpath(filename)
+        if "/" in filename or target.exists():
+            self._send(400, "text/plain", b"File already exists")
+            return
+        target.write_bytes(data)
+        self._send(200, "text/plain", b"OK")
+
+
+class _IndexServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        directory: pathlib.Path,
+        uploads: Optional[pathlib.Path],
+        fail_uploads: int,
+        port: int = 0,
+    ):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.directory = directory
+        self.uploads = uploads
+        self._hashes: Dict[Tuple[pathlib.Path, int, int], str] = {}
+        self._failures = fail_uploads
+        self._lock = threading.Lock()
+
+    def take_failure(self) -> bool:
+        """Whether the next upload should fail, to exercise retries.
+        """
+        with self._lock:
+            if self._failures <= 0:
+                return False
+            self._failures -= 1
+            return True
+
+    def list_projects(self) -> Dict[str, List[pathlib.Path]]:
+        projects: Dict[str, List[pathlib.Path]] = {}
+        directories = [self.directory]
+        if self.uploads is not None:
+            directories.append(self.uploads)
+        for path in sorted(p for d in directories for p in d.iterdir()):
+            try:
+                name = _get_project_name(path.name)
+            except ValueError:
+                continue
+            projects.setdefault(_canonicalize(name), []).append(path)
+        return projects
+
+    def hash_file(self, path: pathlib.Path) -> str:
+        # Uploaded files may be replaced, so the stat is part of the key.
+        stat = path.stat()
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        try:
+            return self._hashes[key]
+        except KeyError:
+            pass
+        h = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+        digest = self._hashes[key] = h.hexdigest()
+        return digest
+
+
+@contextlib.contextmanager
+def serve_index(
+    directory: pathlib.Path,
+    uploads: Optional[pathlib.Path] = None,
+    fail_uploads: int = 0,
+) -> Iterator[str]:
+    """Serve distributions in ``directory`` in a background thread.
+
+    Yields the server's base URL. The simple index is at ``simple/`` (to be
+    used as pip's index URL), and uploads are accepted at ``legacy/``.
+
+    :param uploads: Where uploaded files are stored. Files in it are also
+        served in the index. Uploads are rejected if this is not given.
+    :param fail_uploads: Number of uploads to fail (with 503) before
+        accepting any, to exercise retries.
+    """
+    server = _IndexServer(directory, uploads, fail_uploads)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address[:2]
+        yield f"http://{host}:{port}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", type=pathlib.Path)
+    parser.add_argument("--uploads", type=pathlib.Path, default=None)
+    parser.add_argument("--fail-uploads", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8000)
+    options = parser.parse_args(argv)
+
+    server = _IndexServer(
+        options.directory, options.uploads, options.fail_uploads, options.port
+    )
+    host, port = server.server_address[:2]
+    print(f"Index at http://{host}:{port}/simple/")
+    if options.uploads:
+        print(f"Upload to http://{host}:{port}/legacy/")
+    with server:
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import setuptools
+
+MODULES = ["alpha", "beta", "gamma"]
+
+SOURCE_TEMPLATES = ["src/cext_fixture/_{}.c", "src/cext_fixture/_{}_impl.c"]
+
+setuptools.setup(
+    name="cext-fixture",
+    version="1.0",
+    description="Project with C extensions configured with setup.py.",
+    long_description="Benchmark fixture for Setl.",
+    long_description_content_type="text/plain",
+    package_dir={"": "src"},
+    packages=["cext_fixture"],
+    ext_modules=[
+        setuptools.Extension(
+            f"cext_fixture._{name}",
+            [template.format(name) for template in SOURCE_TEMPLATES],
+        )
+        for name in MODULES
+    ],
+)
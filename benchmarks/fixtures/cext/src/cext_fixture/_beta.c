@@ -0,0 +1,27 @@
+#include <Python.h>
+
+long beta_sum(long n);
+
+static PyObject *
+sum(PyObject *self, PyObject *args)
+{
+    long n;
+    if (!PyArg_ParseTuple(args, "l", &n))
+        return NULL;
+    return PyLong_FromLong(beta_sum(n));
+}
+
+static PyMethodDef methods[] = {
+    {"sum", sum, METH_VARARGS, "Sum integers below n."},
+    {NULL, NULL, 0, NULL},
+};
+
+static struct PyModuleDef module = {
+    PyModuleDef_HEAD_INIT, "_beta", NULL, -1, methods,
+};
+
+PyMODINIT_FUNC
+PyInit__beta(void)
+{
+    return PyModule_Create(&module);
+}
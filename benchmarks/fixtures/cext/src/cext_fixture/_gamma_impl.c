@@ -0,0 +1,8 @@
+long
+gamma_sum(long n)
+{
+    long total = 0;
+    for (long i = 0; i < n; i++)
+        total += i;
+    return total;
+}
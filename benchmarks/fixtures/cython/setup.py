@@ -0,0 +1,18 @@
+import glob
+
+import setuptools
+
+from Cython.Build import cythonize
+
+setuptools.setup(
+    name="cython-fixture",
+    version="1.0",
+    description="Project with many Cython modules.",
+    long_description="Benchmark fixture for Setl.",
+    long_description_content_type="text/plain",
+    package_dir={"": "src"},
+    packages=["cython_fixture"],
+    ext_modules=cythonize(
+        sorted(glob.glob("src/cython_fixture/*.pyx")), language_level=3,
+    ),
+)
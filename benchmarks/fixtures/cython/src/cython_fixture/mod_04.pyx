@@ -0,0 +1,6 @@
+def fib(int n):
+    cdef int i
+    cdef long a = 0, b = 1
+    for i in range(n):
+        a, b = b, a + b
+    return a + 4
@@ -0,0 +1,116 @@
+"""Check Setl's CLI starts up within a time budget.
+
+Usage::
+
+    python benchmarks/importtime.py [--budget MS]
+
+The CLI module is imported and its parser built in a fresh interpreter with
+``-X importtime``, and the cumulative import time of ``setl.cmds`` (the best
+of several runs) is compared against the budget. Subcommand dependencies
+must also not be imported until a subcommand is run.
+
+Exits with an error if either check fails. ``tests/test_importtime.py`` runs
+the same checks in the test suite.
+"""
+
+import argparse
+import os
+import pathlib
+import subprocess
+import sys
+
+from typing import List, Optional
+
+
+SOURCE_DIR = pathlib.Path(__file__).resolve().parent.parent.joinpath("src")
+
+# Maximum cumulative import time of setl.cmds, in milliseconds.
+BUDGET = 50
+
+# Modules that should only be imported when a subcommand is run.
+DEFERRED_MODULES = [
+    "cached_property",
+    "concurrent.futures",
+    "packaging",
+    "pep517",
+    "setl.projects",
+    "subprocess",
+    "toml",
+]
+
+_CODE = """
+import sys
+import setl.cmds
+setl.cmds.get_parser()
+print("\\n".join(sys.modules))
+"""
+
+
+def run_import() -> subprocess.CompletedProcess:
+    """Import setl.cmds and build the parser in a fresh interpreter.
+
+    Import times are in stderr, and imported modules in stdout.
+    """
+    environ = os.environ.copy()
+    environ["PYTHONPATH"] = os.fspath(SOURCE_DIR)
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CODE],
+        env=environ,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+
+
+def get_import_time(result: subprocess.CompletedProcess) -> float:
+    """Find the cumulative import time of setl.cmds in milliseconds.
+    """
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        _, _, fields = line.partition(":")
+        parts = [p.strip() for p in fields.split("|")]
+        if len(parts) == 3 and parts[2] == "setl.cmds":
+            return int(parts[1]) / 1000
+    raise ValueError("setl.cmds not found in -X importtime output")
+
+
+def is_imported(result: subprocess.CompletedProcess, name: str) -> bool:
+    """Whether a module (or any of its submodules) was imported.
+    """
+    return any(
+        m == name or m.startswith(f"{name}.") for m in result.stdout.split()
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=BUDGET,
+        help="Maximum import time in milliseconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Number of runs; the fastest is used (default: %(default)s)",
+    )
+    options = parser.parse_args(argv)
+
+    results = [run_import() for _ in range(options.runs)]
+    best = min(get_import_time(r) for r in results)
+    print(f"setl.cmds imported in {best:.1f}ms (budget {options.budget}ms)")
+
+    unexpected = [n for n in DEFERRED_MODULES if is_imported(results[0], n)]
+    for name in unexpected:
+        print(f"{name} imported before a subcommand is run")
+
+    if best > options.budget or unexpected:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
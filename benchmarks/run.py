@@ -0,0 +1,429 @@
+"""Measure how long Setl commands take on fixture projects.
+
+Usage::
+
+    python benchmarks/run.py prepare
+    python benchmarks/run.py run --output results.json
+    python benchmarks/run.py compare base.json results.json
+
+See README.rst in this directory for details.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import pathlib
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from _index import serve_index
+
+
+BENCHMARKS_DIR = pathlib.Path(__file__).resolve().parent
+
+FIXTURES_DIR = BENCHMARKS_DIR.joinpath("fixtures")
+
+SOURCE_DIR = BENCHMARKS_DIR.parent.joinpath("src")
+
+DEFAULT_WHEELS_DIR = BENCHMARKS_DIR.joinpath(".wheels")
+
+# Distributions the stand-in index needs to serve for the fixtures.
+INDEX_REQUIREMENTS = ["setuptools", "wheel", "Cython", "idna"]
+
+# Setl arguments, and commands to run (untimed) before each measurement.
+# "{upload_url}" is replaced by the stand-in index's upload URL.
+COMMANDS = {
+    "build": (["build"], []),
+    "develop": (["develop"], []),
+    "clean": (["clean"], [["build"]]),
+    "publish": (["publish", "--no-upload"], []),
+    "upload": (["publish", "--repository-url", "{upload_url}"], []),
+}
+
+# Run Setl, counting subprocesses it starts with an audit hook.
+_BOOTSTRAP = """
+import atexit, os, sys
+count = [0]
+def hook(event, args):
+    if event in ("subprocess.Popen", "os.posix_spawn", "os.system"):
+        count[0] += 1
+def report():
+    with open(os.environ["SETL_BENCH_COUNT"], "w") as f:
+        f.write(str(count[0]))
+sys.addaudithook(hook)
+atexit.register(report)
+from setl.__main__ import main
+sys.exit(main())
+"""
+
+# Variables changing Setl's behavior, removed so results are comparable.
+_ISOLATED_VARIABLES = [
+    "SETL_OFFLINE",
+    "SETL_PYTHON",
+    "SETL_SHARED_ENVS",
+    "SETL_WHEELHOUSE",
+    "VIRTUAL_ENV",
+]
+
+
+class BenchmarkFailed(Exception):
+    pass
+
+
+def _get_peak_rss(rusage) -> int:
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere.
+    if sys.platform == "darwin":
+        return rusage.ru_maxrss
+    return rusage.ru_maxrss * 1024
+
+
+def _wait(proc: subprocess.Popen) -> Optional[int]:
+    """Wait for the process, and return its peak RSS if possible.
+
+    The peak RSS covers the process and its descendants.
+    """
+    if not hasattr(os, "wait4"):
+        proc.wait()
+        return None
+    _, status, rusage = os.wait4(proc.pid, 0)
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    return _get_peak_rss(rusage)
+
+
+class _Workspace:
+    """A fresh copy of a fixture, with empty caches and a target venv."""
+
+    def __init__(self, root: pathlib.Path, fixture: str, url: str):
+        self.root = root
+        self.project = root.joinpath("project")
+        self.venv = root.joinpath("venv")
+        self.log = root.joinpath("setl.log")
+
+        shutil.copytree(FIXTURES_DIR.joinpath(fixture), self.project)
+
+        self.environ = {
+            k: v for k, v in os.environ.items() if k not in _ISOLATED_VARIABLES
+        }
+        self.environ.update(
+            {
+                "PIP_CACHE_DIR": os.fspath(root.joinpath("pip-cache")),
+                "PIP_DISABLE_PIP_VERSION_CHECK": "1",
+                "PIP_INDEX_URL": f"{url}simple/",
+                "TWINE_USERNAME": "benchmark",
+                "TWINE_PASSWORD": "benchmark",
+                "PYTHONPATH": os.fspath(SOURCE_DIR),
+                "SETL_BENCH_COUNT": os.fspath(root.joinpath("count")),
+                "SETL_CACHE_DIR": os.fspath(root.joinpath("setl-cache")),
+            }
+        )
+
+    def create_venv(self, python: str):
+        subprocess.check_call(
+            [python, "-m", "venv", os.fspath(self.venv)],
+            stdout=subprocess.DEVNULL,
+        )
+
+    @property
+    def python(self) -> pathlib.Path:
+        if os.name == "nt":
+            return self.venv.joinpath("Scripts", "python.exe")
+        return self.venv.joinpath("bin", "python")
+
+    def wait_for_trash(self, timeout: float = 60):
+        """Wait for files Setl deletes in the background to be gone.
+
+        Otherwise deletion competes with the next measurement, and the
+        workspace may be removed while it is still being deleted.
+        """
+        trash = self.project.joinpath("build", ".setl-trash")
+        deadline = time.monotonic() + timeout
+        while trash.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def run(self, args: Sequence[str]) -> Dict[str, Any]:
+        """Run Setl with ``args`` and measure it.
+        """
+        self.wait_for_trash()
+        cmd = [
+            sys.executable,
+            "-c",
+            _BOOTSTRAP,
+            "--python",
+            os.fspath(self.python),
+            *args,
+        ]
+        with self.log.open("wb") as log:
+            start = time.perf_counter()
+            proc = subprocess.Popen(
+                cmd,
+                cwd=self.project,
+                env=self.environ,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+            peak_rss = _wait(proc)
+            wall = time.perf_counter() - start
+        if proc.returncode:
+            output = self.log.read_text("utf-8", "replace")
+            raise BenchmarkFailed(f"setl {' '.join(args)} failed\n{output}")
+        count_path = pathlib.Path(self.environ["SETL_BENCH_COUNT"])
+        return {
+            "wall": wall,
+            "subprocesses": int(count_path.read_text()),
+            "peak_rss": peak_rss,
+        }
+
+
+def _summarize(measurements: List[Dict[str, Any]]) -> Dict[str, Any]:
+    rss = [m["peak_rss"] for m in measurements if m["peak_rss"] is not None]
+    return {
+        "wall": [m["wall"] for m in measurements],
+        "median": statistics.median(m["wall"] for m in measurements),
+        "subprocesses": max(m["subprocesses"] for m in measurements),
+        "peak_rss": max(rss) if rss else None,
+    }
+
+
+def _clear(directory: pathlib.Path):
+    for path in directory.iterdir():
+        path.unlink()
+
+
+def _benchmark(
+    fixture: str,
+    command: str,
+    python: str,
+    url: str,
+    uploads: pathlib.Path,
+    repeat: int,
+) -> Dict[str, Any]:
+    args, setup = COMMANDS[command]
+    args = [a.format(upload_url=f"{url}legacy/") for a in args]
+    with tempfile.TemporaryDirectory() as td:
+        workspace = _Workspace(pathlib.Path(td), fixture, url)
+        workspace.create_venv(python)
+
+        for setup_args in setup:
+            workspace.run(setup_args)
+        _clear(uploads)
+        cold = workspace.run(args)
+
+        warm = []
+        for _ in range(repeat):
+            for setup_args in setup:
+                workspace.run(setup_args)
+            _clear(uploads)
+            warm.append(workspace.run(args))
+        workspace.wait_for_trash()
+
+    return {
+        "fixture": fixture,
+        "command": command,
+        "cold": _summarize([cold]),
+        "warm": _summarize(warm),
+    }
+
+
+def _get_revision() -> Optional[str]:
+    with contextlib.suppress(OSError, subprocess.CalledProcessError):
+        output = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=BENCHMARKS_DIR,
+            stderr=subprocess.DEVNULL,
+        )
+        return output.decode().strip()
+    return None
+
+
+def _handle_prepare(options) -> int:
+    options.wheels.mkdir(parents=True, exist_ok=True)
+    subprocess.check_call(
+        [
+            options.python,
+            "-m",
+            "pip",
+            "download",
+            "--only-binary=:all:",
+            "--dest",
+            os.fspath(options.wheels),
+            *INDEX_REQUIREMENTS,
+        ]
+    )
+    return 0
+
+
+def _iter_results(options) -> Iterator[Dict[str, Any]]:
+    fixtures = options.fixtures or sorted(
+        p.name for p in FIXTURES_DIR.iterdir() if p.is_dir()
+    )
+    commands = options.commands or list(COMMANDS)
+    with contextlib.ExitStack() as stack:
+        uploads = pathlib.Path(
+            stack.enter_context(tempfile.TemporaryDirectory())
+        )
+        url = stack.enter_context(serve_index(options.wheels, uploads))
+        for fixture in fixtures:
+            for command in commands:
+                print(f"{fixture} {command}...", end=" ", flush=True)
+                result = _benchmark(
+                    fixture,
+                    command,
+                    options.python,
+                    url,
+                    uploads,
+                    options.repeat,
+                )
+                print(
+                    f"cold {result['cold']['median']:.2f}s, "
+                    f"warm {result['warm']['median']:.2f}s"
+                )
+                yield result
+
+
+def _handle_run(options) -> int:
+    if not options.wheels.is_dir():
+        print(f"{options.wheels} not found; run 'prepare' first")
+        return 1
+    try:
+        results = list(_iter_results(options))
+    except BenchmarkFailed as e:
+        print(f"\n{e}", file=sys.stderr)
+        return 1
+    data = {
+        "revision": _get_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": options.repeat,
+        "results": results,
+    }
+    if options.output:
+        with options.output.open("w", encoding="utf8") as f:
+            json.dump(data, f, indent=2)
+    else:
+        json.dump(data, sys.stdout, indent=2)
+    return 0
+
+
+def _handle_compare(options) -> int:
+    def load(path: pathlib.Path) -> Dict[Any, Dict[str, Any]]:
+        with path.open(encoding="utf8") as f:
+            results = json.load(f)["results"]
+        return {(r["fixture"], r["command"]): r for r in results}
+
+    base = load(options.base)
+    head = load(options.head)
+    regressed = False
+    rows = [("Benchmark", "Base", "Head", "Change")]
+    for key in sorted(base.keys() & head.keys()):
+        for phase in ("cold", "warm"):
+            before = base[key][phase]["median"]
+            after = head[key][phase]["median"]
+            change = (after - before) / before
+            marker = ""
+            if change > options.threshold:
+                regressed = True
+                marker = " !"
+            rows.append(
+                (
+                    f"{key[0]} {key[1]} ({phase})",
+                    f"{before:.2f}s",
+                    f"{after:.2f}s",
+                    f"{change:+.0%}{marker}",
+                )
+            )
+    widths = [max(len(row[i]) for row in rows) for i in range(4)]
+    for a, b, c, d in rows:
+        print(
+            f"{a:<{widths[0]}}  {b:>{widths[1]}}  {c:>{widths[2]}}  "
+            f"{d:>{widths[3]}}"
+        )
+    return 1 if regressed else 0
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="action", metavar="ACTION")
+    subparsers.required = True
+
+    for name, func, description in [
+        ("prepare", _handle_prepare, "Download distributions for the index"),
+        ("run", _handle_run, "Run benchmarks"),
+    ]:
+        sub = subparsers.add_parser(name, description=description)
+        sub.set_defaults(func=func)
+        sub.add_argument(
+            "--python",
+            default=sys.executable,
+            help="Interpreter to build fixtures against (default: current)",
+        )
+        sub.add_argument(
+            "--wheels",
+            type=pathlib.Path,
+            default=DEFAULT_WHEELS_DIR,
+            help="Directory of distributions served by the stand-in index",
+        )
+
+    run = subparsers.choices["run"]
+    run.add_argument(
+        "--fixture",
+        dest="fixtures",
+        action="append",
+        choices=sorted(p.name for p in FIXTURES_DIR.iterdir() if p.is_dir()),
+        help="Fixture to benchmark; repeat for more (default: all)",
+    )
+    run.add_argument(
+        "--command",
+        dest="commands",
+        action="append",
+        choices=list(COMMANDS),
+        help="Command to benchmark; repeat for more (default: all)",
+    )
+    run.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of warm runs (default: %(default)s)",
+    )
+    run.add_argument(
+        "--output",
+        type=pathlib.Path,
+        default=None,
+        help="Write results to this file instead of stdout",
+    )
+
+    compare = subparsers.add_parser(
+        "compare", description="Compare results from two runs"
+    )
+    compare.set_defaults(func=_handle_compare)
+    compare.add_argument("base", type=pathlib.Path)
+    compare.add_argument("head", type=pathlib.Path)
+    compare.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help=(
+            "Exit with an error if a median wall time grows by more than this "
+            "fraction (default: %(default)s)"
+        ),
+    )
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    options = get_parser().parse_args(argv)
+    return options.func(options)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
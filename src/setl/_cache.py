@@ -0,0 +1,105 @@
+__all__ = ["get_cache_dir", "read_json", "trim_cache", "write_json"]
+
+import contextlib
+import json
+import os
+import pathlib
+import shutil
+import sys
+import tempfile
+
+from typing import Any, Callable, Iterable
+
+
+def get_cache_dir() -> pathlib.Path:
+    """Get the per-user directory to store Setl's caches.
+
+    * If the ``SETL_CACHE_DIR`` environment variable is set, use it.
+    * Otherwise use the platform's conventional cache location.
+    """
+    value = os.environ.get("SETL_CACHE_DIR")
+    if value:
+        return pathlib.Path(value)
+    home = pathlib.Path.home()
+    if os.name == "nt":
+        local = os.environ.get("LOCALAPPDATA")
+        base = pathlib.Path(local) if local else home.joinpath("AppData/Local")
+        return base.joinpath("setl", "Cache")
+    if sys.platform == "darwin":
+        return home.joinpath("Library", "Caches", "setl")
+    xdg = os.environ.get("XDG_CACHE_HOME")
+    base = pathlib.Path(xdg) if xdg else home.joinpath(".cache")
+    return base.joinpath("setl")
+
+
+def read_json(path: pathlib.Path) -> Any:
+    """Read a cache entry, returning None if it is missing or unreadable.
+    """
+    try:
+        with path.open(encoding="utf8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path: pathlib.Path, data: Any) -> None:
+    """Write a cache entry atomically.
+
+    Caches are an optimization, so failing to write one (e.g. a read-only
+    home directory) is silently ignored.
+    """
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    except OSError:
+        return
+    try:
+        # Serialize in one go, which is much faster than `json.dump()` for
+        # large entries.
+        content = json.dumps(data)
+        with os.fdopen(fd, "w", encoding="utf8") as f:
+            f.write(content)
+        os.replace(temp, path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.unlink(temp)
+
+
+def trim_cache(
+    paths: Iterable[pathlib.Path],
+    max_size: int,
+    get_size: Callable[[pathlib.Path], int] = lambda path: 1,
+) -> int:
+    """Remove least recently used cache entries until under the size cap.
+
+    Entries (files or directories) should be touched when used, so the
+    modification time is when they were last used.
+
+    :param get_size: Size of an entry. Each entry counts as 1 by default, so
+        ``max_size`` is the number of entries to keep.
+    :returns: Number of entries removed.
+    """
+    entries = []
+    total = 0
+    for path in paths:
+        try:
+            mtime = path.stat().st_mtime
+            size = get_size(path)
+        except OSError:
+            continue
+        entries.append((mtime, size, path))
+        total += size
+    entries.sort(key=lambda entry: entry[0])
+
+    removed = 0
+    for _, size, path in entries:
+        if total <= max_size:
+            break
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            with contextlib.suppress(OSError):
+                path.unlink()
+        removed += 1
+        total -= size
+    return removed
@@ -0,0 +1,15 @@
+__all__ = ["get_flag"]
+
+import os
+
+
+_FALSY = {"", "0", "false", "no", "off"}
+
+
+def get_flag(name: str) -> bool:
+    """Whether a flag is turned on by an environment variable.
+
+    Unset, empty, and common negative values (e.g. ``0`` and ``false``) are
+    considered off; anything else is on.
+    """
+    return os.environ.get(name, "").lower() not in _FALSY
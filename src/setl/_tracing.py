@@ -0,0 +1,132 @@
+"""Record how long each phase takes.
+
+Spans are recorded as "complete" events in the Chrome trace event format, so
+the trace can be viewed in ``chrome://tracing`` or Perfetto. Recording is off
+unless `enable()` is called, so `span()` costs next to nothing normally.
+"""
+
+__all__ = [
+    "add_events",
+    "enable",
+    "format_timings",
+    "get_events",
+    "is_enabled",
+    "set_process_name",
+    "span",
+    "write_trace",
+]
+
+import collections
+import contextlib
+import json
+import os
+import pathlib
+import threading
+import time
+
+from typing import Any, Dict, Iterable, Iterator, List
+
+
+_EVENTS: List[Dict[str, Any]] = []
+
+_ENABLED = False
+
+
+def enable():
+    """Start recording, discarding events recorded so far.
+    """
+    global _ENABLED
+    _ENABLED = True
+    _EVENTS.clear()
+
+
+def is_enabled() -> bool:
+    return _ENABLED
+
+
+@contextlib.contextmanager
+def span(name: str, **args: Any) -> Iterator[None]:
+    """Record the time spent in the block.
+
+    :param args: Additional information to show with the span in the trace.
+        Values must be JSON-serializable.
+    """
+    if not _ENABLED:
+        yield
+        return
+    # Wall clock time so timestamps are comparable across processes.
+    start = time.time_ns()
+    try:
+        yield
+    finally:
+        end = time.time_ns()
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": start / 1000,
+            "dur": (end - start) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        _EVENTS.append(event)
+
+
+def set_process_name(name: str):
+    """Label the current process in the trace.
+    """
+    if not _ENABLED:
+        return
+    _EVENTS.append(
+        {
+            "name": "process_name",
+            "ph": "M",
+            "pid": os.getpid(),
+            "args": {"name": name},
+        }
+    )
+
+
+def get_events() -> List[Dict[str, Any]]:
+    return list(_EVENTS)
+
+
+def add_events(events: Iterable[Dict[str, Any]]):
+    """Add events recorded elsewhere, e.g. in a worker process.
+    """
+    if _ENABLED:
+        _EVENTS.extend(events)
+
+
+def write_trace(path: pathlib.Path):
+    data = {"traceEvents": _EVENTS, "displayTimeUnit": "ms"}
+    with path.open("w", encoding="utf8") as f:
+        json.dump(data, f)
+
+
+def format_timings() -> str:
+    """Summarize recorded spans by name, most time-consuming first.
+
+    Times are inclusive, i.e. a span's time includes spans nested in it.
+    """
+    counts: Dict[str, int] = collections.Counter()
+    totals: Dict[str, float] = collections.defaultdict(float)
+    for event in _EVENTS:
+        if event["ph"] != "X":
+            continue
+        counts[event["name"]] += 1
+        totals[event["name"]] += event["dur"] / 1000000
+
+    rows = [("Phase", "Calls", "Total", "Mean")]
+    for name, total in sorted(totals.items(), key=lambda p: (-p[1], p[0])):
+        count = counts[name]
+        rows.append(
+            (name, str(count), f"{total:.3f}s", f"{total / count:.3f}s")
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(4)]
+    return "\n".join(
+        f"{a:<{widths[0]}}  {b:>{widths[1]}}  {c:>{widths[2]}}  "
+        f"{d:>{widths[3]}}"
+        for a, b, c, d in rows
+    )
@@ -1,20 +1,37 @@
+from __future__ import annotations
+
 __all__ = ["dispatch"]
 
 import argparse
-import dataclasses
 import logging
 import os
 import pathlib
 import shutil
 import sys
 
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, List, Optional
 
+from setl import _tracing
 from setl._logging import configure_logging
 from setl.errs import Error
-from setl.projects import InterpreterNotFound, Project, PyUnavailable
 
-from . import build, clean, develop, publish, setuppy
+# Subcommand modules only import Setl's projects (and their dependencies) when
+# the subcommand is run, so they are cheap to import.
+from . import (
+    build,
+    check,
+    clean,
+    develop,
+    dist,
+    fingerprint,
+    publish,
+    setuppy,
+    watch,
+    wheelhouse,
+)
+
+if TYPE_CHECKING:
+    from setl.projects import Project
 
 
 logger = logging.getLogger(__name__)
@@ -54,8 +71,8 @@ def _find_installed_venv_python() -> Optional[pathlib.Path]:
     return None
 
 
-def _get_python_kwargs() -> Dict[str, Any]:
-    """Additional flags for the ``--python`` option.
+def _get_default_python() -> Optional[str]:
+    """Default value for the ``--python`` option.
 
     * If the ``SETL_PYTHON`` environment variable is set, use it as default.
     * If setl is running in a virtual environment context, default to the
@@ -70,18 +87,69 @@ def _get_python_kwargs() -> Dict[str, Any]:
         or _find_installed_venv_python()
     )
     if default:
-        return {"default": os.fspath(default)}
-    return {"required": True}
+        return os.fspath(default)
+    return None
 
 
 def get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        "--python", help="Target Python executable", **_get_python_kwargs(),
+        "--python",
+        dest="pythons",
+        action="append",
+        metavar="PYTHON",
+        help=(
+            "Target Python executable; repeat to build against multiple "
+            "interpreters"
+        ),
+    )
+    parser.add_argument(
+        "--matrix-jobs",
+        type=int,
+        default=None,
+        metavar="N",
+        help=(
+            "Maximum number of interpreters to build against concurrently "
+            "(default: number of CPUs)"
+        ),
     )
 
-    subparsers = parser.add_subparsers()
-    for sub in [build, clean, develop, publish, setuppy]:
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        default=False,
+        help="Install requirements only from the local wheelhouse",
+    )
+    parser.add_argument(
+        "--trace",
+        type=pathlib.Path,
+        default=None,
+        metavar="PATH",
+        help="Write time spent in each phase to PATH in Chrome trace format",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        default=False,
+        help="Show a summary of time spent in each phase",
+    )
+    parser.set_defaults(
+        matrix=False, own_matrix=False, isolated=False, needs_python=True
+    )
+
+    subparsers = parser.add_subparsers(dest="command")
+    for sub in [
+        build,
+        check,
+        clean,
+        develop,
+        dist,
+        fingerprint,
+        publish,
+        setuppy,
+        watch,
+        wheelhouse,
+    ]:
         sub.get_parser(subparsers)  # type: ignore
 
     return parser
@@ -102,12 +170,16 @@ def _is_project_root(p: pathlib.Path) -> bool:
     return False
 
 
-@dataclasses.dataclass()
 class _ProjectNotFound(Exception):
-    start: pathlib.Path
+    # Not a dataclass, to avoid importing dataclasses on startup.
+    def __init__(self, start: pathlib.Path):
+        super().__init__(start)
+        self.start = start
 
 
 def _find_project() -> Project:
+    from setl.projects import Project
+
     start = pathlib.Path.cwd()
     for path in start.joinpath("__placeholder__").parents:
         if _is_project_root(path):
@@ -118,16 +190,64 @@ def _find_project() -> Project:
 def dispatch(argv: Optional[List[str]]) -> int:
     configure_logging(logging.INFO)  # TODO: Make this configurable.
 
+    parser = get_parser()
+    opts = parser.parse_args(argv)
+
     try:
         project = _find_project()
     except _ProjectNotFound as e:
         logger.error("Project not found from %s", e.start)
         return Error.project_not_found
 
-    opts = get_parser().parse_args(argv)
+    # Commands may only need an interpreter for some of their arguments.
+    needs_python = opts.needs_python
+    if callable(needs_python):
+        needs_python = needs_python(opts)
+
+    if not opts.pythons:
+        default_python = _get_default_python()
+        if not default_python and not needs_python:
+            default_python = sys.executable
+        if not default_python:
+            parser.error("the following arguments are required: --python")
+        opts.pythons = [default_python]
+    opts.python = opts.pythons[0]
+
+    # Set as an environment variable so it propagates to matrix workers.
+    if opts.offline:
+        os.environ["SETL_OFFLINE"] = "1"
+
+    if len(opts.pythons) > 1 and not opts.matrix:
+        parser.error("multiple --python values are not supported here")
+
+    if opts.trace or opts.timings:
+        _tracing.enable()
+        _tracing.set_process_name("setl")
+    try:
+        # Commands building distributions run the matrix themselves, since
+        # only wheels are built against each interpreter.
+        if len(opts.pythons) > 1 and not opts.own_matrix:
+            from ._matrix import run_matrix
+
+            return run_matrix(project, opts, run)[0]
+        return run(project, opts)
+    finally:
+        if opts.trace:
+            _tracing.write_trace(opts.trace)
+        if opts.timings:
+            print(_tracing.format_timings(), file=sys.stderr)
+
+
+def run(project: Project, opts: argparse.Namespace) -> int:
+    """Run the command against ``opts.python``.
+    """
+    from setl.projects import HookFailed, InterpreterNotFound, PyUnavailable
+
+    from ._matrix import MatrixFailed
 
     try:
-        result = opts.func(project, opts)
+        with _tracing.span(f"setl {opts.command}", python=opts.python):
+            result = opts.func(project, opts)
     except InterpreterNotFound as e:
         logger.error("Not a valid interpreter: %r", e.spec)
         return Error.interpreter_not_found
@@ -142,5 +262,12 @@ def dispatch(argv: Optional[List[str]]) -> int:
             url,
         )
         return Error.py_unavailable
+    except HookFailed as e:
+        if e.output:
+            sys.stderr.write(e.output)
+        logger.error("Build backend failed in %s\n%s", e.hook, e.traceback)
+        return Error.backend_hook_failed
+    except MatrixFailed as e:
+        return e.returncode
 
     return result
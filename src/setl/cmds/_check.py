@@ -0,0 +1,230 @@
+"""Check distributions before they are uploaded.
+
+This covers what ``twine check`` does (the long description renders on PyPI),
+and also verifies a wheel's files against its RECORD. Metadata is read from the
+archives directly, without extracting them: a wheel's members are located via
+the zip's central directory, and an sdist is read as a stream until its
+``PKG-INFO`` is found.
+"""
+
+__all__ = ["Report", "check_distribution"]
+
+import base64
+import csv
+import dataclasses
+import email.message
+import email.parser
+import email.policy
+import hashlib
+import io
+import pathlib
+import re
+import tarfile
+import textwrap
+import zipfile
+
+from typing import List, Optional
+
+
+_CHUNK_SIZE = 1 << 16
+
+# Files in .dist-info that cannot be listed in RECORD with hashes.
+_RECORD_EXEMPT = {"RECORD", "RECORD.jws", "RECORD.p7s"}
+
+# Hash algorithms too weak to be used in RECORD, according to PEP 376.
+_WEAK_ALGORITHMS = {"md5", "sha1"}
+
+_WHEEL_METADATA_RE = re.compile(r"^[^/]+\.dist-info/METADATA$")
+
+# Docutils reports, e.g. "<string>:3: (WARNING/2) Title underline too short."
+_DOCUTILS_REPORT_RE = re.compile(
+    r"^<string>:(?P<line>\d*): \((?P<level>[A-Z]+)/\d+\) (?P<message>.*)$",
+)
+
+
+@dataclasses.dataclass()
+class Report:
+    path: pathlib.Path
+    errors: List[str] = dataclasses.field(default_factory=list)
+    warnings: List[str] = dataclasses.field(default_factory=list)
+
+
+class _InvalidDistribution(Exception):
+    pass
+
+
+def _hash_stream(f, algorithm: str) -> str:
+    h = hashlib.new(algorithm)
+    for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+        h.update(chunk)
+    return base64.urlsafe_b64encode(h.digest()).rstrip(b"=").decode("ascii")
+
+
+def _verify_record(zf: zipfile.ZipFile, dist_info: str) -> List[str]:
+    """Verify files in the wheel against its RECORD, one member at a time.
+    """
+    record_name = f"{dist_info}/RECORD"
+    try:
+        content = zf.read(record_name).decode("utf-8")
+    except KeyError:
+        return [f"{record_name} not found"]
+
+    errors = []
+    recorded = set()
+    for row in csv.reader(io.StringIO(content)):
+        if not row:
+            continue
+        name, digest, size = (row + ["", ""])[:3]
+        recorded.add(name)
+        if not digest:
+            if name.rpartition("/")[-1] not in _RECORD_EXEMPT:
+                errors.append(f"{name}: no hash in RECORD")
+            continue
+        algorithm, _, expected = digest.partition("=")
+        algorithm = algorithm.lower()
+        if (
+            algorithm not in hashlib.algorithms_guaranteed
+            or algorithm in _WEAK_ALGORITHMS
+        ):
+            errors.append(f"{name}: unsupported hash {algorithm!r} in RECORD")
+            continue
+        try:
+            info = zf.getinfo(name)
+        except KeyError:
+            errors.append(f"{name}: in RECORD but not in the wheel")
+            continue
+        if size and size != str(info.file_size):
+            errors.append(f"{name}: size does not match RECORD")
+            continue
+        with zf.open(info) as f:
+            if _hash_stream(f, algorithm) != expected:
+                errors.append(f"{name}: hash does not match RECORD")
+
+    for info in zf.infolist():
+        if info.is_dir() or info.filename in recorded:
+            continue
+        errors.append(f"{info.filename}: in the wheel but not in RECORD")
+    return errors
+
+
+def _read_wheel(path: pathlib.Path, report: Report) -> bytes:
+    with zipfile.ZipFile(path) as zf:
+        names = [n for n in zf.namelist() if _WHEEL_METADATA_RE.match(n)]
+        if len(names) != 1:
+            raise _InvalidDistribution("expected exactly one .dist-info")
+        metadata = zf.read(names[0])
+        report.errors.extend(_verify_record(zf, names[0].rpartition("/")[0]))
+    return metadata
+
+
+def _is_pkg_info(name: str) -> bool:
+    parts = name.split("/")
+    return len(parts) == 2 and parts[1] == "PKG-INFO"
+
+
+def _read_sdist(path: pathlib.Path) -> bytes:
+    if path.suffix == ".zip":
+        with zipfile.ZipFile(path) as zf:
+            for name in zf.namelist():
+                if _is_pkg_info(name):
+                    return zf.read(name)
+    else:
+        # Stream mode reads members in order, and stops at PKG-INFO.
+        with tarfile.open(path, "r|*") as tf:
+            for member in tf:
+                if not member.isfile() or not _is_pkg_info(member.name):
+                    continue
+                f = tf.extractfile(member)
+                if f is not None:
+                    return f.read()
+    raise _InvalidDistribution("PKG-INFO not found")
+
+
+def _get_description(message: email.message.Message) -> Optional[str]:
+    description = message.get("Description")
+    if description is None:
+        payload = message.get_payload()
+        if isinstance(payload, str):
+            return payload or None
+        return None
+    # Description in a header is indented (optionally with "|") after the
+    # first line, to be a valid header.
+    first, _, rest = description.partition("\n")
+    rest = re.sub(r"^ {7}\|", "", rest, flags=re.MULTILINE)
+    return f"{first}\n{textwrap.dedent(rest)}"
+
+
+def _check_description(message: email.message.Message, report: Report):
+    description = _get_description(message)
+    content_type = message.get("Description-Content-Type")
+    if content_type is None:
+        report.warnings.append(
+            "Description-Content-Type missing, defaulting to text/x-rst"
+        )
+        content_type = "text/x-rst"
+    if not description or description.rstrip() == "UNKNOWN":
+        report.warnings.append("Description missing")
+        return
+
+    # Only reStructuredText fails to render; other types are always shown.
+    header = email.message.EmailMessage()
+    header["Content-Type"] = content_type
+    if header.get_content_type() in ("text/plain", "text/markdown"):
+        return
+    if header.get_content_type() != "text/x-rst":
+        report.warnings.append(
+            f"Unknown Description-Content-Type {content_type!r}, "
+            f"rendering as text/x-rst"
+        )
+
+    import readme_renderer.rst
+
+    stream = io.StringIO()
+    if readme_renderer.rst.render(description, stream=stream) is not None:
+        return
+    messages = []
+    for line in stream.getvalue().splitlines():
+        match = _DOCUTILS_REPORT_RE.match(line)
+        if match:
+            line = "line {}: {}: {}".format(
+                match.group("line") or "?",
+                match.group("level").capitalize(),
+                match.group("message"),
+            )
+        messages.append(line)
+    report.errors.append(
+        "Description has syntax errors in markup, and would not be "
+        "rendered on PyPI\n" + "\n".join(messages)
+    )
+
+
+def check_distribution(path: pathlib.Path) -> Report:
+    """Check a distribution file.
+
+    Problems that would make PyPI reject the file, or show the description
+    as plain text, are reported as errors.
+    """
+    report = Report(path)
+    try:
+        if path.suffix == ".whl":
+            content = _read_wheel(path, report)
+        else:
+            content = _read_sdist(path)
+    except (_InvalidDistribution, OSError, tarfile.TarError) as e:
+        report.errors.append(str(e))
+        return report
+    except zipfile.BadZipFile as e:
+        report.errors.append(f"not a valid zip file: {e}")
+        return report
+
+    try:
+        text = content.decode("utf-8")
+    except UnicodeDecodeError:
+        report.errors.append("metadata is not valid UTF-8")
+        return report
+    message = email.parser.Parser(policy=email.policy.compat32).parsestr(text)
+    for field in ("Metadata-Version", "Name", "Version"):
+        if not message.get(field):
+            report.errors.append(f"{field} missing from metadata")
+    _check_description(message, report)
+    return report
@@ -0,0 +1,139 @@
+"""Run a command against multiple interpreters concurrently.
+
+Each interpreter gets its own build environment (they are separated by the
+interpreter quintuplet), so commands are run in a process pool. Processes are
+needed instead of threads, because preparing a build environment modifies
+``os.environ``. Runs also build into directories of their own (see
+``isolate_build_dirs()``), so they don't overwrite each other's files.
+"""
+
+from __future__ import annotations
+
+__all__ = ["MatrixFailed", "run_matrix"]
+
+import argparse
+import concurrent.futures
+import copy
+import dataclasses
+import logging
+import os
+import pathlib
+import time
+import traceback
+
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from setl import _tracing
+from setl._logging import configure_logging
+from setl.errs import Error
+
+if TYPE_CHECKING:
+    from setl.projects import Project
+
+
+logger = logging.getLogger(__name__)
+
+Runner = Callable[["Project", argparse.Namespace], int]
+
+
+@dataclasses.dataclass()
+class _Result:
+    python: str
+    returncode: int
+    elapsed: float
+    error: Optional[str]
+    events: List[Dict[str, Any]]
+    outputs: List[pathlib.Path]
+
+
+@dataclasses.dataclass()
+class MatrixFailed(Exception):
+    """Raised by commands if a run in their matrix failed.
+
+    Errors are already logged by the failed runs.
+    """
+
+    returncode: int
+
+
+def _initialize_worker():
+    # Workers started with fork inherit the parent's logging configuration.
+    if not logging.root.handlers:
+        configure_logging(logging.INFO)
+
+
+def _run_one(
+    project: Project, options: argparse.Namespace, run: Runner, python: str
+) -> _Result:
+    options = copy.copy(options)
+    options.python = python
+    options.pythons = [python]
+    options.isolated = True
+    options.outputs = []
+    if options.trace or options.timings:
+        _tracing.enable()
+        _tracing.set_process_name(f"setl ({python})")
+    start = time.perf_counter()
+    try:
+        returncode = run(project, options)
+    except Exception as e:
+        logger.debug("%s", traceback.format_exc())
+        error: Optional[str] = f"{type(e).__name__}: {e}"
+        returncode = Error.unknown
+    else:
+        error = None
+    elapsed = time.perf_counter() - start
+    return _Result(
+        python,
+        returncode,
+        elapsed,
+        error,
+        _tracing.get_events(),
+        options.outputs,
+    )
+
+
+def _format_table(results: List[_Result]) -> str:
+    rows = [("Python", "Result", "Time")]
+    for r in results:
+        if r.returncode == 0:
+            status = "ok"
+        else:
+            status = f"failed ({r.returncode})"
+        if r.error:
+            status = f"{status} {r.error}"
+        rows.append((r.python, status, f"{r.elapsed:.1f}s"))
+    widths = [max(len(row[i]) for row in rows) for i in range(2)]
+    return "\n".join(
+        f"{a:<{widths[0]}}  {b:<{widths[1]}}  {c}".rstrip() for a, b, c in rows
+    )
+
+
+def run_matrix(
+    project: Project, options: argparse.Namespace, run: Runner
+) -> Tuple[int, List[pathlib.Path]]:
+    """Run the command against each of ``options.pythons`` concurrently.
+
+    :param run: Function to run the command for one interpreter. This is
+        sent to worker processes, so it must be importable.
+    :returns: A 2-tuple. The first item is zero if all runs succeed, otherwise
+        the first non-zero return code, in the order of ``options.pythons``.
+        The second item lists files the runs added to ``options.outputs``.
+    """
+    pythons: List[str] = options.pythons
+    jobs = options.matrix_jobs or min(len(pythons), os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs, initializer=_initialize_worker
+    ) as executor:
+        futures = [
+            executor.submit(_run_one, project, options, run, python)
+            for python in pythons
+        ]
+        results = [f.result() for f in futures]
+
+    for result in results:
+        _tracing.add_events(result.events)
+
+    logger.info("%s", _format_table(results))
+    returncode = next((r.returncode for r in results if r.returncode), 0)
+    return returncode, [p for r in results for p in r.outputs]
@@ -0,0 +1,295 @@
+"""Upload distributions to a repository concurrently.
+
+Twine's upload command sends files one at a time. This uses Twine's building
+blocks (settings, repository, and package files) in-process instead, so all
+uploads share one connection pool, and several files are uploaded at a time.
+
+Files already in the repository are skipped, so a failed release can simply be
+published again. The repository's simple index is queried once per project
+before uploading, instead of sending each file only to have it rejected.
+"""
+
+__all__ = ["UploadFailed", "get_index_url", "upload"]
+
+import argparse
+import concurrent.futures
+import dataclasses
+import html.parser
+import logging
+import os
+import pathlib
+import time
+import urllib.parse
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import requests
+import requests.adapters
+
+from packaging.utils import canonicalize_name
+from twine.package import PackageFile
+from twine.repository import Repository
+from twine.settings import Settings
+
+from setl._tracing import span
+
+
+logger = logging.getLogger(__name__)
+
+# Responses worth trying again, since the server may recover.
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Upload URLs whose index is not found by replacing "legacy" with "simple".
+_KNOWN_INDEX_URLS = {
+    "https://upload.pypi.org/legacy/": "https://pypi.org/simple/",
+}
+
+# Prefer the JSON simple API (PEP 691), but accept HTML (PEP 503).
+_SIMPLE_ACCEPT = (
+    "application/vnd.pypi.simple.v1+json, "
+    "application/vnd.pypi.simple.v1+html;q=0.2, "
+    "text/html;q=0.1"
+)
+
+_SIMPLE_JSON = "application/vnd.pypi.simple.v1+json"
+
+
+@dataclasses.dataclass()
+class UploadFailed(Exception):
+    failures: List[Tuple[pathlib.Path, str]]
+
+
+def _configure_pool(repository: Repository, size: int):
+    # Requests keeps up to 10 connections per host by default. Make sure each
+    # concurrent upload can keep its connection.
+    session = repository.session
+    for prefix, adapter in list(session.adapters.items()):
+        session.mount(
+            prefix,
+            requests.adapters.HTTPAdapter(
+                pool_maxsize=max(size, 10),
+                max_retries=getattr(adapter, "max_retries", 0),
+            ),
+        )
+
+
+def get_index_url(repository_url: str) -> Optional[str]:
+    """Guess the simple index URL of a repository from its upload URL.
+    """
+    url = repository_url.rstrip("/") + "/"
+    try:
+        return _KNOWN_INDEX_URLS[url]
+    except KeyError:
+        pass
+    if url.endswith("/legacy/"):
+        return url[: -len("legacy/")] + "simple/"
+    return None
+
+
+class _LinkParser(html.parser.HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.hrefs: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        href = dict(attrs).get("href")
+        if href:
+            self.hrefs.append(href)
+
+
+def _parse_links(text: str) -> Dict[str, Optional[str]]:
+    parser = _LinkParser()
+    parser.feed(text)
+    files = {}
+    for href in parser.hrefs:
+        parts = urllib.parse.urlsplit(href)
+        filename = urllib.parse.unquote(parts.path.rpartition("/")[-1])
+        algorithm, _, digest = parts.fragment.partition("=")
+        files[filename] = digest if algorithm == "sha256" else None
+    return files
+
+
+def _find_existing(
+    session: requests.Session, index_url: str, name: str,
+) -> Dict[str, Optional[str]]:
+    """Find files of a project in the index.
+
+    Returns a mapping of filenames to their SHA256 digests, or None if the
+    index does not provide one.
+    """
+    url = urllib.parse.urljoin(index_url, f"{canonicalize_name(name)}/")
+    response = session.get(url, headers={"Accept": _SIMPLE_ACCEPT})
+    if response.status_code == 404:
+        return {}
+    response.raise_for_status()
+    content_type = response.headers.get("Content-Type", "")
+    if content_type.partition(";")[0].strip() == _SIMPLE_JSON:
+        return {
+            f["filename"]: f.get("hashes", {}).get("sha256")
+            for f in response.json()["files"]
+        }
+    return _parse_links(response.text)
+
+
+def _query_index(
+    repository: Repository, index_url: str, packages: Sequence[PackageFile],
+) -> Dict[str, Optional[str]]:
+    # Only send credentials if the index is on the same host as the upload.
+    same_host = (
+        urllib.parse.urlsplit(index_url).netloc
+        == urllib.parse.urlsplit(repository.url).netloc
+    )
+    session = repository.session if same_host else requests.Session()
+    existing: Dict[str, Optional[str]] = {}
+    try:
+        for name in sorted({p.safe_name for p in packages}):
+            existing.update(_find_existing(session, index_url, name))
+    except (requests.RequestException, ValueError, KeyError) as e:
+        logger.warning(
+            "Failed to check %s for existing files, uploading all: %s",
+            index_url,
+            e,
+        )
+        return {}
+    finally:
+        if not same_host:
+            session.close()
+    return existing
+
+
+def _upload_one(
+    repository: Repository, package: PackageFile, retries: int, backoff: float,
+):
+    """Upload a file, retrying with exponential backoff on failure.
+    """
+    for attempt in range(retries + 1):
+        try:
+            # Twine retries 5xx responses immediately; we back off instead.
+            response = repository.upload(package, max_redirects=1)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise
+            reason = str(e)
+        else:
+            if response.status_code not in _RETRY_STATUSES:
+                break
+            if attempt == retries:
+                break
+            reason = f"{response.status_code} {response.reason}"
+        delay = backoff * 2 ** attempt
+        logger.warning(
+            "Failed to upload %s (%s), retrying in %.1fs",
+            package.basefilename,
+            reason,
+            delay,
+        )
+        time.sleep(delay)
+
+    # Twine refuses to follow redirects on upload; so do we.
+    if response.is_redirect:
+        location = response.headers.get("location", "")
+        raise requests.HTTPError(f"Redirected to {location}")
+    if not response.ok:
+        message = f"{response.status_code} {response.reason}"
+        detail = response.text.strip().splitlines()
+        if detail:
+            message = f"{message}: {detail[0]}"
+        raise requests.HTTPError(message, response=response)
+
+
+def upload(
+    targets: Sequence[pathlib.Path],
+    repository_name: Optional[str],
+    repository_url: Optional[str],
+    jobs: int,
+    index_url: Optional[str] = None,
+    retries: int = 3,
+    backoff: float = 1.0,
+):
+    """Upload distributions to a repository.
+
+    Repository configuration and credentials are resolved by Twine, the same
+    as ``twine upload`` (e.g. ``.pypirc`` and ``TWINE_*`` variables). All
+    files are attempted even if some of them fail.
+
+    Files already in the repository's index with the same SHA256 digest are
+    skipped. A file with the same name but a different digest is a failure.
+
+    :param jobs: Maximum number of files to upload at the same time.
+    :param index_url: The repository's simple index. Guessed from the upload
+        URL if not given.
+    :param retries: Number of times to retry a failed upload.
+    :param backoff: Seconds to wait before the first retry; the wait doubles
+        with each retry.
+    :raises UploadFailed: Any of the files failed to upload.
+    """
+    # Go through Twine's argument parser, which reads the TWINE_* variables.
+    if repository_name:
+        flags = ["--repository", repository_name]
+    elif repository_url:
+        flags = ["--repository-url", repository_url]
+    else:
+        flags = []
+    parser = argparse.ArgumentParser()
+    Settings.register_argparse_arguments(parser)
+    settings = Settings.from_argparse(parser.parse_args(flags))
+    settings.disable_progress_bar = True
+    settings.check_repository_url()
+    repository = settings.create_repository()
+    _configure_pool(repository, jobs)
+
+    packages = [
+        PackageFile.from_filename(os.fspath(t), settings.comment)
+        for t in targets
+    ]
+    if index_url is None:
+        index_url = get_index_url(repository.url)
+    if index_url is None:
+        logger.warning(
+            "Cannot guess the index of %s, not checking for existing files",
+            repository.url,
+        )
+        existing = {}
+    else:
+        with span("query index"):
+            existing = _query_index(repository, index_url, packages)
+
+    failures = []
+    pending = []
+    for target, package in zip(targets, packages):
+        if package.basefilename not in existing:
+            pending.append((target, package))
+            continue
+        # Twine hashes files in chunks when it creates the package file.
+        digest = existing[package.basefilename]
+        if digest is None:  # Let the repository decide.
+            pending.append((target, package))
+        elif digest == package.sha2_digest:
+            logger.info("Skipping %s, already uploaded", target.name)
+        else:
+            failures.append(
+                (
+                    target,
+                    f"A different file with this name is already uploaded "
+                    f"(sha256 {digest}, local {package.sha2_digest})",
+                )
+            )
+
+    # Twine warns when it gets a 5xx response, and tells us to retry. But we
+    # are already retrying; the warning would be confusing.
+    logging.getLogger("twine.repository").setLevel(logging.ERROR)
+
+    with repository.session, concurrent.futures.ThreadPoolExecutor(jobs) as e:
+        futures = [
+            e.submit(_upload_one, repository, package, retries, backoff)
+            for _, package in pending
+        ]
+        for (target, _), future in zip(pending, futures):
+            try:
+                future.result()
+            except requests.RequestException as exc:
+                failures.append((target, str(exc)))
+    if failures:
+        raise UploadFailed(failures)
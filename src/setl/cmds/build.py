@@ -1,7 +1,19 @@
+from __future__ import annotations
+
 import argparse
 import enum
+import logging
+import os
+import typing
+
+if typing.TYPE_CHECKING:
+    from setl.projects import Project
+    from setl.projects.build import BuildEnv
+
 
-from setl.projects import Project
+logger = logging.getLogger(__name__)
+
+_DEFAULT_OBJECT_CACHE_SIZE = 1024  # In megabytes.
 
 
 class Step(enum.Enum):
@@ -13,22 +25,46 @@ class Step(enum.Enum):
     scripts = "build_scripts"
 
 
-def _handle(project: Project, options) -> int:
+def get_steps(options) -> typing.List[Step]:
     if options.steps is None:
-        steps = [Step.info, Step.build]
-    else:
-        steps = options.steps
+        return [Step.info, Step.build]
+    return options.steps
+
 
+def get_object_cache(project: Project, env: BuildEnv, options):
+    if not options.object_cache:
+        return None
+    size = options.object_cache_size * 1024 * 1024
+    return project.get_object_cache(env, size)
+
+
+def _handle(project: Project, options) -> int:
+    commands = [s.value for s in get_steps(options)]
     with project.ensure_build_envdir(options.python) as env:
+        if options.isolated:  # How to isolate depends on the requirements.
+            project.ensure_build_requirements(env)
+            env.enter_context(project.isolate_build_dirs(env))
+        fingerprint = project.get_build_fingerprint(env)
+        if not options.force:
+            commands = project.get_outdated_commands(
+                env, commands, fingerprint
+            )
+        if not commands:
+            logger.info("Everything is up-to-date")
+            return 0
         project.ensure_build_requirements(env)
-        project.setuppy(env, *(s.value for s in steps))
+        project.setuppy(
+            env,
+            *commands,
+            jobs=options.jobs,
+            object_cache=get_object_cache(project, env, options),
+        )
+        project.record_commands(env, commands, fingerprint)
 
     return 0
 
 
-def get_parser(subparsers) -> argparse.ArgumentParser:
-    parser = subparsers.add_parser("build", description="Build the package")
-    parser.set_defaults(steps=None, func=_handle)
+def add_build_arguments(parser: argparse.ArgumentParser):
     parser.add_argument(
         "--info",
         dest="steps",
@@ -64,4 +100,37 @@ def get_parser(subparsers) -> argparse.ArgumentParser:
         const=Step.scripts,
         help="Build scripts",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of source files to compile in parallel "
+        "(default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--object-cache",
+        action="store_true",
+        default=False,
+        help="Restore compiled objects from a cache if sources are unchanged",
+    )
+    parser.add_argument(
+        "--object-cache-size",
+        type=int,
+        default=_DEFAULT_OBJECT_CACHE_SIZE,
+        metavar="MB",
+        help="Maximum size of the object cache (default: %(default)s)",
+    )
+
+
+def get_parser(subparsers) -> argparse.ArgumentParser:
+    parser = subparsers.add_parser("build", description="Build the package")
+    parser.set_defaults(steps=None, func=_handle, matrix=True)
+    add_build_arguments(parser)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        default=False,
+        help="Run build steps even if sources have not changed",
+    )
     return parser
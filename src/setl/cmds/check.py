@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import pathlib
+import typing
+
+from setl._tracing import span
+from setl.errs import Error
+
+from .dist import add_step_arguments, build
+
+if typing.TYPE_CHECKING:
+    from setl.projects import Project
+
+
+logger = logging.getLogger(__name__)
+
+
+def check(targets: typing.Sequence[pathlib.Path]) -> int:
+    """Check distributions concurrently, and log the results.
+    """
+    import concurrent.futures
+
+    from ._check import check_distribution
+
+    jobs = min(len(targets), os.cpu_count() or 1) or 1
+    with span("check", count=len(targets)):
+        with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+            reports = list(executor.map(check_distribution, targets))
+
+    failed = False
+    for report in reports:
+        if report.errors:
+            failed = True
+            logger.error("Checking %s: FAILED", report.path.name)
+        elif report.warnings:
+            logger.info("Checking %s: PASSED with warnings", report.path.name)
+        else:
+            logger.info("Checking %s: PASSED", report.path.name)
+        for message in report.errors:
+            logger.error("%s", message)
+        for message in report.warnings:
+            logger.warning("%s", message)
+    if failed:
+        return Error.check_failed
+    return 0
+
+
+def _handle(project: Project, options) -> int:
+    if options.paths:
+        targets = options.paths
+    else:
+        targets = build(project, options)
+    return check(targets)
+
+
+def _needs_python(options) -> bool:
+    # Given distributions are checked without building anything.
+    return not options.paths
+
+
+def get_parser(subparsers) -> argparse.ArgumentParser:
+    parser = subparsers.add_parser(
+        "check", description="Check distributions before upload"
+    )
+    parser.set_defaults(
+        steps=None,
+        func=_handle,
+        matrix=True,
+        own_matrix=True,
+        needs_python=_needs_python,
+    )
+    add_step_arguments(parser, "Check")
+    parser.add_argument(
+        "paths",
+        type=pathlib.Path,
+        nargs="*",
+        metavar="PATH",
+        help="Distributions to check, instead of building them",
+    )
+    return parser
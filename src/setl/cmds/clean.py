@@ -1,11 +1,16 @@
+from __future__ import annotations
+
 import argparse
+import typing
 
-from setl.projects import Project
+if typing.TYPE_CHECKING:
+    from setl.projects import Project
 
 
 def _handle(project: Project, options) -> int:
     with project.ensure_build_envdir(options.python) as env:
         project.clean(env)
+    project.empty_trash(options.wait)
     return 0
 
 
@@ -14,4 +19,11 @@ def get_parser(subparsers) -> argparse.ArgumentParser:
         "clean", description="Clean up temporary files from build"
     )
     parser.set_defaults(steps=None, func=_handle)
+    parser.add_argument(
+        "--wait",
+        action="store_true",
+        default=False,
+        help="Wait for files to be deleted, instead of deleting them in the "
+        "background",
+    )
     return parser
@@ -1,6 +1,10 @@
+from __future__ import annotations
+
 import argparse
+import typing
 
-from setl.projects import Project
+if typing.TYPE_CHECKING:
+    from setl.projects import Project
 
 
 def _handle(project: Project, options) -> int:
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import argparse
+import copy
+import enum
+import pathlib
+import typing
+
+if typing.TYPE_CHECKING:
+    from setl.projects import Project
+
+
+class Step(enum.Enum):
+    sdist = "sdist"
+    wheel = "wheel"
+
+
+def _build(
+    project: Project, options, steps: typing.List[Step]
+) -> typing.List[pathlib.Path]:
+    with project.ensure_build_envdir(options.python) as env:
+        project.ensure_build_requirements(env)
+        if options.isolated:
+            env.enter_context(project.isolate_build_dirs(env))
+        targets = project.build_distributions(
+            env, [s.value for s in steps], use_cache=not options.rebuild
+        )
+
+    return targets
+
+
+def _build_wheel(project: Project, options) -> int:
+    options.outputs.extend(_build(project, options, [Step.wheel]))
+    return 0
+
+
+def build(project: Project, options) -> typing.List[pathlib.Path]:
+    """Build distributions against each of ``options.pythons``.
+
+    The sdist does not depend on the interpreter, so it is only built once,
+    against the first one. Wheels are built against each of them in a matrix.
+    """
+    steps = options.steps
+    if steps is None:
+        steps = [Step.sdist, Step.wheel]
+    if len(options.pythons) < 2:
+        return _build(project, options, steps)
+
+    targets = []
+    if Step.sdist in steps:
+        targets.extend(_build(project, options, [Step.sdist]))
+    if Step.wheel in steps:
+        from . import run
+        from ._matrix import MatrixFailed, run_matrix
+
+        options = copy.copy(options)
+        options.func = _build_wheel
+        returncode, outputs = run_matrix(project, options, run)
+        if returncode:
+            raise MatrixFailed(returncode)
+        # Pure-Python wheels have the same name for every interpreter.
+        targets.extend(p for p in dict.fromkeys(outputs) if p not in targets)
+    return targets
+
+
+def _handle(project: Project, options) -> int:
+    build(project, options)
+    return 0
+
+
+def add_step_arguments(parser: argparse.ArgumentParser, verb: str):
+    parser.add_argument(
+        "--source",
+        dest="steps",
+        action="append_const",
+        const=Step.sdist,
+        help=f"{verb} the sdist",
+    )
+    parser.add_argument(
+        "--wheel",
+        dest="steps",
+        action="append_const",
+        const=Step.wheel,
+        help=f"{verb} the wheel",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        default=False,
+        help="Build distributions even if they are cached",
+    )
+
+
+def get_parser(subparsers) -> argparse.ArgumentParser:
+    parser = subparsers.add_parser("dist", description="Build distributions")
+    parser.set_defaults(steps=None, func=_handle, matrix=True, own_matrix=True)
+    add_step_arguments(parser, "Build")
+    return parser
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import argparse
+import os
+import typing
+
+if typing.TYPE_CHECKING:
+    from setl.projects import Project
+
+
+def _handle(project: Project, options) -> int:
+    fingerprint = project.get_package_fingerprint(options.jobs)
+    if options.json:
+        import json
+
+        print(json.dumps(fingerprint.to_json(), indent=2))
+    else:
+        print(fingerprint.digest)
+    return 0
+
+
+def get_parser(subparsers) -> argparse.ArgumentParser:
+    parser = subparsers.add_parser(
+        "fingerprint",
+        description="Print a digest of files going into the distributions",
+    )
+    parser.set_defaults(func=_handle, needs_python=False)
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        default=False,
+        help="Print the digest of each file as JSON",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of files to hash in parallel (default: number of CPUs)",
+    )
+    return parser
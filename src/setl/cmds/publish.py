@@ -1,42 +1,58 @@
+from __future__ import annotations
+
 import argparse
-import enum
+import logging
+import os
 import pathlib
 import typing
 
-from setl.projects import Project
+from setl._tracing import span
+from setl.errs import Error
 
-from ._utils import twine
+from .check import check
+from .dist import add_step_arguments, build
 
+if typing.TYPE_CHECKING:
+    from setl.projects import Project
 
-class Step(enum.Enum):
-    sdist = Project.build_sdist
-    wheel = Project.build_wheel
 
+logger = logging.getLogger(__name__)
 
-def _upload(options, targets: typing.List[pathlib.Path]):
-    if options.repository:
-        upload_flags = ["--repository", options.repository]
-    elif options.repository_url:
-        upload_flags = ["--repository-url", options.repository_url]
-    else:
-        upload_flags = []
-    twine("upload", *upload_flags, *targets)
 
+def _upload(options, targets: typing.List[pathlib.Path]) -> int:
+    from twine.exceptions import TwineException
 
-def _handle(project: Project, options) -> int:
-    steps = options.steps
-    if steps is None:
-        steps = [Step.sdist, Step.wheel]
+    from ._upload import UploadFailed, upload
+
+    try:
+        with span("upload", count=len(targets)):
+            upload(
+                targets,
+                options.repository,
+                options.repository_url,
+                options.upload_jobs,
+                options.index_url,
+            )
+    except UploadFailed as e:
+        for target, message in e.failures:
+            logger.error("Failed to upload %s: %s", target.name, message)
+        return Error.upload_failed
+    except TwineException as e:
+        logger.error("%s", e)
+        return Error.upload_failed
+    return 0
 
-    with project.ensure_build_envdir(options.python) as env:
-        project.ensure_build_requirements(env)
-        targets = [step(project, env) for step in steps]
+
+def _handle(project: Project, options) -> int:
+    targets = build(project, options)
 
     if options.check:
-        twine("check", *targets)
+        result = check(targets)
+        if result:
+            return result
 
     if options.upload:
-        _upload(options, targets)
+        return _upload(options, targets)
 
     return 0
 
@@ -45,21 +61,8 @@ def get_parser(subparsers) -> argparse.ArgumentParser:
     parser = subparsers.add_parser(
         "publish", description="Publish distributions to PyPI"
     )
-    parser.set_defaults(steps=None, func=_handle)
-    parser.add_argument(
-        "--source",
-        dest="steps",
-        action="append_const",
-        const=Step.sdist,
-        help="Publish the sdist",
-    )
-    parser.add_argument(
-        "--wheel",
-        dest="steps",
-        action="append_const",
-        const=Step.wheel,
-        help="Publish the wheel",
-    )
+    parser.set_defaults(steps=None, func=_handle, matrix=True, own_matrix=True)
+    add_step_arguments(parser, "Publish")
     parser.add_argument(
         "--no-check",
         dest="check",
@@ -88,5 +91,20 @@ def get_parser(subparsers) -> argparse.ArgumentParser:
         default=None,
         help="Repository URL to upload to",
     )
+    parser.add_argument(
+        "--index-url",
+        metavar="URL",
+        default=None,
+        help="Simple index of the repository, to find files already uploaded "
+        "(default: guessed from the repository URL)",
+    )
+    parser.add_argument(
+        "--upload-jobs",
+        type=int,
+        default=min(os.cpu_count() or 1, 4),
+        metavar="N",
+        help="Maximum number of files to upload at once "
+        "(default: %(default)s)",
+    )
 
     return parser
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import pathlib
+import time
+import typing
+
+from .build import Step, add_build_arguments, get_object_cache, get_steps
+
+if typing.TYPE_CHECKING:
+    from setl.projects import Project
+    from setl.projects._watch import Changes, Watcher
+    from setl.projects.build import BuildEnv
+
+
+logger = logging.getLogger(__name__)
+
+# Changes to these files may change anything about the build.
+_CONFIG_NAMES = {"MANIFEST.in", "pyproject.toml", "setup.cfg", "setup.py"}
+
+# Sources compiled by build_ext and build_clib.
+_COMPILED_SUFFIXES = {
+    ".c",
+    ".c++",
+    ".cc",
+    ".cpp",
+    ".cxx",
+    ".f",
+    ".f90",
+    ".m",
+    ".mm",
+    ".pyx",
+}
+
+# Files included by compiled sources. Setuptools does not know about these
+# unless they are listed in an extension's ``depends``.
+_HEADER_SUFFIXES = {".h", ".hh", ".hpp", ".hxx", ".inc", ".pxd", ".pxi"}
+
+# Steps run by the "build" step, in order.
+_BUILD_SUBSTEPS = [Step.py, Step.clib, Step.ext, Step.scripts]
+
+
+def _describe(changes: Changes, root: pathlib.Path, limit: int = 5) -> str:
+    names = sorted(p.relative_to(root).as_posix() for p in changes.paths)
+    if changes.overflowed:
+        names.insert(0, "(too many changes to list)")
+    if len(names) > limit:
+        names[limit:] = [f"and {len(names) - limit} more"]
+    return ", ".join(names)
+
+
+def _plan(
+    root: pathlib.Path, requested: typing.List[Step], changes: Changes
+) -> typing.Optional[typing.List[str]]:
+    """Find setup.py commands to run for changes.
+
+    Returns None if the project's configuration may have changed, so
+    everything needs to be set up and built again.
+    """
+    if changes.overflowed:
+        return None
+    affected = set()
+    headers_changed = False
+    for path in changes.paths:
+        if path.parent == root and path.name in _CONFIG_NAMES:
+            return None
+        if path.suffix in _HEADER_SUFFIXES:
+            headers_changed = True
+            affected.update([Step.clib, Step.ext])
+        elif path.suffix in _COMPILED_SUFFIXES:
+            affected.update([Step.clib, Step.ext])
+        else:  # Modules, and package data.
+            affected.add(Step.py)
+
+    commands = []
+    for step in requested:
+        steps = _BUILD_SUBSTEPS if step is Step.build else [step]
+        for substep in steps:
+            if substep in affected and substep.value not in commands:
+                commands.append(substep.value)
+
+    # build_ext only rebuilds extensions with sources (or ``depends``) newer
+    # than their outputs. Rebuild them all if an unlisted header may have
+    # changed; the object cache (if enabled) avoids compiling unaffected
+    # sources again.
+    if headers_changed and Step.ext.value in commands:
+        index = commands.index(Step.ext.value)
+        commands.insert(index + 1, "--force")
+    return commands
+
+
+def _build(
+    project: Project,
+    env: BuildEnv,
+    options,
+    commands: typing.List[str],
+    changes: typing.Optional[Changes],
+):
+    import subprocess
+
+    start = time.monotonic()
+    fingerprint = project.get_build_fingerprint(env)
+    try:
+        project.setuppy(
+            env,
+            *commands,
+            jobs=options.jobs,
+            object_cache=get_object_cache(project, env, options),
+            warm=True,
+        )
+    except subprocess.CalledProcessError:
+        succeeded = False
+    else:
+        succeeded = True
+        project.record_commands(
+            env, [c for c in commands if not c.startswith("-")], fingerprint
+        )
+    end = time.monotonic()
+
+    message = "Built" if succeeded else "Build failed"
+    message += f" in {end - start:.2f}s"
+    if changes is not None:
+        message += f", {end - changes.first_seen:.2f}s after the first change"
+    if succeeded:
+        logger.info("%s (%s)", message, " ".join(commands))
+    else:
+        logger.error("%s (%s)", message, " ".join(commands))
+
+
+def _watch(
+    project: Project,
+    options,
+    watcher: Watcher,
+    changes: typing.Optional[Changes],
+) -> Changes:
+    """Build, and keep building on changes, until the configuration changes.
+    """
+    requested = get_steps(options)
+    with project.ensure_build_envdir(options.python) as env:
+        project.ensure_build_requirements(env)
+        commands = [s.value for s in requested]
+        commands = project.get_outdated_commands(
+            env, commands, project.get_build_fingerprint(env)
+        )
+        if commands:
+            _build(project, env, options, commands, changes)
+        logger.info("Watching for changes, press Ctrl-C to stop")
+
+        while True:
+            changes = watcher.wait(options.debounce / 1000)
+            logger.info("Changed: %s", _describe(changes, project.root))
+            planned = _plan(project.root, requested, changes)
+            if planned is None:
+                return changes
+            if planned:
+                _build(project, env, options, planned, changes)
+            else:
+                logger.info("Nothing to build")
+
+
+def _handle(project: Project, options) -> int:
+    watcher = project.create_watcher(options.poll)
+    changes = None
+    try:
+        while True:
+            # Start over with a fresh environment and runner, since build
+            # requirements may have changed.
+            changes = _watch(project, options, watcher, changes)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        watcher.close()
+
+
+def get_parser(subparsers) -> argparse.ArgumentParser:
+    parser = subparsers.add_parser(
+        "watch", description="Build the package whenever sources change"
+    )
+    parser.set_defaults(steps=None, func=_handle)
+    add_build_arguments(parser)
+    parser.add_argument(
+        "--debounce",
+        type=int,
+        default=100,
+        metavar="MS",
+        help="Wait until no more changes are seen for this long before "
+        "building (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--poll",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Poll for changes at this interval, instead of relying on "
+        "notifications from the OS",
+    )
+    return parser
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import typing
+
+if typing.TYPE_CHECKING:
+    from setl.projects import Project
+
+
+logger = logging.getLogger(__name__)
+
+
+def _handle_fill(project: Project, options) -> int:
+    with project.ensure_build_envdir(options.python) as env:
+        wheelhouse = project.fill_wheelhouse(env)
+    logger.info("Wheelhouse populated: %s", wheelhouse)
+    return 0
+
+
+def get_parser(subparsers) -> argparse.ArgumentParser:
+    parser = subparsers.add_parser(
+        "wheelhouse", description="Manage the local wheelhouse"
+    )
+    parser.set_defaults(steps=None)
+
+    actions = parser.add_subparsers(dest="action", metavar="ACTION")
+    actions.required = True
+    fill = actions.add_parser(
+        "fill",
+        description=(
+            "Download and build wheels needed by the project into the "
+            "wheelhouse"
+        ),
+    )
+    fill.set_defaults(func=_handle_fill)
+
+    return parser
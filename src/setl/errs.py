@@ -10,3 +10,10 @@ class Error(enum.IntEnum):
     # Errors resolving interpreter from `--python`.
     interpreter_not_found = 0x10
     py_unavailable = 0x11
+
+    # Errors from the build backend.
+    backend_hook_failed = 0x20
+
+    # Errors publishing distributions.
+    upload_failed = 0x30
+    check_failed = 0x31
@@ -1,11 +1,11 @@
-__all__ = ["InterpreterNotFound", "Project", "PyUnavailable"]
+__all__ = ["HookFailed", "InterpreterNotFound", "Project", "PyUnavailable"]
 
 from ._envs import PyUnavailable
 from .base import BaseProject
 from .build import InterpreterNotFound, ProjectBuildManagementMixin
 from .clean import ProjectCleanMixin
 from .dev import ProjectDevelopMixin
-from .hook import ProjectPEP517HookCallerMixin
+from .hook import HookFailed, ProjectPEP517HookCallerMixin
 from .meta import ProjectMetadataMixin
 from .setup import ProjectSetupMixin
 
@@ -0,0 +1,121 @@
+"""Cache of built distributions.
+
+Distributions are keyed by the project's source files, build system, and (for
+wheels) the interpreter quintuplet, so an unchanged project can be "built" by
+linking the previously built files into ``dist/``.
+
+The backend builds into a staging directory in the cache, and the result is
+renamed into place and hard-linked into ``dist/``. Nothing is ever written
+into a cached file through a link, so entries stay intact even if the backend
+later overwrites a file of the same name in ``dist/``.
+"""
+
+__all__ = ["ArtifactCache", "get_artifact_cache", "link_into"]
+
+import contextlib
+import dataclasses
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+import uuid
+
+from typing import Iterator, Optional
+
+from setl._cache import get_cache_dir, trim_cache
+
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+
+def link_into(source: pathlib.Path, directory: pathlib.Path) -> pathlib.Path:
+    """Hard-link ``source`` into ``directory``, or copy if links do not work.
+
+    An existing file of the same name is replaced atomically, so concurrent
+    builds (e.g. pure-Python wheels for multiple interpreters) can link files
+    of the same name.
+    """
+    target = directory.joinpath(source.name)
+    with contextlib.suppress(OSError):
+        if target.samefile(source):
+            return target
+    directory.mkdir(parents=True, exist_ok=True)
+    temp = directory.joinpath(f".{source.name}.{uuid.uuid4().hex}")
+    try:
+        os.link(source, temp)
+    except OSError:  # Different devices, or not supported.
+        shutil.copy2(source, temp)
+    os.replace(temp, target)
+    return target
+
+
+@dataclasses.dataclass(frozen=True)
+class ArtifactCache:
+    directory: pathlib.Path
+    max_size: int
+
+    def get(self, key: str) -> Optional[pathlib.Path]:
+        """Find the artifact stored under ``key``.
+        """
+        entry = self.directory.joinpath(key[:2], key)
+        try:
+            path = next(entry.iterdir())
+        except (OSError, StopIteration):
+            return None
+        os.utime(entry)  # Mark as recently used for trimming.
+        return path
+
+    @contextlib.contextmanager
+    def stage(self) -> Iterator[pathlib.Path]:
+        """Create a temporary directory to build an artifact into.
+
+        The directory is in the cache, so the artifact can be moved into it
+        with `store()` without copying.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix="staging-", dir=self.directory)
+        try:
+            yield pathlib.Path(staging)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def store(self, key: str, path: pathlib.Path) -> pathlib.Path:
+        """Move the built artifact at ``path`` into the cache under ``key``.
+
+        ``path`` must be in a staging directory created by `stage()`. An
+        artifact already stored under ``key`` is replaced.
+
+        :returns: Path to the artifact in the cache.
+        """
+        entry = self.directory.joinpath(key[:2], key)
+        entry.mkdir(parents=True, exist_ok=True)
+        target = entry.joinpath(path.name)
+        os.replace(path, target)
+        for other in entry.iterdir():
+            if other != target:
+                with contextlib.suppress(OSError):
+                    other.unlink()
+        return target
+
+    def trim(self) -> int:
+        """Remove least recently used artifacts until under the size cap.
+
+        :returns: Number of artifacts removed.
+        """
+        removed = trim_cache(
+            self.directory.glob("*/*"),
+            self.max_size,
+            lambda entry: sum(p.stat().st_size for p in entry.iterdir()),
+        )
+        if removed:
+            logger.debug(
+                "Removed %d artifacts from %s", removed, self.directory
+            )
+        return removed
+
+
+def get_artifact_cache(max_size: int = _DEFAULT_MAX_SIZE) -> ArtifactCache:
+    return ArtifactCache(get_cache_dir().joinpath("artifacts"), max_size)
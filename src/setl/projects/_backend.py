@@ -0,0 +1,132 @@
+"""Client to the long-lived PEP 517 backend worker in ``_in_process.py``.
+"""
+
+__all__ = ["BackendWorker", "WorkerUnusable"]
+
+import json
+import logging
+import os
+import pathlib
+import subprocess
+import threading
+
+from typing import Any, Dict, IO, Mapping, Optional, Sequence
+
+
+logger = logging.getLogger(__name__)
+
+_SCRIPT_PATH = pathlib.Path(__file__).with_name("_in_process.py")
+
+
+class WorkerUnusable(Exception):
+    """The worker cannot serve the request. The caller should fall back."""
+
+
+class BackendWorker:
+    """A worker process serving PEP 517 hook calls for a backend.
+
+    The process is started lazily on the first call, and stopped when the
+    worker is closed (or used as a context manager and exits).
+    """
+
+    def __init__(
+        self,
+        interpreter: pathlib.Path,
+        source_dir: pathlib.Path,
+        build_backend: str,
+        backend_path: Optional[Sequence[str]],
+        environ: Optional[Mapping[str, str]] = None,
+    ):
+        self.interpreter = interpreter
+        self.source_dir = source_dir
+        self.build_backend = build_backend
+        self.backend_path = backend_path
+        self.environ = environ
+        self._proc: Optional[subprocess.Popen] = None
+        self._broken = False
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "BackendWorker":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _start(self) -> subprocess.Popen:
+        environ = os.environ.copy()
+        if self.environ:
+            environ.update(self.environ)
+        environ["PEP517_BUILD_BACKEND"] = self.build_backend
+        if self.backend_path:
+            environ["PEP517_BACKEND_PATH"] = os.pathsep.join(
+                os.fspath(self.source_dir.joinpath(p))
+                for p in self.backend_path
+            )
+        args = [os.fspath(self.interpreter), os.fspath(_SCRIPT_PATH)]
+        return subprocess.Popen(
+            args,
+            cwd=self.source_dir,
+            env=environ,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def _communicate(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        if self._broken:
+            raise WorkerUnusable()
+        try:
+            if self._proc is None:
+                self._proc = self._start()
+            stdin: IO[bytes] = self._proc.stdin  # type: ignore
+            stdout: IO[bytes] = self._proc.stdout  # type: ignore
+            stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+            stdin.flush()
+            line = stdout.readline()
+            if not line:
+                raise EOFError("worker exited unexpectedly")
+            response = json.loads(line)
+        except (OSError, EOFError, ValueError) as e:
+            logger.debug("Backend worker failed: %s", e)
+            self._broken = True
+            self.close()
+            raise WorkerUnusable()
+        if not isinstance(response, dict):
+            self._broken = True
+            self.close()
+            raise WorkerUnusable()
+        return response
+
+    def call(self, hook: str, **kwargs: Any) -> Dict[str, Any]:
+        """Call a hook in the worker.
+
+        Returns the worker's response, containing ``return_val`` and the
+        ``output`` captured during the call, or ``error`` (a formatted
+        traceback) if the hook raised an exception.
+
+        :raises WorkerUnusable: The worker process misbehaved, or the backend
+            cannot be used in the worker.
+        """
+        with self._lock:
+            response = self._communicate({"hook": hook, "kwargs": kwargs})
+        for key in ("no_backend", "backend_invalid", "unsupported"):
+            if response.get(key):
+                self._broken = True
+                self.close()
+                raise WorkerUnusable()
+        if response.get("hook_missing"):
+            raise WorkerUnusable()
+        return response
+
+    def close(self):
+        proc, self._proc = self._proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()  # type: ignore
+            proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+            proc.wait()
+        finally:
+            proc.stdout.close()  # type: ignore
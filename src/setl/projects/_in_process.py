@@ -0,0 +1,215 @@
+"""Long-lived PEP 517 backend worker.
+
+This is run as a script with the target interpreter, so it must stay
+compatible with every Python version Setl can build for, and must not import
+anything from Setl.
+
+The backend is imported once, and hooks are served until stdin is closed.
+Each request is a JSON object on a line in stdin::
+
+    {"hook": "build_wheel", "kwargs": {"wheel_directory": "..."}}
+
+And each response is a JSON object on a line in the original stdout. Output
+generated by the backend during the hook call is captured and included in the
+response instead, so it does not interfere with the protocol::
+
+    {"return_val": "...", "output": "..."}
+
+Environment variables ``PEP517_BUILD_BACKEND`` and ``PEP517_BACKEND_PATH`` are
+used to configure the backend, the same as in ``pep517``'s in-process script.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import traceback
+
+from importlib import import_module
+
+
+class BackendUnavailable(Exception):
+    def __init__(self, traceback):
+        self.traceback = traceback
+
+
+class BackendInvalid(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+class HookMissing(Exception):
+    pass
+
+
+class GotUnsupportedOperation(Exception):
+    def __init__(self, traceback):
+        self.traceback = traceback
+
+
+class _DummyException(Exception):
+    pass
+
+
+def _contained_in(filename, directory):
+    filename = os.path.normcase(os.path.abspath(filename))
+    directory = os.path.normcase(os.path.abspath(directory))
+    return os.path.commonprefix([filename, directory]) == directory
+
+
+_BACKEND = []  # type: list
+
+
+def _build_backend():
+    if _BACKEND:
+        return _BACKEND[0]
+
+    backend_path = os.environ.get("PEP517_BACKEND_PATH")
+    if backend_path:
+        extra_pathitems = backend_path.split(os.pathsep)
+        sys.path[:0] = extra_pathitems
+
+    ep = os.environ["PEP517_BUILD_BACKEND"]
+    mod_path, _, obj_path = ep.partition(":")
+    try:
+        obj = import_module(mod_path)
+    except ImportError:
+        raise BackendUnavailable(traceback.format_exc())
+
+    if backend_path:
+        if not any(_contained_in(obj.__file__, p) for p in extra_pathitems):
+            raise BackendInvalid("Backend was not loaded from backend-path")
+
+    if obj_path:
+        for path_part in obj_path.split("."):
+            obj = getattr(obj, path_part)
+    _BACKEND.append(obj)
+    return obj
+
+
+def _get_optional_hook(name):
+    return getattr(_build_backend(), name, None)
+
+
+def get_requires_for_build_wheel(config_settings=None):
+    hook = _get_optional_hook("get_requires_for_build_wheel")
+    if hook is None:
+        return []
+    return hook(config_settings)
+
+
+def get_requires_for_build_sdist(config_settings=None):
+    hook = _get_optional_hook("get_requires_for_build_sdist")
+    if hook is None:
+        return []
+    return hook(config_settings)
+
+
+def prepare_metadata_for_build_wheel(metadata_directory, config_settings=None):
+    # The fallback (building a wheel and extracting metadata from it) is left
+    # to the caller, which delegates to pep517 on HookMissing.
+    hook = _get_optional_hook("prepare_metadata_for_build_wheel")
+    if hook is None:
+        raise HookMissing()
+    return hook(metadata_directory, config_settings)
+
+
+def build_wheel(wheel_directory, config_settings=None):
+    return _build_backend().build_wheel(wheel_directory, config_settings)
+
+
+def build_sdist(sdist_directory, config_settings=None):
+    backend = _build_backend()
+    try:
+        return backend.build_sdist(sdist_directory, config_settings)
+    except getattr(backend, "UnsupportedOperation", _DummyException):
+        raise GotUnsupportedOperation(traceback.format_exc())
+
+
+HOOKS = {
+    "get_requires_for_build_wheel": get_requires_for_build_wheel,
+    "get_requires_for_build_sdist": get_requires_for_build_sdist,
+    "prepare_metadata_for_build_wheel": prepare_metadata_for_build_wheel,
+    "build_wheel": build_wheel,
+    "build_sdist": build_sdist,
+}
+
+
+def _reset_state():
+    # Distutils remembers directories it created, and skips creating them
+    # again, but a previous hook call may have removed them since.
+    for name in ("distutils.dir_util", "setuptools._distutils.dir_util"):
+        module = sys.modules.get(name)
+        if module is not None and hasattr(module, "_path_created"):
+            module._path_created.clear()
+
+
+def _call(request):
+    hook = HOOKS[request["hook"]]
+    _reset_state()
+    response = {}
+    try:
+        response["return_val"] = hook(**request["kwargs"])
+    except BackendUnavailable as e:
+        response["no_backend"] = True
+        response["traceback"] = e.traceback
+    except BackendInvalid as e:
+        response["backend_invalid"] = True
+        response["backend_error"] = e.message
+    except GotUnsupportedOperation as e:
+        response["unsupported"] = True
+        response["traceback"] = e.traceback
+    except HookMissing:
+        response["hook_missing"] = True
+    except Exception:
+        response["error"] = traceback.format_exc()
+    return response
+
+
+def _call_captured(request):
+    """Call a hook with output at the file descriptor level redirected.
+
+    This is needed to capture output from subprocesses the backend spawns,
+    not only Python-level writes to sys.stdout and sys.stderr.
+    """
+    with tempfile.TemporaryFile() as f:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved = [os.dup(1), os.dup(2)]
+        os.dup2(f.fileno(), 1)
+        os.dup2(f.fileno(), 2)
+        try:
+            response = _call(request)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            for fd in saved:
+                os.close(fd)
+        f.seek(0)
+        response["output"] = f.read().decode("utf-8", "replace")
+    return response
+
+
+def main():
+    # Don't let the backend import Setl's modules next to this script.
+    if sys.path and sys.path[0] == os.path.dirname(os.path.abspath(__file__)):
+        del sys.path[0]
+
+    # Responses go to the original stdout. Anything else written to the file
+    # descriptor outside hook calls goes to stderr instead.
+    channel = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+
+    while True:
+        line = sys.stdin.readline()
+        if not line:  # Parent closed the pipe; we're done.
+            break
+        response = _call_captured(json.loads(line))
+        channel.write((json.dumps(response) + "\n").encode("utf-8"))
+        channel.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""Install pinned wheels into a build environment without pip.
+
+pip spends most of its time starting up and resolving, even if every
+requirement is pinned to a wheel that is already in the wheelhouse. In that
+case, Setl installs the wheels itself: archives are extracted concurrently,
+and ``RECORD``, ``INSTALLER``, and console scripts are written like pip does.
+Files are extracted into a staging directory and checked against ``RECORD``
+first, so nothing is installed from a broken wheel.
+Modules are not compiled to bytecode ahead of time; Python does that when they
+are first imported.
+
+Everything else is left to pip, i.e. unpinned requirements, extras, URLs,
+platform-specific wheels (their compatibility is not known without asking the
+interpreter), and wheels with dependencies outside the pinned set.
+"""
+
+__all__ = ["InstallFailed", "find_pinned_wheels", "install_wheels"]
+
+import base64
+import concurrent.futures
+import configparser
+import csv
+import dataclasses
+import email.parser
+import hashlib
+import io
+import os
+import pathlib
+import shutil
+import tempfile
+import zipfile
+
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.specifiers import SpecifierSet
+from packaging.utils import (
+    InvalidWheelFilename,
+    canonicalize_name,
+    parse_wheel_filename,
+)
+from packaging.version import Version
+
+
+_INSTALLER = b"setl\n"
+
+_SCRIPT_TEMPLATE = """\
+# -*- coding: utf-8 -*-
+import re
+import sys
+from {module} import {name}
+if __name__ == "__main__":
+    sys.argv[0] = re.sub(r"(-script\\.pyw|\\.exe)?$", "", sys.argv[0])
+    sys.exit({function}())
+"""
+
+_CHUNK_SIZE = 1 << 20
+
+
+@dataclasses.dataclass()
+class InstallFailed(Exception):
+    wheel: pathlib.Path
+    reason: str
+
+
+@dataclasses.dataclass(frozen=True)
+class _Wheel:
+    path: pathlib.Path
+    name: str  # Canonical.
+    version: Version
+
+
+def _is_pure_compatible(path: pathlib.Path, python_version: str) -> bool:
+    """Whether the wheel is pure Python, and supports the Python version.
+    """
+    _, _, _, tags = parse_wheel_filename(path.name)
+    major, minor = (int(v) for v in python_version.split(".")[:2])
+    for tag in tags:
+        if tag.abi != "none" or tag.platform != "any":
+            continue
+        if not tag.interpreter.startswith("py"):
+            continue
+        digits = tag.interpreter[2:]
+        if not digits.isdigit() or int(digits[0]) != major:
+            continue
+        if len(digits) == 1 or int(digits[1:]) <= minor:
+            return True
+    return False
+
+
+def _get_pins(
+    requirements: Iterable[str], markers: Mapping[str, str]
+) -> Optional[Dict[str, Version]]:
+    """Get versions requirements are pinned to.
+
+    Returns None if any requirement is not pinned to one exact version.
+    """
+    pins: Dict[str, Version] = {}
+    environment = {**markers, "extra": ""}
+    for line in requirements:
+        try:
+            requirement = Requirement(line)
+        except InvalidRequirement:
+            return None
+        if requirement.url or requirement.extras:
+            return None
+        if requirement.marker and not requirement.marker.evaluate(environment):
+            continue
+        specifiers = list(requirement.specifier)
+        if len(specifiers) != 1 or specifiers[0].operator != "==":
+            return None
+        if specifiers[0].version.endswith(".*"):
+            return None
+        pins[canonicalize_name(requirement.name)] = Version(
+            specifiers[0].version
+        )
+    return pins
+
+
+def _find_dist_info(archive: zipfile.ZipFile) -> str:
+    for name in archive.namelist():
+        parts = name.split("/")
+        if len(parts) == 2 and parts[0].endswith(".dist-info"):
+            if parts[1] == "WHEEL":
+                return parts[0]
+    raise ValueError(f"{archive.filename} has no .dist-info directory")
+
+
+def _read_headers(archive: zipfile.ZipFile, name: str):
+    return email.parser.BytesHeaderParser().parsebytes(archive.read(name))
+
+
+def _has_scripts(archive: zipfile.ZipFile, dist_info: str) -> bool:
+    try:
+        data = archive.read(f"{dist_info}/entry_points.txt")
+    except KeyError:
+        return False
+    parser = configparser.ConfigParser(delimiters="=", interpolation=None)
+    parser.read_string(data.decode("utf8"))
+    return any(
+        parser.has_section(s) and parser.options(s)
+        for s in ("console_scripts", "gui_scripts")
+    )
+
+
+def _is_installable(
+    wheel: _Wheel, versions: Mapping[str, Version], markers: Mapping[str, str],
+) -> bool:
+    """Whether the wheel can be installed without resolving anything.
+
+    Its dependencies need to be satisfied by ``versions``, i.e. what is pinned
+    or already installed.
+    """
+    with zipfile.ZipFile(wheel.path) as archive:
+        dist_info = _find_dist_info(archive)
+        if os.name == "nt" and _has_scripts(archive, dist_info):
+            return False  # We can't make .exe launchers.
+        metadata = _read_headers(archive, f"{dist_info}/METADATA")
+
+    requires_python = metadata.get("Requires-Python")
+    if requires_python and markers["python_full_version"] not in SpecifierSet(
+        requires_python
+    ):
+        return False
+
+    environment = {**markers, "extra": ""}
+    for line in metadata.get_all("Requires-Dist", []):
+        requirement = Requirement(line)
+        if requirement.marker and not requirement.marker.evaluate(environment):
+            continue
+        version = versions.get(canonicalize_name(requirement.name))
+        if version is None:
+            return False
+        if not requirement.specifier.contains(version, prereleases=True):
+            return False
+    return True
+
+
+def find_pinned_wheels(
+    requirements: Iterable[str],
+    installed: Mapping[str, str],
+    wheelhouse: pathlib.Path,
+    markers: Mapping[str, str],
+) -> Optional[List[pathlib.Path]]:
+    """Find wheels to install requirements from, if no resolution is needed.
+
+    :param installed: Distributions already in the environment, as a
+        `{canonical_name: version}` mapping.
+    :param markers: Environment to evaluate markers against.
+    :returns: Paths to wheels in the wheelhouse, or None if pip is needed.
+    """
+    pins = _get_pins(requirements, markers)
+    if not pins:
+        return None
+
+    # Replacing an installed distribution needs uninstallation.
+    if any(name in installed for name in pins):
+        return None
+
+    wheels: Dict[str, _Wheel] = {}
+    for path in sorted(wheelhouse.glob("*.whl")):
+        try:
+            name, version, _, _ = parse_wheel_filename(path.name)
+        except InvalidWheelFilename:
+            continue
+        if pins.get(name) != version or name in wheels:
+            continue
+        if _is_pure_compatible(path, markers["python_full_version"]):
+            wheels[name] = _Wheel(path, name, version)
+    if wheels.keys() != pins.keys():
+        return None
+
+    versions = {k: Version(v) for k, v in installed.items()}
+    versions.update(pins)
+    if not all(_is_installable(w, versions, markers) for w in wheels.values()):
+        return None
+    return [wheels[name].path for name in sorted(wheels)]
+
+
+def _encode_digest(h: "hashlib._Hash") -> str:
+    digest = base64.urlsafe_b64encode(h.digest()).rstrip(b"=").decode()
+    return f"{h.name}={digest}"
+
+
+def _get_shebang(interpreter: str, gui: bool = False) -> bytes:
+    if gui:
+        head, tail = os.path.split(interpreter)
+        if tail.startswith("python") and not tail.startswith("pythonw"):
+            interpreter = os.path.join(head, "pythonw" + tail[6:])
+    # Kernels limit the shebang's length, and don't allow spaces in it, so
+    # exec through sh in that case, like pip (distlib) does.
+    if len(interpreter) > 127 or " " in interpreter:
+        line = f"#!/bin/sh\n'''exec' \"{interpreter}\" \"$0\" \"$@\"\n' '''\n"
+    else:
+        line = f"#!{interpreter}\n"
+    return line.encode("utf8")
+
+
+class _Installer:
+    def __init__(
+        self,
+        archive: zipfile.ZipFile,
+        paths: Mapping[str, str],
+        interpreter: pathlib.Path,
+    ):
+        self._archive = archive
+        self._paths = paths
+        self._interpreter = os.fspath(interpreter)
+        self._dist_info = _find_dist_info(archive)
+        self._data_dir = self._dist_info[: -len(".dist-info")] + ".data"
+
+        wheel = _read_headers(archive, f"{self._dist_info}/WHEEL")
+        version = wheel.get("Wheel-Version", "1.0")
+        if version.split(".")[0] != "1":
+            raise ValueError(f"unsupported Wheel-Version {version}")
+        if wheel.get("Root-Is-Purelib", "").strip().lower() == "true":
+            self._root = paths["purelib"]
+        else:
+            self._root = paths["platlib"]
+
+        self._hashes: Dict[str, str] = {}
+        record = archive.read(f"{self._dist_info}/RECORD").decode("utf8")
+        for row in csv.reader(io.StringIO(record)):
+            if len(row) >= 2 and row[1]:
+                self._hashes[row[0]] = row[1]
+
+        self._records: List[Tuple[str, str, str]] = []
+
+        # Files extracted into the staging directory, and where they go.
+        self._staging = ""
+        self._staged: List[Tuple[str, str]] = []
+
+    def _get_target(self, name: str) -> str:
+        parts = name.split("/")
+        if name.startswith("/") or ".." in parts:
+            raise ValueError(f"unsafe path {name!r}")
+        if parts[0] != self._data_dir:
+            return os.path.join(self._root, *parts)
+        scheme = parts[1] if len(parts) > 2 else ""
+        if scheme == "headers":
+            metadata = _read_headers(
+                self._archive, f"{self._dist_info}/METADATA"
+            )
+            base = os.path.join(self._paths["include"], metadata["Name"])
+        elif scheme in ("data", "platlib", "purelib", "scripts"):
+            base = self._paths[scheme]
+        else:
+            raise ValueError(f"unknown data directory in {name!r}")
+        return os.path.join(base, *parts[2:])
+
+    def _record(self, target: str, digest: str, size: int):
+        path = os.path.relpath(target, self._root).replace(os.sep, "/")
+        self._records.append((path, digest, str(size)))
+
+    def _stage(self, target: str) -> str:
+        staged = os.path.join(self._staging, str(len(self._staged)))
+        self._staged.append((staged, target))
+        return staged
+
+    def _write(self, target: str, data: bytes, executable: bool = False):
+        staged = self._stage(target)
+        with open(staged, "wb") as f:
+            f.write(data)
+        if executable:
+            os.chmod(staged, 0o755)
+        self._record(target, _encode_digest(hashlib.sha256(data)), len(data))
+
+    def _check_digest(self, name: str, h: "hashlib._Hash"):
+        expected = self._hashes.get(name)
+        if expected is None:
+            return
+        algorithm = expected.partition("=")[0]
+        if algorithm != h.name:  # Hash again with what RECORD uses.
+            h = hashlib.new(algorithm, self._archive.read(name))
+        if _encode_digest(h) != expected:
+            raise ValueError(f"hash mismatch for {name!r}")
+
+    def _extract_script(self, info: zipfile.ZipInfo, target: str):
+        data = self._archive.read(info)
+        self._check_digest(info.filename, hashlib.sha256(data))
+        first, newline, rest = data.partition(b"\n")
+        if first.startswith(b"#!python"):
+            gui = first.startswith(b"#!pythonw")
+            data = _get_shebang(self._interpreter, gui) + rest
+        self._write(target, data, executable=True)
+
+    def _extract(self, info: zipfile.ZipInfo):
+        target = self._get_target(info.filename)
+        if info.filename.startswith(f"{self._data_dir}/scripts/"):
+            self._extract_script(info, target)
+            return
+        staged = self._stage(target)
+        h = hashlib.sha256()
+        with self._archive.open(info) as source, open(staged, "wb") as f:
+            for chunk in iter(lambda: source.read(_CHUNK_SIZE), b""):
+                h.update(chunk)
+                f.write(chunk)
+        self._check_digest(info.filename, h)
+        if (info.external_attr >> 16) & 0o111:
+            os.chmod(staged, 0o755)
+        self._record(target, _encode_digest(h), info.file_size)
+
+    def _write_entry_point_scripts(self):
+        try:
+            data = self._archive.read(f"{self._dist_info}/entry_points.txt")
+        except KeyError:
+            return
+        parser = configparser.ConfigParser(delimiters="=", interpolation=None)
+        parser.optionxform = str  # type: ignore  # Keep case of names.
+        parser.read_string(data.decode("utf8"))
+        for section, gui in [
+            ("console_scripts", False),
+            ("gui_scripts", True),
+        ]:
+            if not parser.has_section(section):
+                continue
+            for script, value in parser.items(section):
+                module, _, attrs = value.partition(":")
+                attrs = attrs.partition("[")[0].strip()  # Drop extras.
+                name = attrs.split(".")[0]
+                content = _SCRIPT_TEMPLATE.format(
+                    module=module.strip(), name=name, function=attrs
+                )
+                target = os.path.join(self._paths["scripts"], script)
+                shebang = _get_shebang(self._interpreter, gui)
+                self._write(target, shebang + content.encode("utf8"), True)
+
+    def _move_staged(self, dist_info: str):
+        # Metadata goes last, so the distribution is only seen as installed
+        # when all of its files are in place.
+        prefix = dist_info + os.sep
+        self._staged.sort(key=lambda item: item[1].startswith(prefix))
+        for staged, target in self._staged:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(staged, target)
+
+        record = os.path.join(dist_info, "RECORD")
+        relpath = os.path.relpath(record, self._root).replace(os.sep, "/")
+        self._records.append((relpath, "", ""))
+        with open(record, "w", encoding="utf8", newline="") as f:
+            csv.writer(f).writerows(self._records)
+
+    def install(self):
+        """Install the wheel.
+
+        Nothing is installed if any file does not match its hash in
+        ``RECORD``. If moving files into place fails, the ``.dist-info``
+        directory is removed, so the distribution is not seen as installed.
+        """
+        record_name = f"{self._dist_info}/RECORD"
+        infos = [
+            info
+            for info in self._archive.infolist()
+            if not info.is_dir() and info.filename != record_name
+        ]
+        dist_info = os.path.join(self._root, self._dist_info)
+
+        # Staged in the target, so files can be moved instead of copied.
+        os.makedirs(self._root, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self._root, prefix=".") as td:
+            self._staging = td
+            for info in infos:
+                self._extract(info)
+            self._write_entry_point_scripts()
+            self._write(os.path.join(dist_info, "INSTALLER"), _INSTALLER)
+            try:
+                self._move_staged(dist_info)
+            except BaseException:
+                shutil.rmtree(dist_info, ignore_errors=True)
+                raise
+
+
+def _install_wheel(
+    path: pathlib.Path, paths: Mapping[str, str], interpreter: pathlib.Path
+):
+    try:
+        with zipfile.ZipFile(path) as archive:
+            _Installer(archive, paths, interpreter).install()
+    except (KeyError, OSError, ValueError, zipfile.BadZipFile) as e:
+        raise InstallFailed(path, str(e))
+
+
+def install_wheels(
+    wheels: Iterable[pathlib.Path],
+    paths: Mapping[str, str],
+    interpreter: pathlib.Path,
+    jobs: Optional[int] = None,
+):
+    """Install wheels concurrently.
+
+    :param paths: Scheme paths to install into, from ``sysconfig``.
+    :param interpreter: Interpreter to run the installed scripts with.
+    :param jobs: Number of wheels to install at the same time.
+    :raises InstallFailed: A wheel could not be installed. Other wheels are
+        still installed.
+    """
+    with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+        futures = [
+            executor.submit(_install_wheel, path, paths, interpreter)
+            for path in wheels
+        ]
+        for future in futures:
+            future.result()
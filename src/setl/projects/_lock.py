@@ -0,0 +1,49 @@
+"""Advisory file locks, so concurrent Setl processes wait for each other.
+"""
+
+__all__ = ["file_lock"]
+
+import contextlib
+import os
+import pathlib
+import sys
+import time
+
+from typing import Iterator
+
+
+@contextlib.contextmanager
+def file_lock(path: pathlib.Path) -> Iterator[None]:
+    """Hold an exclusive lock on ``path``, waiting for other holders.
+
+    The file is created if needed, and left behind afterwards. The lock is
+    released by the OS if the process dies.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if sys.platform == "win32":
+            import msvcrt
+
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                except OSError:
+                    time.sleep(0.1)
+                else:
+                    break
+            try:
+                yield
+            finally:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
@@ -0,0 +1,364 @@
+"""Find files that go into a project's distributions, without Setuptools.
+
+Packages, modules, package data, and referenced files are read from setup.cfg,
+and MANIFEST.in is applied on top of them, like Setuptools does. If setup.py
+may declare any of those itself, or a file finder plugin (e.g. setuptools-scm)
+may add files under version control, the whole source tree is used instead.
+Files metadata may be read from (e.g. a version with ``attr:``) are found
+similarly.
+
+Paths are matched as strings relative to the project root, with patterns
+translated to regular expressions like ``distutils.filelist`` does, since
+source trees can contain tens of thousands of files.
+"""
+
+__all__ = ["iter_metadata_inputs", "iter_package_inputs"]
+
+import ast
+import configparser
+import pathlib
+import posixpath
+import re
+
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Pattern,
+    Set,
+)
+
+from ._sources import iter_source_relpaths
+
+
+# Keyword arguments in setup.py declaring files to include. setup.cfg can't
+# tell us what is in the distributions if any of them is used.
+_SETUP_PY_FILES_RE = re.compile(
+    r"\b(data_files|ext_modules|libraries|package_data|package_dir|packages|"
+    r"py_modules|scripts)\s*="
+)
+
+# Setuptools plugins adding files under version control to sdists.
+_FILE_FINDER_RE = re.compile(
+    r"\bsetuptools[-_.](?:bzr|git|hg|scm|svn)(?![-_.\w])", re.IGNORECASE
+)
+
+# Files Setuptools includes in sdists by default.
+_DEFAULT_PATTERNS = [
+    "AUTHORS*",
+    "COPYING*",
+    "LICEN[CS]E*",
+    "MANIFEST.in",
+    "NOTICE*",
+    "README*",
+    "pyproject.toml",
+    "setup.cfg",
+    "setup.py",
+    "test/test*.py",
+]
+
+_FILE_DIRECTIVE_RE = re.compile(r"^\s*file:\s*(.+)$", re.DOTALL)
+
+_ATTR_DIRECTIVE_RE = re.compile(r"^\s*attr:\s*(\S+)\s*$")
+
+_INCLUDE_ACTIONS = {"global-include", "graft", "include", "recursive-include"}
+
+
+def _split(value: str) -> List[str]:
+    """Split a list value in setup.cfg, separated by commas or lines.
+    """
+    return [v.strip() for v in re.split(r"[,\n]", value) if v.strip()]
+
+
+def _translate(pattern: str) -> str:
+    """Translate a glob to a regular expression; wildcards don't match "/".
+    """
+    result = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        i += 1
+        if c == "*":
+            result.append("[^/]*")
+        elif c == "?":
+            result.append("[^/]")
+        elif c == "[" and "]" in pattern[i + 1 :]:
+            end = pattern.index("]", i + 1)
+            chars = pattern[i:end].replace("\\", "\\\\")
+            if chars.startswith("!"):
+                chars = "^" + chars[1:]
+            result.append(f"[{chars}]")
+            i = end + 1
+        else:
+            result.append(re.escape(c))
+    return "".join(result)
+
+
+def _prefix(directory: str) -> str:
+    """Regular expression matching the start of paths under ``directory``.
+    """
+    directory = posixpath.normpath(directory)
+    if directory == ".":
+        return ""
+    return re.escape(directory) + "/"
+
+
+def _any(expressions: Iterable[str]) -> str:
+    return "(?:{})".format("|".join(expressions))
+
+
+def _compile(expression: str) -> Pattern[str]:
+    return re.compile(f"{expression}$")
+
+
+def _get_package_path(name: str, package_dir: Dict[str, str]) -> str:
+    """Find a package's directory, like ``build_py.get_package_dir()``.
+    """
+    parts = name.split(".")
+    for i in range(len(parts), 0, -1):
+        prefix = ".".join(parts[:i])
+        if prefix in package_dir:
+            path = posixpath.join(package_dir[prefix], *parts[i:])
+            break
+    else:
+        path = posixpath.join(package_dir.get("", ""), *parts)
+    return posixpath.normpath(path)
+
+
+class _Collector:
+    def __init__(self, candidates: List[str]):
+        self._candidates = candidates
+        self.selected: Set[str] = set()
+
+    def add(self, pattern: Pattern[str]):
+        self.selected.update(filter(pattern.match, self._candidates))
+
+    def remove(self, pattern: Pattern[str]):
+        self.selected.difference_update(
+            list(filter(pattern.match, self.selected))
+        )
+
+
+def _get_package_dir(cfg: configparser.ConfigParser) -> Dict[str, str]:
+    package_dir = {}
+    for item in _split(cfg.get("options", "package_dir", fallback="")):
+        name, _, path = item.partition("=")
+        package_dir[name.strip()] = path.strip()
+    return package_dir
+
+
+def _add_declared(collector: _Collector, cfg: configparser.ConfigParser):
+    options = cfg["options"]
+    package_dir = _get_package_dir(cfg)
+
+    # Modules in packages. Whole directories are searched if packages are
+    # found, regardless of what would actually be found.
+    package_dirs: Optional[Set[str]]
+    packages = options.get("packages", "").strip()
+    if packages.startswith(("find:", "find_namespace:")):
+        where = cfg.get(
+            "options.packages.find", "where", fallback=package_dir.get("", ".")
+        )
+        prefix = _any(_prefix(w) for w in _split(where) or ["."])
+        collector.add(_compile(rf"{prefix}(?:.*/)?[^/]*\.py"))
+        package_dirs = None
+    else:
+        package_dirs = {
+            _get_package_path(name, package_dir) for name in _split(packages)
+        }
+        if package_dirs:
+            prefix = _any(_prefix(d) for d in package_dirs)
+            collector.add(_compile(rf"{prefix}[^/]*\.py"))
+
+    modules = [
+        f"{_get_package_path(name, package_dir)}.py"
+        for name in _split(options.get("py_modules", ""))
+    ]
+    if modules:
+        collector.add(_compile(_any(re.escape(m) for m in modules)))
+
+    if cfg.has_section("options.package_data"):
+        for name, value in cfg.items("options.package_data"):
+            if name not in ("", "*"):
+                prefix = _prefix(_get_package_path(name, package_dir))
+            elif package_dirs:
+                prefix = _any(_prefix(d) for d in package_dirs)
+            else:  # Packages are found; data may be in any of them.
+                prefix = "(?:.*/)?"
+            expression = _any(_translate(p) for p in _split(value))
+            collector.add(_compile(prefix + expression))
+
+    patterns = _split(options.get("scripts", ""))
+    if cfg.has_section("options.data_files"):
+        for _, value in cfg.items("options.data_files"):
+            patterns.extend(_split(value))
+    patterns.extend(_split(cfg.get("metadata", "license_files", fallback="")))
+    for section in cfg.sections():
+        for _, value in cfg.items(section):
+            match = _FILE_DIRECTIVE_RE.match(value)
+            if match:
+                patterns.extend(_split(match.group(1)))
+    if patterns:
+        collector.add(_compile(_any(_translate(p) for p in patterns)))
+
+
+def _get_template_pattern(
+    action: str, args: List[str]
+) -> Optional[Pattern[str]]:
+    if action in ("include", "exclude"):
+        return _compile(_any(_translate(a) for a in args))
+    if action in ("global-include", "global-exclude"):
+        return _compile("(?:.*/)?" + _any(_translate(a) for a in args))
+    if action in ("recursive-include", "recursive-exclude"):
+        patterns = _any(_translate(a) for a in args[1:])
+        return _compile(f"{_prefix(args[0])}(?:.*/)?{patterns}")
+    if action in ("graft", "prune"):
+        return _compile(_any(_prefix(a) for a in args) + ".*")
+    return None  # Setuptools warns about these, and moves on.
+
+
+def _apply_manifest_template(collector: _Collector, lines: List[str]):
+    """Apply commands in MANIFEST.in, like ``distutils.filelist.FileList``.
+    """
+    for line in lines:
+        words = line.split("#", 1)[0].split()
+        if len(words) < 2:
+            continue
+        pattern = _get_template_pattern(words[0], words[1:])
+        if pattern is None:
+            continue
+        if words[0] in _INCLUDE_ACTIONS:
+            collector.add(pattern)
+        else:
+            collector.remove(pattern)
+
+
+def _read_text(path: pathlib.Path) -> Optional[str]:
+    try:
+        return path.read_text("utf8")
+    except FileNotFoundError:
+        return None
+
+
+def _uses_file_finder(
+    setup_py: str,
+    cfg: configparser.ConfigParser,
+    build_requirements: Iterable[str],
+) -> bool:
+    requirements = [
+        *build_requirements,
+        *_split(cfg.get("options", "setup_requires", fallback="")),
+    ]
+    return any(_FILE_FINDER_RE.search(r) for r in [setup_py, *requirements])
+
+
+def iter_package_inputs(
+    root: pathlib.Path,
+    cfg: configparser.ConfigParser,
+    build_requirements: Iterable[str] = (),
+) -> Iterator[str]:
+    """Iterate through files that may go into the distributions.
+
+    Paths are relative to ``root``, with forward slashes, in a stable order.
+
+    :param build_requirements: Requirements in ``[build-system]``, to find
+        file finder plugins.
+    """
+    setup_py = _read_text(root.joinpath("setup.py")) or ""
+    declared = cfg.has_option("options", "packages") or cfg.has_option(
+        "options", "py_modules"
+    )
+    if (
+        not declared
+        or _SETUP_PY_FILES_RE.search(setup_py)
+        or _uses_file_finder(setup_py, cfg, build_requirements)
+    ):
+        yield from iter_source_relpaths(root)
+        return
+
+    collector = _Collector(list(iter_source_relpaths(root)))
+    collector.add(_compile(_any(_translate(p) for p in _DEFAULT_PATTERNS)))
+    _add_declared(collector, cfg)
+
+    template = _read_text(root.joinpath("MANIFEST.in"))
+    if template:
+        # Join continued lines, like distutils' TextFile.
+        lines = template.replace("\\\n", " ").splitlines()
+        _apply_manifest_template(collector, lines)
+
+    yield from sorted(collector.selected)
+
+
+def _iter_setup_py_imports(source: str) -> Iterator[str]:
+    """Iterate through top-level names of modules imported by setup.py.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name.split(".")[0]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            if not node.level:
+                yield node.module.split(".")[0]
+
+
+def _iter_module_paths(
+    name: str, package_dir: Dict[str, str]
+) -> Iterator[str]:
+    """Candidate files a module's source may be in.
+    """
+    path = _get_package_path(name, package_dir)
+    yield f"{path}.py"
+    yield posixpath.join(path, "__init__.py")
+
+
+def iter_metadata_inputs(
+    root: pathlib.Path,
+    cfg: configparser.ConfigParser,
+    pyproject: Mapping[str, Any],
+) -> Iterator[str]:
+    """Iterate through files metadata may be read from, besides configuration.
+
+    These are files referenced by ``attr:`` and ``file:`` in setup.cfg, or
+    ``[tool.setuptools.dynamic]`` in pyproject.toml, and local modules
+    setup.py imports. Only files that exist are included. Paths are relative to
+    ``root``, with forward slashes, in a stable order.
+    """
+    package_dir = _get_package_dir(cfg)
+    tool = pyproject.get("tool", {}).get("setuptools", {})
+    package_dir.update(tool.get("package-dir", {}))
+
+    candidates: Set[str] = set()
+    values: List[Any] = [v for s in cfg.sections() for _, v in cfg.items(s)]
+    values.extend(tool.get("dynamic", {}).values())
+    for value in values:
+        if isinstance(value, dict):  # pyproject.toml.
+            files = value.get("file", [])
+            candidates.update([files] if isinstance(files, str) else files)
+            attr = value.get("attr")
+        else:
+            match = _FILE_DIRECTIVE_RE.match(value)
+            if match:
+                candidates.update(_split(match.group(1)))
+            match = _ATTR_DIRECTIVE_RE.match(value)
+            attr = match.group(1) if match else None
+        if attr:
+            module = attr.rpartition(".")[0] or "__init__"
+            candidates.update(_iter_module_paths(module, package_dir))
+
+    setup_py = _read_text(root.joinpath("setup.py"))
+    if setup_py:
+        for name in _iter_setup_py_imports(setup_py):
+            candidates.update(_iter_module_paths(name, {}))
+
+    for candidate in sorted(candidates):
+        path = posixpath.normpath(candidate)
+        if root.joinpath(path).is_file():
+            yield path
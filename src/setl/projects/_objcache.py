@@ -0,0 +1,72 @@
+"""Cache of compiled extension objects.
+
+Objects are stored by the setup.py wrapper in ``_setuppy.py``, keyed by the
+preprocessed source and the compiler command line. Each interpreter quintuplet
+gets its own directory in the user cache directory, so the cache survives
+``setl clean`` (which removes the build environment).
+"""
+
+__all__ = ["ObjectCache", "get_object_cache"]
+
+import dataclasses
+import logging
+import os
+import pathlib
+
+from typing import Any, Mapping
+
+from setl._cache import get_cache_dir, trim_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class ObjectCache:
+    directory: pathlib.Path
+    max_size: int
+
+    def get_environ(self, stats_path: pathlib.Path) -> Mapping[str, str]:
+        """Environment variables to enable the cache in the setup.py wrapper.
+        """
+        return {
+            "SETL_OBJECT_CACHE_DIR": os.fspath(self.directory),
+            "SETL_OBJECT_CACHE_STATS": os.fspath(stats_path),
+        }
+
+    def report(self, stats: Mapping[str, Any]):
+        hits = stats.get("hits", 0)
+        misses = stats.get("misses", 0)
+        uncacheable = stats.get("uncacheable", 0)
+        total = hits + misses + uncacheable
+        if not total:
+            return
+        logger.info(
+            "Object cache: %d hits, %d misses, %d uncacheable (%.0f%% hit)",
+            hits,
+            misses,
+            uncacheable,
+            hits * 100 / total,
+        )
+
+    def trim(self) -> int:
+        """Remove least recently used objects until under the size cap.
+
+        Objects are touched when restored, so the modification time is when
+        they were last used.
+
+        :returns: Number of objects removed.
+        """
+        removed = trim_cache(
+            self.directory.glob("*/*.o"),
+            self.max_size,
+            lambda path: path.stat().st_size,
+        )
+        if removed:
+            logger.debug("Removed %d objects from %s", removed, self.directory)
+        return removed
+
+
+def get_object_cache(quintuplet: str, max_size: int) -> ObjectCache:
+    directory = get_cache_dir().joinpath("objects", quintuplet)
+    return ObjectCache(directory, max_size)
@@ -0,0 +1,277 @@
+"""Cached interpreter introspection.
+
+Everything Setl needs to know about a target interpreter is collected by one
+probe script, so the interpreter only needs to start once. Results are cached
+on disk, keyed by the interpreter's real path, size, and mtime, so subsequent
+invocations do not need to start the interpreter at all.
+"""
+
+__all__ = ["InterpreterInfo", "probe_interpreter", "resolve_python"]
+
+import contextlib
+import dataclasses
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+
+from typing import Dict, Iterator, List, Optional
+
+from setl._cache import get_cache_dir, read_json, write_json
+from setl._tracing import span
+
+from . import _envs
+
+
+# Bump this whenever the probe's output format changes.
+_PROBE_VERSION = 3
+
+# Paths are reported relative to this placeholder, so they can be expanded to
+# any environment root without asking the interpreter again.
+_BASE_PLACEHOLDER = "@SETL_BASE@"
+
+# The quintuplet part is identical to `_envs._VENV_NAME_CODE`.
+_PROBE_CODE = """
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+import platform
+import sys
+import sysconfig
+
+try:
+    prefix = sys.real_prefix
+except AttributeError:
+    try:
+        prefix = sys.base_prefix
+    except AttributeError:
+        prefix = sys.prefix
+
+prefix = prefix.encode(sys.getfilesystemencoding(), "ignore")
+
+quintuplet = "{impl}-{vers}-{syst}-{plat}-{hash}".format(
+    impl=platform.python_implementation(),
+    vers=sysconfig.get_python_version(),
+    syst=platform.uname()[0],
+    plat=sysconfig.get_platform().split("-")[-1],
+    hash=hashlib.sha256(prefix).hexdigest()[:8],
+).lower()
+
+base = sys.argv[1]
+
+# Same as packaging.markers.default_environment().
+try:
+    implementation = sys.implementation
+except AttributeError:  # Python 2.
+    implementation_name = ""
+    implementation_version = "0"
+else:
+    implementation_name = implementation.name
+    implementation_version = "{0.major}.{0.minor}.{0.micro}".format(
+        implementation.version,
+    )
+    if implementation.version.releaselevel != "final":
+        implementation_version += "{0}{1}".format(
+            implementation.version.releaselevel[0],
+            implementation.version.serial,
+        )
+markers = {
+    "implementation_name": implementation_name,
+    "implementation_version": implementation_version,
+    "os_name": os.name,
+    "platform_machine": platform.machine(),
+    "platform_release": platform.release(),
+    "platform_system": platform.system(),
+    "platform_version": platform.version(),
+    "python_full_version": platform.python_version(),
+    "platform_python_implementation": platform.python_implementation(),
+    "python_version": ".".join(platform.python_version_tuple()[:2]),
+    "sys_platform": sys.platform,
+}
+
+print(json.dumps({
+    "executable": sys.executable,
+    "version": ".".join(str(v) for v in sys.version_info[:3]),
+    "quintuplet": quintuplet,
+    "paths": sysconfig.get_paths(vars={"base": base, "platbase": base}),
+    "site_packages": sorted(
+        set(sysconfig.get_path(k) for k in ("purelib", "platlib"))
+    ),
+    "markers": markers,
+}))
+"""
+
+
+@dataclasses.dataclass(frozen=True)
+class InterpreterInfo:
+    executable: str
+    version: str
+    quintuplet: str
+
+    # Result of ``sysconfig.get_paths()``, with the base path substituted by
+    # `_BASE_PLACEHOLDER`. Use `get_env_paths()` to expand them.
+    paths: Dict[str, str]
+
+    # The interpreter's own site-packages directories.
+    site_packages: List[str]
+
+    # Environment to evaluate PEP 508 markers against.
+    markers: Dict[str, str]
+
+    def get_env_paths(self, root: pathlib.Path) -> Dict[str, str]:
+        """Get scheme paths for an environment based at ``root``.
+        """
+        base = os.fspath(root)
+        return {
+            k: v.replace(_BASE_PLACEHOLDER, base)
+            for k, v in self.paths.items()
+        }
+
+
+# In-memory cache, so an interpreter is only looked up once per run.
+_PROBED: Dict[str, InterpreterInfo] = {}
+
+
+def _get_cache_key(*parts: object) -> str:
+    data = json.dumps([_PROBE_VERSION, *parts])
+    return hashlib.sha256(data.encode("utf8")).hexdigest()
+
+
+def _get_file_identity(path: pathlib.Path) -> List[object]:
+    """Identify an executable file, so cache entries are invalidated when the
+    file is replaced (e.g. the interpreter is upgraded).
+
+    The literal path is included in addition to the real path, because a
+    virtual environment's interpreter is usually a symlink to the base
+    interpreter, but behaves differently.
+    """
+    realpath = path.resolve()
+    stat = realpath.stat()
+    return [
+        os.path.abspath(path),
+        os.fspath(realpath),
+        stat.st_size,
+        stat.st_mtime_ns,
+    ]
+
+
+def _get_cache_path(kind: str, key: str) -> pathlib.Path:
+    return get_cache_dir().joinpath("interpreters", kind, f"{key}.json")
+
+
+def probe_interpreter(python: pathlib.Path) -> InterpreterInfo:
+    """Collect information about an interpreter.
+    """
+    key = _get_cache_key(*_get_file_identity(python))
+    try:
+        return _PROBED[key]
+    except KeyError:
+        pass
+    cache_path = _get_cache_path("info", key)
+    data = read_json(cache_path)
+    info = None
+    if isinstance(data, dict):
+        with contextlib.suppress(TypeError):
+            info = InterpreterInfo(**data)
+    if info is None:
+        args = [os.fspath(python), "-c", _PROBE_CODE, _BASE_PLACEHOLDER]
+        with span("probe interpreter", python=os.fspath(python)):
+            output = subprocess.check_output(args, text=True).strip()
+        data = json.loads(output)
+        write_json(cache_path, data)
+        info = InterpreterInfo(**data)
+    _PROBED[key] = info
+    return info
+
+
+# Environment variables changing which interpreter the launcher picks.
+_PY_VARIABLES = ["PY_PYTHON", "PY_PYTHON2", "PY_PYTHON3", "VIRTUAL_ENV"]
+
+
+def _iter_registered_pythons() -> Iterator[str]:
+    """Interpreters registered on Windows (PEP 514), where py finds them.
+    """
+    if sys.platform != "win32":
+        return
+    import winreg
+
+    roots = [
+        (winreg.HKEY_CURRENT_USER, 0),
+        (winreg.HKEY_LOCAL_MACHINE, winreg.KEY_WOW64_64KEY),
+        (winreg.HKEY_LOCAL_MACHINE, winreg.KEY_WOW64_32KEY),
+    ]
+    for root, access in roots:
+        try:
+            key = winreg.OpenKey(
+                root, r"Software\Python", 0, winreg.KEY_READ | access
+            )
+        except OSError:
+            continue
+        with key:
+            for i in range(winreg.QueryInfoKey(key)[0]):
+                company = winreg.EnumKey(key, i)
+                with winreg.OpenKey(key, company) as company_key:
+                    for j in range(winreg.QueryInfoKey(company_key)[0]):
+                        tag = winreg.EnumKey(company_key, j)
+                        yield f"{root}:{access}:{company}/{tag}"
+
+
+def _iter_path_states() -> Iterator[str]:
+    """Directories in PATH, where py finds interpreters on POSIX.
+
+    A directory's mtime changes when an executable is added or removed.
+    """
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        try:
+            stat = os.stat(directory)
+        except OSError:
+            continue
+        yield f"{directory}:{stat.st_mtime_ns}"
+
+
+def _get_py_installations() -> List[str]:
+    """Identify interpreters the launcher may pick from.
+
+    This changes whenever an interpreter is installed or removed, so the
+    launcher is asked again.
+    """
+    variables = [f"{k}={os.environ.get(k)}" for k in _PY_VARIABLES]
+    if sys.platform == "win32":
+        return [*variables, *_iter_registered_pythons()]
+    return [*variables, *_iter_path_states()]
+
+
+def _find_python_with_py(python: str) -> Optional[pathlib.Path]:
+    py = shutil.which("py")
+    if not py:
+        raise _envs.PyUnavailable()
+    key = _get_cache_key(
+        python,
+        *_get_file_identity(pathlib.Path(py)),
+        *_get_py_installations(),
+    )
+    cache_path = _get_cache_path("py", key)
+    cached = read_json(cache_path)
+    if isinstance(cached, str) and os.path.isfile(cached):
+        return pathlib.Path(cached)
+    with span("resolve interpreter", python=python):
+        resolved = _envs.resolve_python(python)
+    if resolved:
+        write_json(cache_path, os.fspath(resolved))
+    return resolved
+
+
+def resolve_python(python: str) -> Optional[pathlib.Path]:
+    """Resolve an interpreter specification like `_envs.resolve_python()`.
+
+    Lookups through the Python launcher are cached, since they require
+    starting the interpreter.
+    """
+    if _envs._PY_VER_RE.match(python):
+        return _find_python_with_py(python)
+    return _envs.resolve_python(python)
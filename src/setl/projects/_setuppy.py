@@ -0,0 +1,462 @@
+"""Run setup.py with Setl's build extensions.
+
+This is run as a script with the target interpreter, so it must stay
+compatible with every Python version Setl can build for, and must not import
+anything from Setl.
+
+Usage is the same as running setup.py, with the script name (or ``-c`` and
+code) as the first argument::
+
+    python _setuppy.py setup.py build_ext
+    python _setuppy.py -c "from setuptools import setup; setup()" build_ext
+
+Compilation is parallelized across source files and across extensions, with
+at most ``SETL_BUILD_JOBS`` compiler processes running at once. This works
+with any Setuptools (or Distutils) version, whether it has a native
+``--parallel`` option or not. Output of each compiler process is collected,
+and written out when the process finishes, so it does not interleave.
+Distutils is only patched for this once ``build_ext`` or ``build_clib`` runs
+for a distribution with something to compile.
+
+If ``SETL_OBJECT_CACHE_DIR`` is set, objects compiled by Unix-like compilers
+are cached there, keyed by the preprocessed source and the command line.
+Unchanged sources are restored from the cache instead of being compiled.
+Cache statistics are written to ``SETL_OBJECT_CACHE_STATS`` as JSON on exit.
+
+With ``--serve FD`` (POSIX only), Setuptools is imported once, and setup.py
+is run in a forked child for each request, so repeated runs do not need to
+import it again. Each request is a line of JSON containing the arguments
+(same as above) read from stdin; the exit status of each run is written as a
+line of JSON to file descriptor FD.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+
+
+_JOBS = max(int(os.environ.get("SETL_BUILD_JOBS") or 1), 1)
+
+_SEMAPHORE = threading.BoundedSemaphore(_JOBS)
+
+_OUTPUT_LOCK = threading.Lock()
+
+_CACHE_DIR = os.environ.get("SETL_OBJECT_CACHE_DIR")
+
+_CACHE_STATS_PATH = os.environ.get("SETL_OBJECT_CACHE_STATS")
+
+_CACHE_STATS = {"hits": 0, "misses": 0, "uncacheable": 0}
+
+_CACHE_STATS_LOCK = threading.Lock()
+
+
+def _write_output(cmd, output):
+    with _OUTPUT_LOCK:
+        sys.stdout.flush()
+        out = getattr(sys.stdout, "buffer", sys.stdout)
+        line = " ".join(str(c) for c in cmd)
+        out.write((line + "\n").encode("utf-8"))
+        out.write(output)
+        sys.stdout.flush()
+
+
+def _get_spawn_env(env):
+    """Environment to run a compiler in, the same as Distutils' spawn uses.
+    """
+    if sys.platform != "darwin":
+        return env
+    env = dict(os.environ if env is None else env)
+    try:
+        from distutils.util import MACOSX_VERSION_VAR, get_macosx_target_ver
+    except ImportError:  # Distutils before Setuptools vendored it.
+        import sysconfig
+
+        target = sysconfig.get_config_var("MACOSX_DEPLOYMENT_TARGET")
+        if target:
+            env.setdefault("MACOSX_DEPLOYMENT_TARGET", str(target))
+    else:
+        target = get_macosx_target_ver()
+        if target:
+            env[MACOSX_VERSION_VAR] = target
+    return env
+
+
+def _run_compiler(cmd, env=None, **kwargs):
+    """Run a compiler process, and write its output when it finishes.
+
+    At most ``SETL_BUILD_JOBS`` processes run at once.
+
+    :returns: The exit status.
+    :raises OSError: The process could not be started.
+    """
+    with _SEMAPHORE:
+        kwargs.update(
+            env=_get_spawn_env(env),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        proc = subprocess.Popen(cmd, **kwargs)
+        output, _ = proc.communicate()
+    _write_output(cmd, output)
+    return proc.returncode
+
+
+def _spawn(cmd, search_path=1, verbose=0, dry_run=0, env=None):
+    """Replacement for ``distutils.spawn.spawn`` with output collected.
+    """
+    from distutils.errors import DistutilsExecError
+
+    cmd = list(cmd)
+    if dry_run:
+        return
+    if search_path:
+        which = getattr(shutil, "which", None)
+        if which is None:  # Python 2.
+            from distutils.spawn import find_executable as which
+        executable = which(cmd[0])
+        if executable is not None:
+            cmd[0] = executable
+    try:
+        returncode = _run_compiler(cmd, env)
+    except OSError as e:
+        raise DistutilsExecError(
+            "command %r failed: %s" % (cmd[0], e.args[-1])
+        )
+    if returncode:
+        raise DistutilsExecError(
+            "command %r failed with exit status %d" % (cmd[0], returncode)
+        )
+
+
+def _call(self, cmd, env=None, **kwargs):
+    """Replacement for ``CCompiler.call`` with output collected.
+
+    Newer Setuptools run compilers with this instead of `_spawn`.
+    """
+    cmd = list(cmd)
+    returncode = _run_compiler(cmd, env, **kwargs)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def _run_in_parallel(func, items):
+    """Call ``func`` on each item in a thread, and wait for all of them.
+
+    The number of concurrent compiler processes is limited in
+    `_run_compiler`, so the threads don't need to be pooled; they mostly wait
+    on each other.
+    The first exception raised is re-raised when all threads finish.
+    """
+    errors = []
+
+    def target(item):
+        try:
+            func(item)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=target, args=(i,)) for i in items]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+
+
+def _patch_compiler(ccompiler):
+    CCompiler = ccompiler.CCompiler
+
+    def compile(
+        self,
+        sources,
+        output_dir=None,
+        macros=None,
+        include_dirs=None,
+        debug=0,
+        extra_preargs=None,
+        extra_postargs=None,
+        depends=None,
+    ):
+        # Same as CCompiler.compile, but objects are compiled concurrently.
+        macros, objects, extra_postargs, pp_opts, build = self._setup_compile(
+            output_dir, macros, include_dirs, sources, depends, extra_postargs
+        )
+        cc_args = self._get_cc_args(pp_opts, debug, extra_preargs)
+
+        def compile_one(obj):
+            src, ext = build[obj]
+            self._compile(obj, src, ext, cc_args, extra_postargs, pp_opts)
+
+        _run_in_parallel(compile_one, [obj for obj in objects if obj in build])
+        return objects
+
+    # Only the default implementation (used by Unix-like compilers) is
+    # replaced. Compilers overriding compile() still benefit from cross-
+    # extension parallelism.
+    CCompiler.compile = compile
+    ccompiler.spawn = _spawn
+    if hasattr(CCompiler, "call"):
+        CCompiler.call = _call
+
+
+def _is_library(ext):
+    try:
+        from setuptools.extension import Library  # type: ignore
+    except ImportError:
+        return False
+    return isinstance(ext, Library)
+
+
+def _patch_build_ext(build_ext):
+    def build_extensions(self):
+        self.check_extensions_list(self.extensions)
+
+        def build_one(ext):
+            filter_errors = getattr(self, "_filter_build_errors", None)
+            if filter_errors is None:
+                self.build_extension(ext)
+                return
+            with filter_errors(ext):
+                self.build_extension(ext)
+
+        # Setuptools swaps self.compiler while building a Library, so those
+        # are built one by one first. Other extensions may link against them.
+        for ext in self.extensions:
+            if _is_library(ext):
+                build_one(ext)
+        _run_in_parallel(
+            build_one, [e for e in self.extensions if not _is_library(e)]
+        )
+
+    build_ext.build_extensions = build_extensions
+
+
+def _patch_on_run(command, has_sources):
+    """Patch Distutils for parallel builds when ``command`` has sources.
+    """
+    original = command.run
+
+    def run(self):
+        if has_sources(self.distribution):
+            _patch_parallel()
+        original(self)
+
+    command.run = run
+
+
+_patched_parallel = False
+
+
+def _patch_parallel():
+    global _patched_parallel
+    if _patched_parallel:
+        return
+    _patched_parallel = True
+    from distutils import ccompiler
+    from distutils.command import build_ext
+
+    _patch_compiler(ccompiler)
+    _patch_build_ext(build_ext.build_ext)
+
+
+def _count(name):
+    with _CACHE_STATS_LOCK:
+        _CACHE_STATS[name] += 1
+
+
+def _write_stats():
+    with open(_CACHE_STATS_PATH, "w") as f:
+        json.dump(_CACHE_STATS, f)
+
+
+def _has_debug_info(cmd):
+    """Whether the compiler command line generates debug info.
+    """
+    debug = False
+    for arg in cmd:
+        if arg.startswith("-g"):
+            debug = arg != "-g0"  # The last one wins.
+    return debug
+
+
+def _get_object_key(compiler_so, src, cc_args, extra_postargs):
+    """Hash the preprocessed source and the command line to compile it.
+
+    The working directory is also hashed if debug info is generated.
+
+    Returns None if the source can't be preprocessed. ``-E`` takes precedence
+    over ``-c`` (in ``cc_args``) in all Unix-like compilers we know of.
+    """
+    cmd = compiler_so + cc_args + [src] + extra_postargs
+    with _SEMAPHORE:
+        try:
+            proc = subprocess.Popen(
+                compiler_so + cc_args + ["-E", src] + extra_postargs,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except OSError:
+            return None
+        output, _ = proc.communicate()
+    if proc.returncode:
+        return None
+    h = hashlib.sha256()
+    h.update("\0".join(cmd).encode("utf-8"))
+    h.update(b"\0\0")
+    h.update(output)
+    if _has_debug_info(cmd):
+        # Debug info contains absolute paths to the build directory, like
+        # ccache's hash_dir.
+        h.update(b"\0\0")
+        h.update(os.getcwd().encode("utf-8"))
+    return h.hexdigest()
+
+
+def _store_object(obj, cached):
+    directory = os.path.dirname(cached)
+    try:
+        os.makedirs(directory)
+    except OSError:
+        pass
+    try:
+        fd, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    except (IOError, OSError):
+        return
+    try:
+        os.close(fd)
+        shutil.copyfile(obj, temp)
+        getattr(os, "replace", os.rename)(temp, cached)
+    except (IOError, OSError):
+        try:
+            os.unlink(temp)
+        except OSError:
+            pass
+
+
+def _patch_object_cache(unixccompiler):
+    original = unixccompiler.UnixCCompiler._compile
+
+    def _compile(self, obj, src, ext, cc_args, extra_postargs, pp_opts):
+        compiler_so = list(getattr(self, "compiler_so", None) or [])
+        if src.endswith((".cc", ".cpp", ".cxx", ".c++")):
+            compiler_so = list(getattr(self, "compiler_so_cxx", compiler_so))
+        key = None
+        if compiler_so:
+            key = _get_object_key(compiler_so, src, cc_args, extra_postargs)
+        if key is None:
+            _count("uncacheable")
+            return original(
+                self, obj, src, ext, cc_args, extra_postargs, pp_opts
+            )
+
+        cached = os.path.join(_CACHE_DIR, key[:2], key + ".o")
+        if os.path.exists(cached):
+            try:
+                shutil.copyfile(cached, obj)
+                os.utime(cached, None)  # Mark as recently used.
+            except (IOError, OSError):
+                pass
+            else:
+                _count("hits")
+                return
+
+        original(self, obj, src, ext, cc_args, extra_postargs, pp_opts)
+        _count("misses")
+        _store_object(obj, cached)
+
+    unixccompiler.UnixCCompiler._compile = _compile
+    if _CACHE_STATS_PATH:
+        atexit.register(_write_stats)
+
+
+def _patch():
+    # Import Setuptools first so it can substitute its own Distutils.
+    try:
+        import setuptools  # type: ignore  # noqa: F401
+    except ImportError:
+        pass
+    from distutils import unixccompiler
+    from distutils.command import build_clib, build_ext
+
+    if _JOBS > 1:
+        _patch_on_run(build_ext.build_ext, lambda d: d.has_ext_modules())
+        _patch_on_run(build_clib.build_clib, lambda d: d.has_c_libraries())
+    if _CACHE_DIR:
+        _patch_object_cache(unixccompiler)
+
+
+def _get_exit_status(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def serve(fd):
+    sys.path[0] = os.getcwd()
+    _patch()
+    responses = os.fdopen(fd, "w")
+
+    # Ctrl-C is for the running setup.py. This process exits when Setl closes
+    # its stdin.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    for line in iter(sys.stdin.readline, ""):
+        args = json.loads(line)["args"]
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:  # Run setup.py in the child, and exit with it.
+            responses.close()
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            run(args, patch=False)
+            sys.exit(0)
+        _, status = os.waitpid(pid, 0)
+        responses.write(json.dumps({"returncode": _get_exit_status(status)}))
+        responses.write("\n")
+        responses.flush()
+
+    # Exit handlers (e.g. to write cache statistics) are for the children.
+    os._exit(0)
+
+
+def run(args, patch=True):
+    # Make sys.path look as if setup.py is run directly, instead of containing
+    # the directory of this script.
+    sys.path[0] = os.getcwd()
+
+    if args[0] == "-c":
+        filename = "-c"
+        source = args[1]
+        sys.argv = ["-c"] + args[2:]
+    else:
+        filename = args[0]
+        with open(filename, "rb") as f:
+            source = f.read()
+        sys.argv = args
+
+    if patch and (_JOBS > 1 or _CACHE_DIR):
+        _patch()
+
+    code = compile(source, filename, "exec")
+    exec(code, {"__name__": "__main__", "__file__": filename})
+
+
+def main():
+    if sys.argv[1] == "--serve":
+        serve(int(sys.argv[2]))
+    else:
+        run(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
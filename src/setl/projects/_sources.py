@@ -0,0 +1,268 @@
+"""Enumerate and fingerprint files in a project's source tree.
+"""
+
+__all__ = [
+    "FileDigest",
+    "Fingerprint",
+    "get_stat_digest",
+    "get_vcs_digest",
+    "hash_files",
+    "is_source_path",
+    "iter_source_dirs",
+    "iter_source_files",
+    "iter_source_relpaths",
+]
+
+import concurrent.futures
+import dataclasses
+import hashlib
+import mmap
+import os
+import pathlib
+import stat
+import time
+
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from setl._cache import read_json, write_json
+
+
+# Directories never containing inputs to the build.
+_EXCLUDED_DIRS = {"__pycache__", "node_modules", "venv"}
+
+# Build output directories, only excluded at the project root, since a package
+# may legitimately contain e.g. a "build" subpackage.
+_EXCLUDED_ROOT_DIRS = {"build", "dist"}
+
+_EXCLUDED_SUFFIXES = (".egg-info", ".pyc", ".pyo")
+
+
+def _is_excluded(name: str) -> bool:
+    # Hidden entries include VCS directories, virtual environments (.venv),
+    # and tool caches (.tox, .mypy_cache, etc.).
+    return (
+        name.startswith(".")
+        or name in _EXCLUDED_DIRS
+        or name.endswith(_EXCLUDED_SUFFIXES)
+    )
+
+
+def _walk(root: pathlib.Path) -> Iterator[Tuple[str, List[str]]]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(n for n in dirnames if not _is_excluded(n))
+        if dirpath == os.fspath(root):
+            dirnames[:] = [n for n in dirnames if n not in _EXCLUDED_ROOT_DIRS]
+        yield dirpath, filenames
+
+
+def iter_source_files(root: pathlib.Path) -> Iterator[pathlib.Path]:
+    """Iterate through files in the source tree, in a stable order.
+
+    Build outputs, VCS directories, and caches are skipped. This is a
+    superset of files that affect the build, which is good enough for change
+    detection.
+    """
+    for dirpath, filenames in _walk(root):
+        for filename in sorted(filenames):
+            if not _is_excluded(filename):
+                yield pathlib.Path(dirpath, filename)
+
+
+def iter_source_relpaths(root: pathlib.Path) -> Iterator[str]:
+    """Like `iter_source_files()`, but paths are relative with forward slashes.
+    """
+    start = len(os.fspath(root)) + 1
+    for dirpath, filenames in _walk(root):
+        prefix = dirpath[start:].replace(os.sep, "/")
+        for filename in sorted(filenames):
+            if not _is_excluded(filename):
+                yield f"{prefix}/{filename}" if prefix else filename
+
+
+def iter_source_dirs(root: pathlib.Path) -> Iterator[pathlib.Path]:
+    """Iterate through directories `iter_source_files()` looks into.
+    """
+    for dirpath, _ in _walk(root):
+        yield pathlib.Path(dirpath)
+
+
+def is_source_path(root: pathlib.Path, path: pathlib.Path) -> bool:
+    """Whether ``path`` is (or would be) in the source tree under ``root``.
+    """
+    try:
+        parts = path.relative_to(root).parts
+    except ValueError:
+        return False
+    if parts and parts[0] in _EXCLUDED_ROOT_DIRS:
+        return False
+    return not any(_is_excluded(part) for part in parts)
+
+
+def get_stat_digest(root: pathlib.Path, paths: Iterable[pathlib.Path]) -> str:
+    """Digest of the files' paths, sizes, and modification times.
+
+    This is cheap to compute since the files are not read, and changes
+    whenever a file is added, removed, or modified.
+    """
+    h = hashlib.sha256()
+    for path in paths:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        relpath = path.relative_to(root).as_posix()
+        h.update(f"{relpath}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+# Files at least this large are hashed from a memory map instead of read into
+# memory. Smaller files are cheaper to read in one go.
+_MMAP_THRESHOLD = 64 * 1024
+
+# Files modified this recently (in nanoseconds) are not put in the stat cache,
+# since they may be modified again without changing the modification time.
+_RACY_WINDOW = 2_000_000_000
+
+_STAT_CACHE_VERSION = 1
+
+
+@dataclasses.dataclass(frozen=True)
+class FileDigest:
+    path: str  # Relative to the root, with forward slashes.
+    sha256: str
+    executable: bool
+
+
+@dataclasses.dataclass(frozen=True)
+class Fingerprint:
+    files: List[FileDigest]
+
+    @property
+    def digest(self) -> str:
+        """Digest of the files' paths, contents, and executable bits.
+        """
+        h = hashlib.sha256()
+        for f in self.files:
+            h.update(f"{f.path}\0{f.executable:d}\0{f.sha256}\n".encode())
+        return h.hexdigest()
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "digest": self.digest,
+            "files": [dataclasses.asdict(f) for f in self.files],
+        }
+
+
+def _hash_file(path: str) -> Optional[str]:
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:  # Removed after being listed.
+        return None
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size < _MMAP_THRESHOLD:
+            return hashlib.sha256(f.read()).hexdigest()
+        try:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):  # E.g. truncated since stat.
+            return hashlib.sha256(f.read()).hexdigest()
+        with m:
+            return hashlib.sha256(m).hexdigest()
+
+
+_StatKey = List[int]
+
+
+def _get_stat_key(result: os.stat_result) -> _StatKey:
+    return [result.st_size, result.st_mtime_ns, result.st_ino, result.st_mode]
+
+
+def hash_files(
+    root: pathlib.Path,
+    relpaths: Iterable[str],
+    jobs: Optional[int] = None,
+    stat_cache: Optional[pathlib.Path] = None,
+) -> Fingerprint:
+    """Hash files' contents in worker threads.
+
+    :param relpaths: Paths relative to ``root``, with forward slashes.
+    :param jobs: Number of worker threads (default: number of CPUs).
+    :param stat_cache: File to remember digests in, keyed by the files'
+        stat results, so unchanged files are not read again.
+    """
+    cached: Dict[str, Any] = {}
+    if stat_cache is not None:
+        data = read_json(stat_cache)
+        if data and data.get("version") == _STAT_CACHE_VERSION:
+            cached = data["files"]
+
+    entries: Dict[str, Tuple[_StatKey, Optional[str]]] = {}
+    base = os.fspath(root)
+    pending: List[Tuple[str, str]] = []
+    for relpath in relpaths:
+        path = f"{base}{os.sep}{relpath}"
+        try:
+            key = _get_stat_key(os.stat(path))
+        except FileNotFoundError:
+            continue
+        entry = cached.get(relpath)
+        if entry and entry[0] == key:
+            entries[relpath] = (key, entry[1])
+        else:
+            entries[relpath] = (key, None)
+            pending.append((relpath, path))
+
+    if pending:
+        with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+            digests = executor.map(_hash_file, (p for _, p in pending))
+            for (relpath, _), digest in zip(pending, digests):
+                entries[relpath] = (entries[relpath][0], digest)
+
+    files = [
+        FileDigest(relpath, digest, bool(key[3] & stat.S_IXUSR))
+        for relpath, (key, digest) in sorted(entries.items())
+        if digest is not None
+    ]
+
+    if stat_cache is not None and (pending or len(entries) != len(cached)):
+        racy = time.time_ns() - _RACY_WINDOW
+        data = {
+            "version": _STAT_CACHE_VERSION,
+            "files": {
+                relpath: [key, digest]
+                for relpath, (key, digest) in entries.items()
+                if digest is not None and key[1] < racy
+            },
+        }
+        write_json(stat_cache, data)
+
+    return Fingerprint(files)
+
+
+def get_vcs_digest(root: pathlib.Path) -> str:
+    """Digest of the Git checkout's current commit and tags.
+
+    Plugins like setuptools-scm derive the version from these, so they may
+    change what is built without changing any source file.
+    """
+    git_dir = root.joinpath(".git")
+    if not git_dir.is_dir():
+        return ""
+    h = hashlib.sha256()
+    paths = [git_dir.joinpath("HEAD"), git_dir.joinpath("packed-refs")]
+    try:
+        head = git_dir.joinpath("HEAD").read_text("utf8").strip()
+    except OSError:
+        return ""
+    if head.startswith("ref:"):
+        paths.append(git_dir.joinpath(head[4:].strip()))
+    tags = git_dir.joinpath("refs", "tags")
+    paths.extend(sorted(p for p in tags.glob("**/*") if p.is_file()))
+    for path in paths:
+        try:
+            content = path.read_bytes()
+        except OSError:
+            continue
+        relpath = path.relative_to(git_dir).as_posix()
+        h.update(f"{relpath}\0".encode() + content + b"\n")
+    return h.hexdigest()
@@ -0,0 +1,139 @@
+"""Delete directories without waiting for it.
+
+Deleting a build environment can take seconds (more on network file systems),
+since it contains tens of thousands of files. Instead, directories are renamed
+into a trash directory, which is atomic and instant, and the trash is emptied
+later, either in a detached process, or in worker threads.
+
+This file is also run as a script to empty the trash in the background, so it
+must only import from the standard library.
+"""
+
+__all__ = ["empty_trash", "get_trash_dir", "move_to_trash"]
+
+import concurrent.futures
+import contextlib
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+import uuid
+
+from typing import Iterator, List, Optional
+
+
+_TRASH_DIR_NAME = ".setl-trash"
+
+# Number of files each worker thread removes at a time.
+_BATCH_SIZE = 256
+
+
+def get_trash_dir(build_dir: pathlib.Path) -> pathlib.Path:
+    return build_dir.joinpath(_TRASH_DIR_NAME)
+
+
+def _remove_now(path: pathlib.Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+def move_to_trash(path: pathlib.Path, trash_dir: pathlib.Path):
+    """Move ``path`` out of the way, so it can be deleted later.
+
+    The path is deleted immediately if it cannot be moved, e.g. if it is in
+    use on Windows, or on a different device than the trash directory.
+    """
+    if path.is_symlink():  # Nothing to delete behind the link.
+        path.unlink()
+        return
+    try:
+        trash_dir.mkdir(parents=True, exist_ok=True)
+        os.replace(path, trash_dir.joinpath(uuid.uuid4().hex))
+    except OSError:
+        _remove_now(path)
+
+
+def _iter_batches(root: str) -> Iterator[List[str]]:
+    batch = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Links to directories are listed as directories, but are not walked
+        # into; they are removed like files.
+        names = filenames + [
+            n for n in dirnames if os.path.islink(os.path.join(dirpath, n))
+        ]
+        for name in names:
+            batch.append(os.path.join(dirpath, name))
+            if len(batch) >= _BATCH_SIZE:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _unlink_all(paths: List[str]):
+    for path in paths:
+        with contextlib.suppress(OSError):
+            os.unlink(path)
+
+
+def _remove_directories(root: str):
+    # Remove whatever is left, including the now-empty directories.
+    shutil.rmtree(root, ignore_errors=True)
+
+
+def _empty_in_threads(trash_dir: pathlib.Path, jobs: int):
+    """Remove files in the trash in worker threads, and wait for them.
+    """
+    root = os.fspath(trash_dir)
+    with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+        for _ in executor.map(_unlink_all, _iter_batches(root)):
+            pass
+    _remove_directories(root)
+
+
+def _empty_in_background(trash_dir: pathlib.Path):
+    """Start a detached process to empty the trash, and return immediately.
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), os.fspath(trash_dir)]
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = (
+            subprocess.DETACHED_PROCESS  # type: ignore
+            | subprocess.CREATE_NEW_PROCESS_GROUP  # type: ignore
+        )
+    else:
+        kwargs["start_new_session"] = True
+    subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        close_fds=True,
+        **kwargs,
+    )
+
+
+def empty_trash(trash_dir: pathlib.Path, wait: bool, jobs: Optional[int]):
+    """Delete everything in the trash directory.
+
+    :param wait: Delete with worker threads, and return after the trash is
+        empty. Otherwise deletion happens in a detached process.
+    :param jobs: Number of worker threads if ``wait`` is true.
+    """
+    if not trash_dir.is_dir():
+        return
+    if wait:
+        _empty_in_threads(trash_dir, jobs or os.cpu_count() or 1)
+    else:
+        _empty_in_background(trash_dir)
+
+
+def main():
+    _remove_directories(sys.argv[1])
+
+
+if __name__ == "__main__":
+    main()
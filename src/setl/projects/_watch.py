@@ -0,0 +1,240 @@
+"""Watch a project's source tree for changes.
+
+On Linux, inotify is used through ctypes, so changes are reported as soon as
+they happen without scanning the tree. Elsewhere (or if inotify is not
+usable, e.g. the watch limit is reached), the tree is polled by comparing
+file sizes and modification times.
+"""
+
+__all__ = ["Changes", "Watcher", "create_watcher"]
+
+import ctypes
+import ctypes.util
+import dataclasses
+import errno
+import logging
+import os
+import pathlib
+import select
+import struct
+import time
+
+from typing import Dict, Optional, Set, Tuple
+
+from ._sources import is_source_path, iter_source_dirs, iter_source_files
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass()
+class Changes:
+    paths: Set[pathlib.Path]
+
+    # When the first change was seen, in `time.monotonic()`.
+    first_seen: float
+
+    # Changes may have been missed, so everything should be considered
+    # changed, e.g. because inotify's event queue overflowed.
+    overflowed: bool = False
+
+
+class Watcher:
+    """Base class of watchers.
+    """
+
+    def __init__(self, root: pathlib.Path):
+        self.root = root
+
+    def close(self):
+        pass
+
+    def _read(self, timeout: Optional[float]) -> Optional[Changes]:
+        """Return changes seen within ``timeout``, or None if there are none.
+        """
+        raise NotImplementedError()
+
+    def wait(self, debounce: float) -> Changes:
+        """Block until something changes.
+
+        After the first change, wait until there are no more changes for
+        ``debounce`` seconds, so a burst of changes (e.g. switching branches)
+        is reported together.
+        """
+        changes = None
+        while changes is None:
+            changes = self._read(None)
+        while True:
+            more = self._read(debounce)
+            if more is None:
+                return changes
+            changes.paths.update(more.paths)
+            changes.overflowed = changes.overflowed or more.overflowed
+
+
+_Snapshot = Dict[pathlib.Path, Tuple[int, int]]
+
+
+class PollingWatcher(Watcher):
+    def __init__(self, root: pathlib.Path, interval: float):
+        super().__init__(root)
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> _Snapshot:
+        snapshot = {}
+        for path in iter_source_files(self.root):
+            try:
+                stat = path.stat()
+            except OSError:  # Removed after being listed.
+                continue
+            snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def _read(self, timeout: Optional[float]) -> Optional[Changes]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(self.interval)
+            snapshot = self._scan()
+            paths = {
+                path
+                for path in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            if paths:
+                return Changes(paths, time.monotonic())
+        return None
+
+
+# Constants from <sys/inotify.h>.
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (
+    _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _InotifyUnavailable(Exception):
+    pass
+
+
+class InotifyWatcher(Watcher):
+    def __init__(self, root: pathlib.Path):
+        super().__init__(root)
+        library = ctypes.util.find_library("c")
+        try:
+            self._libc = ctypes.CDLL(library, use_errno=True)
+            self._libc.inotify_init1
+        except (OSError, AttributeError, TypeError):
+            raise _InotifyUnavailable()
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise _InotifyUnavailable()
+        self._paths: Dict[int, pathlib.Path] = {}
+        try:
+            for directory in iter_source_dirs(root):
+                self._add_watch(directory)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _add_watch(self, directory: pathlib.Path):
+        path = os.fsencode(directory)
+        wd = self._libc.inotify_add_watch(self._fd, path, _WATCH_MASK)
+        if wd >= 0:
+            self._paths[wd] = directory
+            return
+        code = ctypes.get_errno()
+        if code == errno.ENOSPC:  # Limit of watches reached.
+            raise _InotifyUnavailable()
+        if code not in (errno.ENOENT, errno.ENOTDIR):  # Already gone.
+            raise OSError(code, os.strerror(code), os.fspath(directory))
+
+    def _add_new_directory(self, directory: pathlib.Path) -> Set[pathlib.Path]:
+        # Files may be created in the directory before the watch is added,
+        # so they are also reported as changed.
+        paths = set()
+        for subdirectory in iter_source_dirs(directory):
+            self._add_watch(subdirectory)
+        for path in iter_source_files(directory):
+            paths.add(path)
+        return paths
+
+    def _read(self, timeout: Optional[float]) -> Optional[Changes]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return None
+        try:
+            data = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return None
+        changes = Changes(set(), time.monotonic())
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, size = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset : offset + size].rstrip(b"\0")
+            offset += size
+            if mask & _IN_Q_OVERFLOW:
+                changes.overflowed = True
+                continue
+            if mask & _IN_IGNORED:
+                self._paths.pop(wd, None)
+                continue
+            directory = self._paths.get(wd)
+            if directory is None:
+                continue
+            path = directory.joinpath(os.fsdecode(name)) if name else directory
+            if not is_source_path(self.root, path):
+                continue
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    changes.paths.update(self._add_new_directory(path))
+                changes.paths.add(path)
+            elif name:
+                changes.paths.add(path)
+        if not changes.paths and not changes.overflowed:
+            return None
+        return changes
+
+
+def create_watcher(
+    root: pathlib.Path, poll_interval: Optional[float]
+) -> Watcher:
+    """Create a watcher for the source tree under ``root``.
+
+    :param poll_interval: Poll the tree at this interval (in seconds). If
+        None, inotify is used if possible, and polling at 0.5 seconds if not.
+    """
+    if poll_interval is None:
+        try:
+            return InotifyWatcher(root)
+        except _InotifyUnavailable:
+            logger.info("inotify is unavailable, polling for changes")
+        poll_interval = 0.5
+    return PollingWatcher(root, poll_interval)
@@ -0,0 +1,99 @@
+"""Local wheelhouse to install requirements from.
+
+The wheelhouse is a flat directory of wheels, populated by
+``setl wheelhouse fill``. When it exists, requirements are first built into it
+with ``pip wheel`` (which reuses wheels already in it), and then installed
+from it, so wheels built from sdists are only built once. In offline mode, pip
+is pointed *only* to it, so environments can be populated without network
+access.
+"""
+
+__all__ = [
+    "allow_index",
+    "get_index_args",
+    "get_pip_install_commands",
+    "get_wheelhouse",
+    "is_offline",
+]
+
+import contextlib
+import os
+import pathlib
+
+from typing import Iterator, List, Sequence
+
+from setl._cache import get_cache_dir
+from setl._environ import get_flag
+
+
+def get_wheelhouse() -> pathlib.Path:
+    """Get the wheelhouse directory.
+
+    This is ``SETL_WHEELHOUSE`` if set, otherwise in the user cache directory.
+    """
+    value = os.environ.get("SETL_WHEELHOUSE")
+    if value:
+        return pathlib.Path(value)
+    return get_cache_dir().joinpath("wheelhouse")
+
+
+_index_allowed = False
+
+
+@contextlib.contextmanager
+def allow_index() -> Iterator[None]:
+    """Use the package index even in offline mode, e.g. to fill the wheelhouse.
+    """
+    global _index_allowed
+    previous, _index_allowed = _index_allowed, True
+    try:
+        yield
+    finally:
+        _index_allowed = previous
+
+
+def is_offline() -> bool:
+    """Whether requirements should only be installed from the wheelhouse.
+
+    This is turned on by ``SETL_OFFLINE`` (also set by the ``--offline`` flag),
+    or by explicitly choosing a wheelhouse with ``SETL_WHEELHOUSE``, unless
+    in an `allow_index()` context.
+    """
+    if _index_allowed:
+        return False
+    return get_flag("SETL_OFFLINE") or bool(os.environ.get("SETL_WHEELHOUSE"))
+
+
+def get_index_args() -> List[str]:
+    """Arguments to pass to ``pip install`` to use the wheelhouse.
+    """
+    wheelhouse = get_wheelhouse()
+    if is_offline():
+        return ["--no-index", "--find-links", os.fspath(wheelhouse)]
+    if wheelhouse.is_dir():
+        return ["--find-links", os.fspath(wheelhouse)]
+    return []
+
+
+def get_pip_install_commands(
+    interpreter: pathlib.Path,
+    options: Sequence[str],
+    requirements: Sequence[str],
+) -> List[List[str]]:
+    """Commands to install requirements with pip, to run in order.
+
+    If the wheelhouse exists, and the index can be used, requirements are
+    built into the wheelhouse first, and installed from it.
+
+    :param options: Options for ``pip install``, e.g. ``--prefix``.
+    """
+    pip = [os.fspath(interpreter), "-m", "pip"]
+    wheelhouse = get_wheelhouse()
+    if is_offline() or not wheelhouse.is_dir():
+        return [[*pip, "install", *options, *get_index_args(), *requirements]]
+    links = ["--find-links", os.fspath(wheelhouse)]
+    return [
+        [*pip, "wheel", "--wheel-dir", os.fspath(wheelhouse), *links]
+        + list(requirements),
+        [*pip, "install", *options, "--no-index", *links, *requirements],
+    ]
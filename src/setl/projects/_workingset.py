@@ -0,0 +1,145 @@
+"""In-process index of distributions installed into a set of directories.
+
+This replaces ``pip list``, which needs a whole interpreter (and pip) to start
+only to tell us what is in a few ``site-packages`` directories. We read the
+metadata directory names instead, and only open metadata files when the name
+does not carry a version (e.g. ``setup.py develop`` egg-info).
+
+Each directory's index is cached in memory, and invalidated when the
+directory's mtime changes, which happens whenever an entry is added to or
+removed from it (i.e. a distribution is installed or uninstalled).
+"""
+
+__all__ = [
+    "DirectoryIndex",
+    "index_directory",
+    "iter_pth_entries",
+    "list_installed",
+]
+
+import dataclasses
+import os
+import pathlib
+
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from packaging.utils import canonicalize_name
+
+
+@dataclasses.dataclass(frozen=True)
+class DirectoryIndex:
+    mtime: int
+
+    # Names of the metadata directories (and files) found in the directory.
+    entries: Tuple[str, ...]
+
+    # Installed distributions, as a `{canonical_name: version}` mapping.
+    versions: Dict[str, str]
+
+
+_INDEXES: Dict[str, DirectoryIndex] = {}
+
+
+def _read_version(path: pathlib.Path) -> Optional[str]:
+    """Read the version from metadata in a dist-info or egg-info.
+
+    An egg-info can be either a directory containing PKG-INFO, or a file
+    containing the metadata directly.
+    """
+    if path.is_dir():
+        candidates = [path.joinpath("METADATA"), path.joinpath("PKG-INFO")]
+    else:
+        candidates = [path]
+    for candidate in candidates:
+        try:
+            f = candidate.open(encoding="utf8", errors="replace")
+        except OSError:
+            continue
+        with f:
+            for line in f:
+                if ":" not in line:  # End of metadata.
+                    break
+                k, v = line.strip().split(":", 1)
+                if k.lower() == "version":
+                    return v.strip()
+    return None
+
+
+def _iter_distributions(
+    directory: pathlib.Path, entries: Iterable[str]
+) -> Iterator[Tuple[str, str]]:
+    for entry in entries:
+        stem, ext = os.path.splitext(entry)
+        if ext not in (".dist-info", ".egg-info"):
+            continue
+        # Both formats escape dashes in name and version, so the first dash
+        # separates them. Egg-info may contain a trailing "-pyX.Y" part.
+        name, _, rest = stem.partition("-")
+        version: Optional[str] = rest.split("-", 1)[0]
+        if not version:
+            version = _read_version(directory.joinpath(entry))
+        if version:
+            yield canonicalize_name(name), version
+
+
+def index_directory(directory: pathlib.Path) -> DirectoryIndex:
+    """Index distributions installed directly in the directory.
+
+    A non-existent directory produces an empty index.
+    """
+    key = os.fspath(directory)
+    try:
+        mtime = directory.stat().st_mtime_ns
+    except FileNotFoundError:
+        return DirectoryIndex(mtime=0, entries=(), versions={})
+    index = _INDEXES.get(key)
+    if index is not None and index.mtime == mtime:
+        return index
+
+    entries = tuple(sorted(os.listdir(directory)))
+    versions: Dict[str, str] = {}
+    for name, version in _iter_distributions(directory, entries):
+        versions.setdefault(name, version)
+    index = DirectoryIndex(
+        mtime=mtime,
+        entries=tuple(
+            e for e in entries if e.endswith((".dist-info", ".egg-info"))
+        ),
+        versions=versions,
+    )
+    _INDEXES[key] = index
+    return index
+
+
+def list_installed(directories: Iterable[pathlib.Path]) -> Dict[str, str]:
+    """List versions of packages installed in given directories.
+
+    Directories are looked up in order; if a package is installed in multiple
+    directories, the first one wins, like on ``sys.path``.
+
+    Returns a `{canonical_name: version}` mapping.
+    """
+    workingset: Dict[str, str] = {}
+    for directory in directories:
+        for name, version in index_directory(directory).versions.items():
+            workingset.setdefault(name, version)
+    return workingset
+
+
+def iter_pth_entries(site_dir: pathlib.Path) -> Iterator[pathlib.Path]:
+    """Directories added to ``sys.path`` by .pth files in ``site_dir``.
+    """
+    try:
+        pth_files = sorted(site_dir.glob("*.pth"))
+    except OSError:
+        return
+    for pth_file in pth_files:
+        try:
+            lines = pth_file.read_text("utf8", "replace").splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith(("#", "import ", "import\t")):
+                continue
+            yield site_dir.joinpath(line)
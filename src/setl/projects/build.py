@@ -4,18 +4,38 @@ __all__ = ["BuildEnv", "ProjectBuildManagementMixin"]
 
 import contextlib
 import dataclasses
-import json
+import hashlib
+import logging
 import os
 import pathlib
-import shutil
 import subprocess
 
-from typing import Dict, Iterable, Iterator, Optional, Set
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TypeVar,
+)
 
 from packaging.requirements import Requirement
 from packaging.utils import canonicalize_name
 
-from ._envs import get_interpreter_quintuplet, resolve_python
+from setl._cache import get_cache_dir, read_json, write_json
+from setl._environ import get_flag
+from setl._tracing import span
+
+from ._installer import InstallFailed, find_pinned_wheels, install_wheels
+from ._lock import file_lock
+from ._probe import probe_interpreter, resolve_python
+from ._trash import empty_trash, get_trash_dir, move_to_trash
+from ._wheelhouse import get_pip_install_commands, get_wheelhouse
+from ._workingset import index_directory, list_installed
 from .meta import ProjectMetadataMixin
 
 
@@ -24,26 +44,15 @@ class InterpreterNotFound(Exception):
     spec: str
 
 
-_ENV_CONTAINER_NAME = ".isoenvs"
-
-
-_GET_PATHS_CODE = """
-from __future__ import print_function
+logger = logging.getLogger(__name__)
 
-import json
-import os
-import sys
-import sysconfig
+T = TypeVar("T")
 
-base = sys.argv[1]
-print(json.dumps(sysconfig.get_paths(vars={"base": base, "platbase": base})))
-"""
+_ENV_CONTAINER_NAME = ".isoenvs"
 
 
 def _get_env_paths(python: pathlib.Path, root: pathlib.Path) -> Dict[str, str]:
-    args = [os.fspath(python), "-c", _GET_PATHS_CODE, os.fspath(root)]
-    output = subprocess.check_output(args, text=True).strip()
-    return json.loads(output)
+    return probe_interpreter(python).get_env_paths(root)
 
 
 def _environ_path_format(*paths: Optional[str]) -> str:
@@ -56,12 +65,52 @@ class BuildEnv:
     interpreter: pathlib.Path
     libdirs: Set[pathlib.Path]
 
-    def __post_init__(self):
+    # Where Setuptools builds into, if redirected from the project's build
+    # directory and egg-info. See `ProjectSetupMixin.isolate_build_dirs()`.
+    build_dir: Optional[pathlib.Path] = None
+
+    # Project-specific prefix layered over a shared environment at ``root``.
+    # Requirements reported by the backend's hooks are installed here, since
+    # they may differ between projects sharing the environment. Libraries in
+    # it are included in ``libdirs``.
+    local_root: Optional[pathlib.Path] = None
+
+    def __post_init__(self) -> None:
         self._should_delete = False
+        self._resources: Dict[str, Any] = {}
+        self._exit_stack = contextlib.ExitStack()
 
     def mark_for_cleanup(self):
         self._should_delete = True
 
+    def enter_context(self, cm: ContextManager[T]) -> T:
+        """Tie a resource's lifetime to the environment.
+
+        The resource is exited when the environment's context exits.
+        """
+        return self._exit_stack.enter_context(cm)
+
+    def get_resource(
+        self, key: str, factory: Callable[[], ContextManager[T]]
+    ) -> T:
+        """Get a resource shared in the environment, creating it if needed.
+        """
+        try:
+            return self._resources[key]
+        except KeyError:
+            pass
+        resource = self._resources[key] = self.enter_context(factory())
+        return resource
+
+    def close(self):
+        self._resources.clear()
+        self._exit_stack.close()
+
+
+def _get_libdirs(python: pathlib.Path, root: pathlib.Path) -> List[str]:
+    paths = _get_env_paths(python, root)
+    return list(dict.fromkeys([paths["purelib"], paths["platlib"]]))
+
 
 def _list_installed(env: BuildEnv) -> Dict[str, str]:
     """List versions of installed packages in the build environment.
@@ -71,22 +120,8 @@ def _list_installed(env: BuildEnv) -> Dict[str, str]:
 
     Returns a `{canonical_name: version}` mapping.
     """
-    args = [
-        os.fspath(env.interpreter),
-        "-m",
-        "pip",
-        "list",
-        "--format=json",
-        *(f"--path={p}" for p in env.libdirs),
-    ]
-    environ = os.environ.copy()
-    environ["PIP_DISABLE_PIP_VERSION_CHECK"] = "true"
-    output = subprocess.check_output(args, env=environ, text=True).strip()
-    return {
-        canonicalize_name(e["name"]): e["version"]
-        for e in json.loads(output)
-        if "name" in e and "version" in e
-    }
+    with span("list installed"):
+        return list_installed(sorted(env.libdirs))
 
 
 def _is_req_met(req: str, workingset: Dict[str, str]) -> bool:
@@ -104,6 +139,116 @@ def _is_req_met(req: str, workingset: Dict[str, str]) -> bool:
     return not r.specifier or version in r.specifier
 
 
+_STAMP_NAME = "setl-requirements.json"
+
+_LOCK_NAME = "setl-requirements.lock"
+
+_LOCAL_ENV_SUFFIX = ".local"
+
+# Key of requirements in pyproject.toml; see install_build_requirements().
+_BUILD_SYSTEM_KEY = "build-system"
+
+
+def _use_shared_envs() -> bool:
+    """Whether build environments should be shared across projects.
+
+    This is opt-in by setting the ``SETL_SHARED_ENVS`` environment variable.
+    """
+    return get_flag("SETL_SHARED_ENVS")
+
+
+@dataclasses.dataclass(frozen=True)
+class _Target:
+    """Prefix in a build environment to install requirements into.
+    """
+
+    root: pathlib.Path
+
+    # Where installed requirements are found, i.e. the prefix's own libraries,
+    # and libraries of any prefix under it.
+    libdirs: Set[pathlib.Path]
+
+
+def _get_target(env: BuildEnv, key: str) -> _Target:
+    if env.local_root is None:
+        return _Target(env.root, env.libdirs)
+    if key == _BUILD_SYSTEM_KEY:
+        libdirs = _get_libdirs(env.interpreter, env.root)
+        return _Target(env.root, {pathlib.Path(p) for p in libdirs})
+    return _Target(env.local_root, env.libdirs)
+
+
+def _install(
+    env: BuildEnv, target: _Target, reqs: List[str], workingset: Dict[str, str]
+):
+    """Install requirements into a prefix in the build environment.
+
+    Requirements pinned to wheels in the wheelhouse are installed directly;
+    pip is used otherwise.
+    """
+    markers = probe_interpreter(env.interpreter).markers
+    wheels = find_pinned_wheels(reqs, workingset, get_wheelhouse(), markers)
+    if wheels:
+        logger.info("Installing %s from the wheelhouse", ", ".join(reqs))
+        paths = _get_env_paths(env.interpreter, target.root)
+        try:
+            with span("install wheels", requirements=reqs):
+                install_wheels(wheels, paths, env.interpreter)
+        except InstallFailed as e:
+            logger.warning(
+                "Failed to install %s (%s), using pip", e.wheel.name, e.reason
+            )
+        else:
+            return
+    options = ["--ignore-installed", "--prefix", os.fspath(target.root)]
+    with span("pip install", requirements=reqs):
+        for args in get_pip_install_commands(env.interpreter, options, reqs):
+            subprocess.check_call(args)
+
+
+def _get_workingset_digest(target: _Target) -> str:
+    """Digest of distributions installed in the target.
+
+    Metadata directory names contain both the project name and version, so
+    this changes whenever anything is installed, upgraded, or removed.
+    """
+    h = hashlib.sha256()
+    for libdir in sorted(target.libdirs):
+        h.update(os.fspath(libdir).encode("utf8"))
+        for entry in index_directory(libdir).entries:
+            h.update(b"\0")
+            h.update(entry.encode("utf8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def _normalize_requirements(reqs: Iterable[str]) -> List[str]:
+    return sorted({str(Requirement(r)) for r in reqs})
+
+
+def _read_stamp(target: _Target, digest: str) -> Dict[str, List[str]]:
+    """Read requirements recorded as satisfied in the target.
+
+    The stamp is only valid if the target has not changed since it was
+    written. Returns a `{key: [requirement, ...]}` mapping.
+    """
+    stamp = read_json(target.root.joinpath(_STAMP_NAME))
+    if not isinstance(stamp, dict) or stamp.get("digest") != digest:
+        return {}
+    requirements = stamp.get("requirements")
+    if not isinstance(requirements, dict):
+        return {}
+    return requirements
+
+
+def _write_stamp(target: _Target, requirements: Dict[str, List[str]]):
+    stamp = {
+        "digest": _get_workingset_digest(target),
+        "requirements": requirements,
+    }
+    write_json(target.root.joinpath(_STAMP_NAME), stamp)
+
+
 class ProjectBuildManagementMixin(ProjectMetadataMixin):
     @contextlib.contextmanager
     def ensure_build_envdir(self, spec: str) -> Iterator[BuildEnv]:
@@ -117,23 +262,38 @@ class ProjectBuildManagementMixin(ProjectMetadataMixin):
         :param spec: Specification of the base interpreter.
         :returns: A context manager to control build setup/teardown.
         """
-        # Identify the Python interpreter to use.
-        python = resolve_python(spec)
-        if not python:
-            raise InterpreterNotFound(spec)
-
-        # Create isolated environment.
-        quintuplet = get_interpreter_quintuplet(python)
-        env_dir = self.root.joinpath("build", _ENV_CONTAINER_NAME, quintuplet)
-        env_dir.mkdir(exist_ok=True, parents=True)
+        with span("prepare build environment", python=spec):
+            self._sweep_trash()
+
+            # Identify the Python interpreter to use.
+            python = resolve_python(spec)
+            if not python:
+                raise InterpreterNotFound(spec)
+
+            # Create isolated environment.
+            quintuplet = probe_interpreter(python).quintuplet
+            env_dir = self.root.joinpath(
+                "build", _ENV_CONTAINER_NAME, quintuplet
+            )
+            local_dir: Optional[pathlib.Path] = None
+            if _use_shared_envs() and self._link_shared_env(
+                env_dir, quintuplet
+            ):
+                local_dir = env_dir.with_name(env_dir.name + _LOCAL_ENV_SUFFIX)
+            elif env_dir.is_symlink():  # Opted out of sharing since last time.
+                env_dir.unlink()
+            env_dir.mkdir(exist_ok=True, parents=True)
+
+            # Prefixes in the order they are looked up.
+            roots = [r for r in [local_dir, env_dir] if r is not None]
+            scripts = [_get_env_paths(python, r)["scripts"] for r in roots]
+            libdirs = [d for r in roots for d in _get_libdirs(python, r)]
 
         # Set up environment variables so PEP 517 subprocess calls can find
         # dependencies in the isolated environment.
         backenv = {k: os.environ.get(k) for k in ["PATH", "PYTHONPATH"]}
-        paths = _get_env_paths(python, env_dir)
-        libdirs = {paths["purelib"], paths["platlib"]}
         os.environ["PATH"] = _environ_path_format(
-            paths["scripts"], backenv["PATH"] or os.defpath
+            *scripts, backenv["PATH"] or os.defpath
         )
         os.environ["PYTHONPATH"] = _environ_path_format(
             *libdirs, backenv["PYTHONPATH"]
@@ -143,34 +303,121 @@ class ProjectBuildManagementMixin(ProjectMetadataMixin):
             root=env_dir,
             interpreter=python,
             libdirs={pathlib.Path(p) for p in libdirs},
+            local_root=local_dir,
         )
-        yield env
+        try:
+            yield env
+        finally:
+            # Stop processes started in the environment (e.g. backend
+            # workers) before the environment goes away.
+            env.close()
+
+            # Restore environment variables.
+            for k, v in backenv.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+
+        # Only move the environment away; the caller empties the trash, or
+        # the next run does if it does not.
+        if getattr(env, "_should_delete", False):
+            with span("remove build environment"):
+                move_to_trash(env.root, self.trash_dir)
+                if env.local_root is not None and env.local_root.exists():
+                    move_to_trash(env.local_root, self.trash_dir)
 
-        # Restore environment variables.
-        for k, v in backenv.items():
-            if v is None:
-                os.environ.pop(k, None)
-            else:
-                os.environ[k] = v
+    @property
+    def trash_dir(self) -> pathlib.Path:
+        return get_trash_dir(self.root.joinpath("build"))
 
-        if getattr(env, "_should_delete", False):
-            shutil.rmtree(env.root)
+    def _sweep_trash(self):
+        """Empty trash left by a previous run in the background.
+        """
+        try:
+            leftover = any(True for _ in self.trash_dir.iterdir())
+        except OSError:
+            return
+        if leftover:
+            empty_trash(self.trash_dir, wait=False, jobs=None)
 
-    def install_build_requirements(self, env: BuildEnv, reqs: Iterable[str]):
-        reqs = [r for r in reqs if not _is_req_met(r, _list_installed(env))]
-        if not reqs:
+    def _link_shared_env(self, env_dir: pathlib.Path, quintuplet: str) -> bool:
+        """Point the project's environment to one in the shared store.
+
+        Shared environments are keyed by the interpreter quintuplet and the
+        project's build requirements, so projects with the same requirements
+        reuse one environment. If a link cannot be created (e.g. symlinks are
+        not permitted on Windows), the project's own environment is used.
+
+        :returns: Whether the environment is shared.
+        """
+        requirements = _normalize_requirements(self.build_requirements)
+        key = hashlib.sha256("\n".join(requirements).encode("utf8"))
+        name = f"{quintuplet}-{key.hexdigest()[:16]}"
+        target = get_cache_dir().joinpath("envs", name)
+        if env_dir.is_symlink():
+            if env_dir.resolve() == target.resolve():
+                return True
+            env_dir.unlink()
+        elif env_dir.exists():
+            logger.info("Replacing %s with a shared environment", env_dir)
+            move_to_trash(env_dir, self.trash_dir)
+        target.mkdir(parents=True, exist_ok=True)
+        env_dir.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            env_dir.symlink_to(target, target_is_directory=True)
+        except OSError as e:
+            logger.warning("Not using shared build environment: %s", e)
+            return False
+        return True
+
+    def install_build_requirements(
+        self, env: BuildEnv, reqs: Iterable[str], key: str = _BUILD_SYSTEM_KEY
+    ):
+        """Install requirements into the build environment.
+
+        Requirements already satisfied are recorded in a stamp file in the
+        environment, under ``key``. If the environment has not changed since
+        the stamp was written, recorded requirements are not checked again.
+
+        In a shared environment, only ``build-system`` requirements are
+        installed into the shared prefix; others go into the project's own
+        prefix over it. Installation holds a lock in the prefix, so processes
+        sharing it install one at a time.
+
+        :param key: Where the requirements come from, e.g. ``build-system``
+            or the name of the ``get_requires_for_build_*`` hook.
+        """
+        target = _get_target(env, key)
+        with span("install build requirements", key=key):
+            target.root.mkdir(parents=True, exist_ok=True)
+            with file_lock(target.root.joinpath(_LOCK_NAME)):
+                self._install_build_requirements(env, target, reqs, key)
+
+    def _install_build_requirements(
+        self, env: BuildEnv, target: _Target, reqs: Iterable[str], key: str
+    ):
+        reqs = _normalize_requirements(reqs)
+        recorded = _read_stamp(target, _get_workingset_digest(target))
+        if recorded.get(key) == reqs:
             return
-        args = [
-            os.fspath(env.interpreter),
-            "-m",
-            "pip",
-            "install",
-            "--ignore-installed",
-            "--prefix",
-            os.fspath(env.root),
-            *reqs,
-        ]
-        subprocess.check_call(args)
+        satisfied = {r for rs in recorded.values() for r in rs}
+        if satisfied.issuperset(reqs):
+            recorded[key] = reqs
+            _write_stamp(target, recorded)
+            return
+
+        with span("list installed"):
+            workingset = list_installed(sorted(target.libdirs))
+        missing = [r for r in reqs if not _is_req_met(r, workingset)]
+        if missing:
+            _install(env, target, missing, workingset)
+
+            # The environment changed, so previous records can't be trusted.
+            recorded = {}
+
+        recorded[key] = reqs
+        _write_stamp(target, recorded)
 
     def ensure_build_requirements(self, env: BuildEnv):
         """Ensure the given environment has build requirements populated.
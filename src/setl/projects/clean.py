@@ -1,67 +1,116 @@
 __all__ = ["ProjectCleanMixin"]
 
-import json
-import os
+import pathlib
+import re
 import shutil
-import subprocess
 
-from typing import Dict, Iterator, List, Optional
+from typing import Optional
 
 from packaging.utils import canonicalize_name
 
+from setl._tracing import span
+
+from ._trash import empty_trash, move_to_trash
 from .build import BuildEnv
-from .dev import ProjectDevelopMixin
+from .dev import ProjectDevelopMixin, _get_name, _iter_egg_infos
+
 
+# Outputs of the build commands in build/, i.e. what `setup.py clean --all`
+# removes when the build directories are not customized, and outputs of
+# builds isolated with `isolate_build_dirs()`.
+_BUILD_OUTPUT_PATTERNS = [
+    "lib",
+    "lib.*",
+    "temp.*",
+    "bdist.*",
+    "scripts-*",
+    "setl-isolated-build",
+]
 
-def _get_name(f: Iterator[str]) -> Optional[str]:
-    for line in f:
-        if ":" not in line:  # End of metadata.
-            break
-        k, v = line.strip().split(":", 1)
-        if k.lower() == "name":
-            return v.strip()
-    return None
+# Options that move build outputs elsewhere, so we need Setuptools to tell us
+# where they are.
+_BUILD_DIR_OPTIONS = {
+    "bdist_base",
+    "bdist_dir",
+    "build_base",
+    "build_lib",
+    "build_platlib",
+    "build_purelib",
+    "build_scripts",
+    "build_temp",
+}
 
+_SETUP_PY_CMDCLASS_RE = re.compile(r"\bcmdclass\b")
 
-def _iter_egg_infos(entries: List[Dict[str, str]], name: str) -> Iterator[str]:
-    for entry in entries:
-        if name != canonicalize_name(entry["name"]):
-            continue
-        location = entry["location"]
-        for filename in os.listdir(location):
-            stem, ext = os.path.splitext(filename)
-            if canonicalize_name(stem) == name and ext == ".egg-info":
-                yield os.path.join(location, filename)
+
+def _remove(path: pathlib.Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
 
 
 class ProjectCleanMixin(ProjectDevelopMixin):
     def _clean_egg_info(self, env: BuildEnv):
-        name = _get_name(self.iter_metadata_for_development(env))
+        name = self.static_name
+        if not name:
+            name = _get_name(self.iter_metadata_for_development(env))
         if not name:
             return
+        with span("find egg-info"):
+            locations = list(self.iter_development_locations(env))
+            paths = list(_iter_egg_infos(locations, canonicalize_name(name)))
+        for path in paths:
+            _remove(path)
 
-        args = [
-            os.fspath(env.interpreter),
-            "-m",
-            "pip",
-            "list",
-            "--format=json",
-            "--editable",
-            "--verbose",  # Needed for the "location" field. (pypa/pip#7664)
-        ]
-        output = subprocess.check_output(args, text=True)
-        entries = json.loads(output)
-        for path in _iter_egg_infos(entries, canonicalize_name(name)):
-            shutil.rmtree(path)
+    def _has_custom_build_dirs(self) -> bool:
+        """Whether Setuptools may put build outputs in unexpected places.
+        """
+        cfg = self.setup_cfg
+        if any(
+            cfg.has_option(section, option)
+            for section in cfg.sections()
+            for option in _BUILD_DIR_OPTIONS
+        ):
+            return True
+        if "distutils" in self._pyproject.get("tool", {}):
+            return True
+        try:
+            setup_py = self.root.joinpath("setup.py").read_text("utf8")
+        except FileNotFoundError:
+            return False
+        # Custom commands may put (or clean up) outputs anywhere.
+        return bool(_SETUP_PY_CMDCLASS_RE.search(setup_py))
+
+    def _clean_build_outputs(self):
+        build_dir = self.root.joinpath("build")
+        with span("remove build outputs"):
+            for pattern in _BUILD_OUTPUT_PATTERNS:
+                for path in build_dir.glob(pattern):
+                    move_to_trash(path, self.trash_dir)
 
     def clean(self, env: BuildEnv):
         # Clean up the built .egg-info. This is probably a good idea.
         # https://github.com/pypa/setuptools/issues/1347
         self._clean_egg_info(env)
 
-        self.setuppy(env, "clean", "--all")
+        # Remove build outputs ourselves instead of starting Setuptools, unless
+        # the project configures them to be somewhere else.
+        if self._has_custom_build_dirs():
+            self.setuppy(env, "clean", "--all")
+        else:
+            self._clean_build_outputs()
 
         # We don't just clean up here because the build environment is still
         # active, and the caller might want to use it after the call. Set a
         # flag so it is deleted when the context exits instead.
         env.mark_for_cleanup()
+
+    def empty_trash(self, wait: bool, jobs: Optional[int] = None):
+        """Delete files moved away by `clean()`.
+
+        :param wait: Delete in worker threads and wait for them to finish,
+            instead of in a detached background process.
+        """
+        with span("empty trash", wait=wait):
+            empty_trash(self.trash_dir, wait, jobs)
@@ -1,30 +1,58 @@
 __all__ = ["ProjectDevelopMixin"]
 
+import hashlib
+import logging
 import os
+import pathlib
 import subprocess
+import tempfile
 
-from typing import Collection, Iterable, Iterator, Optional
+from typing import Any, Collection, Dict, Iterable, Iterator, Optional
 
 import packaging.markers
 import packaging.requirements
 
-from .build import BuildEnv
+from packaging.utils import canonicalize_name
+
+from setl._cache import get_cache_dir, read_json, trim_cache, write_json
+from setl._tracing import span
+
+from ._probe import probe_interpreter
+from ._sources import get_stat_digest, iter_source_files
+from ._wheelhouse import (
+    allow_index,
+    get_pip_install_commands,
+    get_wheelhouse,
+)
+from ._workingset import iter_pth_entries, list_installed
+from .build import BuildEnv, _is_req_met, _list_installed
 from .hook import ProjectPEP517HookCallerMixin
-from .setup import ProjectSetupMixin
+from .setup import _COMPILER_VARIABLES, ProjectSetupMixin
+
+
+logger = logging.getLogger(__name__)
 
 
 def _evaluate_marker(
-    marker: Optional[packaging.markers.Marker], extras: Collection[str]
+    marker: Optional[packaging.markers.Marker],
+    extras: Collection[str],
+    environment: Optional[Dict[str, str]] = None,
 ) -> bool:
+    """Evaluate a marker, against Setl's own interpreter by default.
+    """
     if not marker:
         return True
-    if marker.evaluate({"extra": ""}):
+    env = dict(environment or {})
+    if marker.evaluate({**env, "extra": ""}):
         return True
-    return any(marker.evaluate({"extra": e}) for e in extras)
+    return any(marker.evaluate({**env, "extra": e}) for e in extras)
 
 
 def _iter_requirements(
-    f: Iterator[str], key: str, extras: Collection[str]
+    f: Iterator[str],
+    key: str,
+    extras: Collection[str],
+    environment: Optional[Dict[str, str]] = None,
 ) -> Iterator[str]:
     """Hand-rolled implementation to read ``*.dist-info/METADATA``.
 
@@ -43,10 +71,78 @@ def _iter_requirements(
             r = packaging.requirements.Requirement(v)
         except ValueError:
             continue
-        if not r.marker or _evaluate_marker(r.marker, extras):
+        if not r.marker or _evaluate_marker(r.marker, extras, environment):
             yield v
 
 
+def _get_name(f: Iterator[str]) -> Optional[str]:
+    for line in f:
+        if ":" not in line:  # End of metadata.
+            break
+        k, v = line.strip().split(":", 1)
+        if k.lower() == "name":
+            return v.strip()
+    return None
+
+
+def _iter_egg_infos(
+    locations: Iterable[pathlib.Path], name: str
+) -> Iterator[pathlib.Path]:
+    for location in locations:
+        try:
+            filenames = os.listdir(location)
+        except OSError:
+            continue
+        for filename in filenames:
+            stem, ext = os.path.splitext(filename)
+            if ext == ".egg-info" and canonicalize_name(stem) == name:
+                yield location.joinpath(filename)
+
+
+def _is_satisfied(req: str, workingset: Dict[str, str]) -> bool:
+    r = packaging.requirements.Requirement(req)
+    # We can't tell whether an extra's dependencies are installed, or where a
+    # distribution was installed from, so leave those to pip.
+    if r.extras or r.url:
+        return False
+    return _is_req_met(req, workingset)
+
+
+_DEVELOP_STAMP_NAME = "setl-develop.json"
+
+
+# Files built in place by ``setup.py develop``.
+_EXTENSION_SUFFIXES = (".dll", ".dylib", ".pyd", ".so")
+
+_METADATA_SOURCE_NAMES = ["pyproject.toml", "setup.cfg", "setup.py"]
+
+_MAX_METADATA_ENTRIES = 256
+
+
+def _get_metadata_cache_dir() -> pathlib.Path:
+    return get_cache_dir().joinpath("metadata")
+
+
+def _find_metadata(container: pathlib.Path) -> Optional[pathlib.Path]:
+    for path in container.glob("*.dist-info/METADATA"):
+        return path
+    return None
+
+
+def _trim_metadata_cache(directory: pathlib.Path, max_entries: int) -> int:
+    """Remove least recently used metadata until at most ``max_entries`` left.
+
+    Entries are touched when used, so the modification time is when they were
+    last used.
+
+    :returns: Number of entries removed.
+    """
+    removed = trim_cache(directory.iterdir(), max_entries)
+    if removed:
+        logger.debug("Removed %d metadata from %s", removed, directory)
+    return removed
+
+
 class ProjectDevelopMixin(ProjectPEP517HookCallerMixin, ProjectSetupMixin):
     def iter_metadata_for_development(self, env: BuildEnv) -> Iterator[str]:
         """Generate metadata for development install.
@@ -60,23 +156,164 @@ class ProjectDevelopMixin(ProjectPEP517HookCallerMixin, ProjectSetupMixin):
 
         Please keep the list updated if you call this function.
 
-        Generated metadata are stored in the build environment, so it is more
-        easily ignored and cleaned up.
+        Generated metadata are cached in the user cache directory, keyed by
+        the project's configuration files, files referenced by them (e.g.
+        with ``attr:``), and the build environment's packages (which include
+        the backend), so they are only generated again if any of those
+        changes. Only the fields listed above need to be accurate; anything
+        else may be stale.
         """
-        requirements = self.hooks.get_requires_for_build_wheel()
-        self.install_build_requirements(env, requirements)
-
-        container = env.root.joinpath("setl-wheel-metadata")
-        container.mkdir(parents=True, exist_ok=True)
-        target = self.hooks.prepare_metadata_for_build_wheel(container)
-        with container.joinpath(target, "METADATA").open(encoding="utf8") as f:
+        directory = _get_metadata_cache_dir()
+        container = directory.joinpath(self._get_metadata_cache_key(env))
+        cached = _find_metadata(container)
+        if cached is None:
+            with span("prepare metadata"):
+                container = self._prepare_metadata(env, directory)
+            _trim_metadata_cache(directory, _MAX_METADATA_ENTRIES)
+            cached = _find_metadata(container)
+        else:
+            os.utime(container)  # Mark as recently used for trimming.
+        if cached is None:
+            raise FileNotFoundError(container.joinpath("*.dist-info"))
+        with cached.open(encoding="utf8") as f:
             yield from f
 
+    def _get_metadata_cache_key(self, env: BuildEnv) -> str:
+        h = hashlib.sha256(os.fspath(self.root).encode("utf8"))
+        names = [*_METADATA_SOURCE_NAMES, *self.iter_metadata_inputs()]
+        for name in names:
+            h.update(f"\0{name}\0".encode("utf8"))
+            try:
+                h.update(self.root.joinpath(name).read_bytes())
+            except FileNotFoundError:
+                pass
+        for name, version in sorted(_list_installed(env).items()):
+            h.update(f"\0{name}=={version}".encode("utf8"))
+        return h.hexdigest()
+
+    def _prepare_metadata(
+        self, env: BuildEnv, directory: pathlib.Path
+    ) -> pathlib.Path:
+        """Generate metadata into the cache.
+
+        :returns: The cache entry containing the ``.dist-info`` directory.
+        """
+        hooks = self.get_hooks(env)
+        requirements = hooks.get_requires_for_build_wheel()
+        self.install_build_requirements(
+            env, requirements, "get_requires_for_build_wheel"
+        )
+
+        # The key is calculated after the backend's requirements are
+        # installed, so later runs (where they are already installed) find the
+        # entry under the same key.
+        container = directory.joinpath(self._get_metadata_cache_key(env))
+
+        # Generate into a temporary directory and move it into place, so a
+        # cache entry is never seen half-populated.
+        directory.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=directory) as td:
+            temp = pathlib.Path(td, "metadata")
+            temp.mkdir()
+            hooks.prepare_metadata_for_build_wheel(temp)
+            try:
+                temp.rename(container)
+            except OSError:  # Populated concurrently.
+                pass
+        return container
+
+    def _iter_target_libdirs(self, env: BuildEnv) -> Iterator[pathlib.Path]:
+        """Directories the target interpreter imports packages from.
+
+        These are the site-packages directories, and paths added by .pth
+        files in them, in the order they appear on ``sys.path``.
+        """
+        site_dirs = probe_interpreter(env.interpreter).site_packages
+        for site_dir in site_dirs:
+            yield pathlib.Path(site_dir)
+        for site_dir in site_dirs:
+            yield from iter_pth_entries(pathlib.Path(site_dir))
+
+    def iter_development_locations(
+        self, env: BuildEnv
+    ) -> Iterator[pathlib.Path]:
+        """Directories in the project on the target interpreter's sys.path.
+
+        This is where ``setup.py develop`` (and therefore ``setl develop``)
+        puts the project's .egg-info.
+        """
+        root = self.root.resolve()
+        seen = set()
+        for site_dir in probe_interpreter(env.interpreter).site_packages:
+            for entry in iter_pth_entries(pathlib.Path(site_dir)):
+                try:
+                    location = entry.resolve()
+                except OSError:
+                    continue
+                if location in seen:
+                    continue
+                seen.add(location)
+                if location == root or root in location.parents:
+                    yield location
+
     def install_run_requirements(self, env: BuildEnv, reqs: Iterable[str]):
+        """Install requirements not already satisfied in the target.
+        """
+        with span("check run requirements"):
+            workingset = list_installed(self._iter_target_libdirs(env))
+            reqs = [r for r in reqs if not _is_satisfied(r, workingset)]
         if not reqs:
             return
-        args = [os.fspath(env.interpreter), "-m", "pip", "install", *reqs]
-        subprocess.check_call(args)
+        with span("pip install", requirements=reqs):
+            for args in get_pip_install_commands(env.interpreter, [], reqs):
+                subprocess.check_call(args)
+
+    def fill_wheelhouse(self, env: BuildEnv) -> pathlib.Path:
+        """Populate the wheelhouse with wheels needed by the project.
+
+        This includes build requirements (both static and from the backend),
+        run-time requirements, and their dependencies. Requirements only
+        available as sdists are built into wheels, so they don't need to be
+        built again when installed from the wheelhouse.
+
+        The package index is always used, even in offline mode, including to
+        install build requirements needed to find the others.
+
+        :returns: Path to the wheelhouse.
+        """
+        with allow_index():
+            return self._fill_wheelhouse(env)
+
+    def _fill_wheelhouse(self, env: BuildEnv) -> pathlib.Path:
+        self.ensure_build_requirements(env)
+        hooks = self.get_hooks(env)
+        requirements = [
+            *self.build_requirements,
+            *hooks.get_requires_for_build_sdist(),
+            *hooks.get_requires_for_build_wheel(),
+            *_iter_requirements(
+                self.iter_metadata_for_development(env),
+                "requires-dist",
+                [],
+                probe_interpreter(env.interpreter).markers,
+            ),
+        ]
+        wheelhouse = get_wheelhouse()
+        wheelhouse.mkdir(parents=True, exist_ok=True)
+        args = [
+            os.fspath(env.interpreter),
+            "-m",
+            "pip",
+            "wheel",
+            "--wheel-dir",
+            os.fspath(wheelhouse),
+            "--find-links",
+            os.fspath(wheelhouse),
+            *requirements,
+        ]
+        with span("pip wheel"):
+            subprocess.check_call(args)
+        return wheelhouse
 
     def install_for_development(self, env: BuildEnv):
         """Install the project for development.
@@ -96,7 +333,54 @@ class ProjectDevelopMixin(ProjectPEP517HookCallerMixin, ProjectSetupMixin):
         4. Call `setup.py develop --no-deps` so we install the package itself
            without pip machinery.
         """
-        metadata = self.iter_metadata_for_development(env)
-        requirements = _iter_requirements(metadata, "requires-dist", [])
+        metadata = list(self.iter_metadata_for_development(env))
+        requirements = _iter_requirements(
+            iter(metadata),
+            "requires-dist",
+            [],
+            probe_interpreter(env.interpreter).markers,
+        )
         self.install_run_requirements(env, requirements)
+
+        # The develop install only needs to be redone if the metadata changed
+        # (e.g. entry points), the sources changed (e.g. extensions need to
+        # be built again), or the project is no longer installed.
+        stamp_path = env.root.joinpath(_DEVELOP_STAMP_NAME)
+        stamps = read_json(stamp_path)
+        if not isinstance(stamps, dict):
+            stamps = {}
+        interpreter = os.fspath(env.interpreter)
+
+        # Taken before the install, so changes made while it runs are picked
+        # up by the next one.
+        stamp = self._get_develop_stamp(env)
+        if stamps.get(interpreter) == stamp and self._is_installed_for_dev(
+            env, _get_name(iter(metadata))
+        ):
+            logger.info("Already installed for development, skipping")
+            return
         self.setuppy(env, "develop", "--no-deps")
+        stamps[interpreter] = stamp
+        write_json(stamp_path, stamps)
+
+    def _get_develop_stamp(self, env: BuildEnv) -> Dict[str, Any]:
+        # Extensions are built in place, so they are outputs, not sources.
+        files = (
+            path
+            for path in iter_source_files(self.root)
+            if not path.name.endswith(_EXTENSION_SUFFIXES)
+        )
+        return {
+            "metadata": self._get_metadata_cache_key(env),
+            "interpreter": os.fspath(env.interpreter),
+            "variables": {k: os.environ.get(k) for k in _COMPILER_VARIABLES},
+            "sources": get_stat_digest(self.root, files),
+        }
+
+    def _is_installed_for_dev(self, env: BuildEnv, name: Optional[str]):
+        """Whether the target has the project on sys.path with an egg-info.
+        """
+        if not name:
+            return False
+        locations = self.iter_development_locations(env)
+        return any(_iter_egg_infos(locations, canonicalize_name(name)))
@@ -1,26 +1,130 @@
-__all__ = ["ProjectPEP517HookCallerMixin"]
+from __future__ import annotations
 
+__all__ = ["HookFailed", "ProjectPEP517HookCallerMixin"]
+
+import concurrent.futures
+import dataclasses
+import hashlib
+import json
 import logging
+import os
 import pathlib
 import re
 
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
 import cached_property
-import pep517.wrappers
 
+from setl._tracing import span
+
+from ._artifacts import get_artifact_cache, link_into
+from ._backend import BackendWorker, WorkerUnusable
+from ._probe import probe_interpreter
+from ._sources import get_vcs_digest
 from .build import BuildEnv, ProjectBuildManagementMixin
 from .meta import ProjectMetadataMixin
+from .setup import _COMPILER_VARIABLES, _supports_extra_config
+
+if TYPE_CHECKING:
+    import pep517.wrappers
 
 
 logger = logging.getLogger(__name__)
 
 PYPROJECT_TOML_PATTERN = re.compile(r"^[^/]+/pyproject\.toml$")
 
+# Environment variables that may change what the backend builds.
+_ARTIFACT_VARIABLES = [*_COMPILER_VARIABLES, "SOURCE_DATE_EPOCH"]
+
+
+@dataclasses.dataclass()
+class HookFailed(Exception):
+    hook: str
+    output: str
+    traceback: str
+
+
+class HookCaller:
+    """Call PEP 517 hooks through a long-lived backend worker.
+
+    This mimics the parts of ``pep517.wrappers.Pep517HookCaller`` we use. If
+    the worker can't be used (e.g. the backend is unavailable, or the worker
+    process misbehaves), calls are delegated to ``fallback`` instead, which
+    starts a fresh subprocess for each call.
+    """
+
+    def __init__(
+        self, worker: BackendWorker, fallback: pep517.wrappers.Pep517HookCaller
+    ):
+        self._worker = worker
+        self._fallback = fallback
+
+        # Output captured from the backend during the last hook call.
+        self.last_output = ""
+
+    def __enter__(self) -> "HookCaller":
+        return self
+
+    def __exit__(self, *exc_info):
+        self._worker.close()
+
+    def _call_hook(self, hook: str, **kwargs: Any) -> Any:
+        with span(f"hook {hook}"):
+            return self._call_hook_in_worker(hook, **kwargs)
+
+    def _call_hook_in_worker(self, hook: str, **kwargs: Any) -> Any:
+        self.last_output = ""
+        try:
+            response = self._worker.call(hook, **kwargs)
+        except WorkerUnusable:
+            logger.debug("Calling %s without backend worker", hook)
+            with span("hook fallback", hook=hook):
+                return getattr(self._fallback, hook)(**kwargs)
+        self.last_output = response.get("output", "")
+        if "error" in response:
+            raise HookFailed(hook, self.last_output, response["error"])
+        return response["return_val"]
+
+    def get_requires_for_build_wheel(self) -> List[str]:
+        return self._call_hook("get_requires_for_build_wheel")
+
+    def get_requires_for_build_sdist(self) -> List[str]:
+        return self._call_hook("get_requires_for_build_sdist")
+
+    def prepare_metadata_for_build_wheel(self, metadata_directory) -> str:
+        return self._call_hook(
+            "prepare_metadata_for_build_wheel",
+            metadata_directory=os.path.abspath(metadata_directory),
+        )
+
+    def build_wheel(self, wheel_directory) -> str:
+        return self._call_hook(
+            "build_wheel", wheel_directory=os.path.abspath(wheel_directory),
+        )
+
+    def build_sdist(self, sdist_directory) -> str:
+        return self._call_hook(
+            "build_sdist", sdist_directory=os.path.abspath(sdist_directory),
+        )
+
 
 class ProjectPEP517HookCallerMixin(
     ProjectBuildManagementMixin, ProjectMetadataMixin
 ):
     @cached_property.cached_property
     def hooks(self) -> pep517.wrappers.Pep517HookCaller:
+        # Only needed if the backend worker can't be used, so import lazily.
+        import pep517.wrappers
+
         return pep517.wrappers.Pep517HookCaller(
             self.root,
             self.build_backend,
@@ -28,14 +132,168 @@ class ProjectPEP517HookCallerMixin(
             runner=pep517.wrappers.quiet_subprocess_runner,
         )
 
-    def build_sdist(self, env: BuildEnv) -> pathlib.Path:
-        requirements = self.hooks.get_requires_for_build_sdist()
-        self.install_build_requirements(env, requirements)
-        target = self.hooks.build_sdist(self.root.joinpath("dist"))
-        return self.root.joinpath("dist", target)
-
-    def build_wheel(self, env: BuildEnv) -> pathlib.Path:
-        requirements = self.hooks.get_requires_for_build_wheel()
-        self.install_build_requirements(env, requirements)
-        target = self.hooks.build_wheel(self.root.joinpath("dist"))
-        return self.root.joinpath("dist", target)
+    def open_hooks(
+        self, env: BuildEnv, environ: Optional[Mapping[str, str]] = None
+    ) -> HookCaller:
+        """Start a new backend worker for the environment.
+
+        The caller is responsible for closing the returned hook caller. Use
+        `get_hooks()` instead to share one worker in the environment.
+
+        :param environ: Additional environment variables for the worker.
+        """
+        worker = BackendWorker(
+            env.interpreter,
+            self.root,
+            self.build_backend,
+            self.backend_path,
+            environ,
+        )
+        return HookCaller(worker, self.hooks)
+
+    def get_hooks(self, env: BuildEnv) -> HookCaller:
+        """Get the hook caller shared in the environment.
+
+        The backend worker is started on the first hook call, and stopped
+        when the environment's context exits.
+        """
+        return env.get_resource("hooks", lambda: self.open_hooks(env))
+
+    def _can_build_concurrently(self, env: BuildEnv) -> bool:
+        """Whether the sdist and wheel can be built at the same time.
+
+        Both Setuptools commands write the project's egg-info directory. We
+        can redirect one of them with ``DIST_EXTRA_CONFIG``, but that is only
+        available in Setuptools 65.4 or later.
+        """
+        if not self.build_backend.startswith("setuptools.build_meta"):
+            return False
+        return _supports_extra_config(env)
+
+    def _open_isolated_hooks(self, env: BuildEnv) -> HookCaller:
+        """Start a backend worker writing egg-info into the build directory.
+
+        This is not in the build environment, which may be shared with other
+        projects.
+        """
+        container = self.root.joinpath("build", "setl-isolated-build")
+        egg_base = container.joinpath("egg-base")
+        egg_base.mkdir(parents=True, exist_ok=True)
+        config = container.joinpath("setup.cfg")
+        config.write_text(f"[egg_info]\negg_base = {egg_base}\n")
+        return self.open_hooks(env, {"DIST_EXTRA_CONFIG": os.fspath(config)})
+
+    def _build_distribution(
+        self, hooks: HookCaller, kind: str, directory: pathlib.Path
+    ) -> Tuple[pathlib.Path, str]:
+        build = getattr(hooks, f"build_{kind}")
+        target = build(directory)
+        return directory.joinpath(target), hooks.last_output
+
+    def _build_distribution_isolated(
+        self, env: BuildEnv, kind: str, directory: pathlib.Path
+    ) -> Tuple[pathlib.Path, str]:
+        with self._open_isolated_hooks(env) as hooks:
+            return self._build_distribution(hooks, kind, directory)
+
+    def _build_distributions(
+        self, env: BuildEnv, kinds: Sequence[str], directory: pathlib.Path
+    ) -> List[pathlib.Path]:
+        hooks = self.get_hooks(env)
+        for kind in kinds:
+            name = f"get_requires_for_build_{kind}"
+            requirements = getattr(hooks, name)()
+            self.install_build_requirements(env, requirements, name)
+
+        if len(kinds) < 2 or not self._can_build_concurrently(env):
+            results = [
+                self._build_distribution(hooks, k, directory) for k in kinds
+            ]
+        else:
+            # The sdist is built in the shared worker, so it is written from
+            # the project's egg-info. Others are isolated from it.
+            with concurrent.futures.ThreadPoolExecutor(len(kinds)) as e:
+                futures = [
+                    e.submit(self._build_distribution, hooks, kind, directory)
+                    if kind == "sdist"
+                    else e.submit(
+                        self._build_distribution_isolated, env, kind, directory
+                    )
+                    for kind in kinds
+                ]
+                concurrent.futures.wait(futures)
+            results = [f.result() for f in futures]
+
+        for kind, (_, output) in zip(kinds, results):
+            if output:
+                logger.debug("Output from build_%s:\n%s", kind, output)
+        return [target for target, _ in results]
+
+    def _get_artifact_keys(
+        self, env: BuildEnv, kinds: Sequence[str]
+    ) -> Dict[str, str]:
+        """Keys of distributions in the artifact cache.
+        """
+        data: Dict[str, Any] = {
+            "build-system": self._build_system,
+            "files": self.get_package_fingerprint().digest,
+            "vcs": get_vcs_digest(self.root),
+            "variables": {k: os.environ.get(k) for k in _ARTIFACT_VARIABLES},
+        }
+        keys = {}
+        for kind in kinds:
+            data["kind"] = kind
+            if kind == "wheel":
+                info = probe_interpreter(env.interpreter)
+                data["quintuplet"] = info.quintuplet
+            payload = json.dumps(data, sort_keys=True).encode("utf8")
+            keys[kind] = hashlib.sha256(payload).hexdigest()
+        return keys
+
+    def build_distributions(
+        self, env: BuildEnv, kinds: Sequence[str], use_cache: bool = True
+    ) -> List[pathlib.Path]:
+        """Build distributions into ``dist/``.
+
+        :param kinds: What to build, each either ``sdist`` or ``wheel``.
+        :param use_cache: Link distributions from the artifact cache into
+            ``dist/`` if the project has not changed since they were built.
+            Otherwise everything is built (and cached) again.
+        :returns: Paths to built distributions, in the order of ``kinds``.
+
+        Build requirements for all kinds are installed first. If possible,
+        the builds then run concurrently, each in its own backend worker.
+        Backend output is collected, and logged in the order of ``kinds``
+        after all the builds finish.
+        """
+        dist_dir = self.root.joinpath("dist")
+        cache = get_artifact_cache()
+        keys = self._get_artifact_keys(env, kinds)
+
+        targets: Dict[str, pathlib.Path] = {}
+        for kind in kinds:
+            cached = cache.get(keys[kind]) if use_cache else None
+            if cached is not None:
+                logger.info("Using cached %s", cached.name)
+                targets[kind] = link_into(cached, dist_dir)
+
+        pending = [kind for kind in kinds if kind not in targets]
+        if pending:
+            with cache.stage() as staging:
+                paths = self._build_distributions(env, pending, staging)
+                for kind, path in zip(pending, paths):
+                    cached = cache.store(keys[kind], path)
+                    targets[kind] = link_into(cached, dist_dir)
+            cache.trim()
+
+        return [targets[kind] for kind in kinds]
+
+    def build_sdist(
+        self, env: BuildEnv, use_cache: bool = True
+    ) -> pathlib.Path:
+        return self.build_distributions(env, ["sdist"], use_cache)[0]
+
+    def build_wheel(
+        self, env: BuildEnv, use_cache: bool = True
+    ) -> pathlib.Path:
+        return self.build_distributions(env, ["wheel"], use_cache)[0]
@@ -1,10 +1,20 @@
 __all__ = ["ProjectMetadataMixin"]
 
-from typing import Any, Dict, List, Optional
+import configparser
+import hashlib
+import os
+import re
+
+from typing import Any, Dict, Iterator, List, Optional
 
 import cached_property
 import toml
 
+from setl._cache import get_cache_dir
+from setl._tracing import span
+
+from ._manifest import iter_metadata_inputs, iter_package_inputs
+from ._sources import Fingerprint, hash_files
 from .base import BaseProject
 
 
@@ -15,12 +25,27 @@ _DEFAULT_BUILD_SYSTEM = {
     "build-backend": _DEFAULT_BUILD_BACKEND,
 }
 
+# A keyword argument in setup.py, which overrides setup.cfg.
+_SETUP_PY_NAME_RE = re.compile(r"\bname\s*=")
+
 
 class ProjectMetadataMixin(BaseProject):
     @cached_property.cached_property
-    def _build_system(self) -> Dict[str, Any]:
+    def _pyproject(self) -> Dict[str, Any]:
         with self.root.joinpath("pyproject.toml").open() as f:
-            data = toml.load(f)
+            return toml.load(f)
+
+    @cached_property.cached_property
+    def setup_cfg(self) -> configparser.ConfigParser:
+        """Content of setup.cfg; empty if the file does not exist.
+        """
+        parser = configparser.ConfigParser(interpolation=None)
+        parser.read(self.root.joinpath("setup.cfg"), encoding="utf8")
+        return parser
+
+    @cached_property.cached_property
+    def _build_system(self) -> Dict[str, Any]:
+        data = self._pyproject
         try:
             build_system = data["build-system"]
         except KeyError:
@@ -40,3 +65,60 @@ class ProjectMetadataMixin(BaseProject):
     @property
     def backend_path(self) -> Optional[str]:
         return self._build_system.get("backend-path")
+
+    @property
+    def static_name(self) -> Optional[str]:
+        """The project's name, if it can be read without calling the backend.
+
+        The name is read from the ``[project]`` table in pyproject.toml, or
+        ``[metadata]`` in setup.cfg.
+        """
+        name = self._pyproject.get("project", {}).get("name")
+        if name:
+            return name
+        name = self.setup_cfg.get("metadata", "name", fallback="").strip()
+        if not name or name.startswith(("attr:", "file:")):
+            return None
+        try:
+            setup_py = self.root.joinpath("setup.py").read_text("utf8")
+        except FileNotFoundError:
+            return name
+        if _SETUP_PY_NAME_RE.search(setup_py):
+            return None
+        return name
+
+    def iter_metadata_inputs(self) -> Iterator[str]:
+        """Iterate through files metadata may be read from.
+
+        These are files referenced by the configuration (e.g. with ``attr:``),
+        not the configuration files themselves. Paths are relative to the
+        project root, with forward slashes.
+        """
+        return iter_metadata_inputs(self.root, self.setup_cfg, self._pyproject)
+
+    def iter_package_inputs(self) -> Iterator[str]:
+        """Iterate through files that may go into the distributions.
+
+        Paths are relative to the project root, with forward slashes.
+        """
+        return iter_package_inputs(
+            self.root, self.setup_cfg, self.build_requirements
+        )
+
+    def get_package_fingerprint(
+        self, jobs: Optional[int] = None
+    ) -> Fingerprint:
+        """Hash files that may go into the distributions.
+
+        Digests are remembered in Setl's cache with the files' stat results,
+        so only files changed since the last call are read.
+
+        :param jobs: Number of files to hash concurrently.
+        """
+        key = hashlib.sha256(os.fspath(self.root).encode("utf8")).hexdigest()
+        stat_cache = get_cache_dir().joinpath(
+            "fingerprints", f"{key[:16]}.json"
+        )
+        with span("fingerprint package"):
+            files = self.iter_package_inputs()
+            return hash_files(self.root, files, jobs, stat_cache)
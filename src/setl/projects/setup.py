@@ -1,13 +1,72 @@
 __all__ = ["ProjectSetupMixin"]
 
+import contextlib
+import hashlib
+import json
 import os
 import pathlib
 import subprocess
+import tempfile
 
-from typing import Sequence
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence
 
+import packaging.version
+
+from setl._cache import read_json, write_json
+from setl._tracing import span
+
+from ._lock import file_lock
+from ._objcache import ObjectCache, get_object_cache
+from ._probe import probe_interpreter
+from ._sources import get_stat_digest, iter_source_files
+from ._watch import Watcher, create_watcher
 from .base import BaseProject
-from .build import BuildEnv
+from .build import BuildEnv, _list_installed
+
+
+_RUNNER_PATH = pathlib.Path(__file__).with_name("_setuppy.py")
+
+# Environment variables affecting how Setuptools compiles and links.
+_COMPILER_VARIABLES = [
+    "AR",
+    "ARCHFLAGS",
+    "ARFLAGS",
+    "CC",
+    "CFLAGS",
+    "CPP",
+    "CPPFLAGS",
+    "CXX",
+    "CXXFLAGS",
+    "LDFLAGS",
+    "LDSHARED",
+]
+
+# Where outputs of each command go. A command is not considered up-to-date
+# if its outputs are gone, even if the inputs are unchanged.
+_COMMAND_OUTPUTS = {
+    "egg_info": ["*.egg-info", "*/*.egg-info"],
+    "build": ["build/lib*"],
+    "build_clib": ["build/temp*"],
+    "build_ext": ["build/lib*", "build/temp*"],
+    "build_py": ["build/lib*"],
+    "build_scripts": ["build/scripts-*"],
+}
+
+
+# Setuptools reads additional configuration from DIST_EXTRA_CONFIG since 65.4.
+_EXTRA_CONFIG_SETUPTOOLS = packaging.version.Version("65.4")
+
+_ISOLATED_BUILD_DIR_NAME = "setl-isolated-build"
+
+
+def _supports_extra_config(env: BuildEnv) -> bool:
+    version = _list_installed(env).get("setuptools")
+    if not version:
+        return False
+    try:
+        return packaging.version.Version(version) >= _EXTRA_CONFIG_SETUPTOOLS
+    except packaging.version.InvalidVersion:
+        return False
 
 
 def _get_setuppy_args(root: pathlib.Path) -> Sequence[str]:
@@ -24,13 +83,273 @@ def _get_setuppy_args(root: pathlib.Path) -> Sequence[str]:
     return ["-c", "from setuptools import setup; setup()"]
 
 
+class _SetupPyServer:
+    """Runner process with Setuptools imported, to run setup.py repeatedly.
+
+    setup.py is run in a process forked from the runner each time, so the
+    cost of starting the interpreter and importing Setuptools is only paid
+    once.
+    """
+
+    def __init__(
+        self,
+        interpreter: pathlib.Path,
+        root: pathlib.Path,
+        environ: Mapping[str, str],
+    ):
+        read_fd, write_fd = os.pipe()
+        try:
+            self._proc = subprocess.Popen(
+                [
+                    os.fspath(interpreter),
+                    os.fspath(_RUNNER_PATH),
+                    "--serve",
+                    str(write_fd),
+                ],
+                cwd=root,
+                env=environ,
+                stdin=subprocess.PIPE,
+                pass_fds=(write_fd,),
+            )
+        except BaseException:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        self._responses = os.fdopen(read_fd, encoding="utf8")
+
+    def __enter__(self) -> "_SetupPyServer":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def run(self, args: Sequence[str]) -> int:
+        assert self._proc.stdin is not None
+        request = json.dumps({"args": list(args)}) + "\n"
+        self._proc.stdin.write(request.encode("utf8"))
+        self._proc.stdin.flush()
+        response = self._responses.readline()
+        if not response:
+            raise ChildProcessError("setup.py runner exited unexpectedly")
+        return json.loads(response)["returncode"]
+
+    def close(self):
+        if self._proc.stdin is not None:
+            with contextlib.suppress(OSError):
+                self._proc.stdin.close()
+        self._proc.wait()
+        self._responses.close()
+
+
 class ProjectSetupMixin(BaseProject):
     def setuppy(
-        self, env: BuildEnv, *args: str, check: bool = True
+        self,
+        env: BuildEnv,
+        *args: str,
+        check: bool = True,
+        jobs: Optional[int] = None,
+        object_cache: Optional[ObjectCache] = None,
+        warm: bool = False,
     ) -> subprocess.CompletedProcess:
-        cmd = [
-            os.fspath(env.interpreter),
-            *_get_setuppy_args(self.root),
-            *args,
+        """Run setup.py with arguments.
+
+        :param jobs: Maximum number of compiler processes to run in parallel.
+            If more than one, setup.py is run through a wrapper that compiles
+            sources (across all extensions) concurrently.
+        :param object_cache: Cache to restore compiled objects from, and
+            store them to. The cache is trimmed after the run.
+        :param warm: Keep a runner process with Setuptools imported in the
+            environment, and run setup.py from it. This makes subsequent
+            calls with the same ``jobs`` and ``object_cache`` faster. Only
+            supported where ``os.fork()`` is available.
+        """
+        with span("setup.py", args=list(args)):
+            return self._run_setuppy(
+                env, args, check, jobs, object_cache, warm
+            )
+
+    def _run_setuppy(
+        self,
+        env: BuildEnv,
+        args: Sequence[str],
+        check: bool,
+        jobs: Optional[int],
+        object_cache: Optional[ObjectCache],
+        warm: bool,
+    ) -> subprocess.CompletedProcess:
+        args = [*_get_setuppy_args(self.root), *args]
+        warm = warm and hasattr(os, "fork")
+        if not warm and (jobs is None or jobs < 2) and object_cache is None:
+            cmd = [os.fspath(env.interpreter), *args]
+            return subprocess.run(cmd, cwd=self.root, check=check)
+
+        environ = {**os.environ, "SETL_BUILD_JOBS": str(jobs or 1)}
+        if object_cache is None:
+            return self._run_runner(env, args, environ, check, warm)
+
+        with contextlib.ExitStack() as stack:
+            # A warm runner reads the environment only once, so the path
+            # needs to stay the same across runs.
+            if warm:
+                td = env.get_resource(
+                    "setuppy-stats", tempfile.TemporaryDirectory
+                )
+            else:
+                td = stack.enter_context(tempfile.TemporaryDirectory())
+            stats_path = pathlib.Path(td, "stats.json")
+            environ.update(object_cache.get_environ(stats_path))
+            try:
+                return self._run_runner(env, args, environ, check, warm)
+            finally:
+                stats = read_json(stats_path)
+                with contextlib.suppress(FileNotFoundError):
+                    stats_path.unlink()
+                if stats:
+                    object_cache.report(stats)
+                object_cache.trim()
+
+    def _run_runner(
+        self,
+        env: BuildEnv,
+        args: Sequence[str],
+        environ: Dict[str, str],
+        check: bool,
+        warm: bool,
+    ) -> subprocess.CompletedProcess:
+        cmd = [os.fspath(env.interpreter), os.fspath(_RUNNER_PATH), *args]
+        if not warm:
+            return subprocess.run(cmd, cwd=self.root, env=environ, check=check)
+
+        key = "setuppy-server:{}:{}".format(
+            environ["SETL_BUILD_JOBS"],
+            environ.get("SETL_OBJECT_CACHE_DIR", ""),
+        )
+        server = env.get_resource(
+            key, lambda: _SetupPyServer(env.interpreter, self.root, environ)
+        )
+        returncode = server.run(args)
+        result: subprocess.CompletedProcess = subprocess.CompletedProcess(
+            cmd, returncode
+        )
+        if check:
+            result.check_returncode()
+        return result
+
+    def create_watcher(self, poll_interval: Optional[float]) -> Watcher:
+        """Watch the project's source tree for changes.
+
+        :param poll_interval: Poll for changes at this interval (in seconds),
+            instead of being notified by the OS.
+        """
+        return create_watcher(self.root, poll_interval)
+
+    def get_object_cache(self, env: BuildEnv, max_size: int) -> ObjectCache:
+        """Get the compiled object cache for the environment's interpreter.
+        """
+        quintuplet = probe_interpreter(env.interpreter).quintuplet
+        return get_object_cache(quintuplet, max_size)
+
+    def _get_fingerprint_dir(self, env: BuildEnv) -> pathlib.Path:
+        # The environment may be shared, so fingerprints are keyed by project.
+        key = hashlib.sha256(os.fspath(self.root).encode("utf8"))
+        return env.root.joinpath("setl-fingerprints", key.hexdigest()[:16])
+
+    def get_build_fingerprint(self, env: BuildEnv) -> Dict[str, Any]:
+        """State of the sources and build settings.
+
+        This covers source files (sizes and modification times), compiler-
+        related environment variables, and the interpreter. Take it before
+        running commands, so changes made while they run are not recorded as
+        built.
+        """
+        files = iter_source_files(self.root)
+        return {
+            "quintuplet": probe_interpreter(env.interpreter).quintuplet,
+            "interpreter": os.fspath(env.interpreter),
+            "variables": {k: os.environ.get(k) for k in _COMPILER_VARIABLES},
+            "files": get_stat_digest(self.root, files),
+        }
+
+    def _has_outputs(self, env: BuildEnv, command: str) -> bool:
+        patterns = _COMMAND_OUTPUTS.get(command)
+        if patterns is None:  # We don't know; assume it's not.
+            return False
+        base = env.build_dir or self.root
+        return any(next(base.glob(p), None) for p in patterns)
+
+    @contextlib.contextmanager
+    def isolate_build_dirs(self, env: BuildEnv) -> Iterator[None]:
+        """Build into directories of the environment's own.
+
+        Setuptools builds into ``build`` and writes egg-info into the project,
+        so builds against different interpreters would overwrite each other's
+        files if run at the same time. Within the context, both are redirected
+        into ``build/setl-isolated-build/<quintuplet>`` with
+        ``DIST_EXTRA_CONFIG`` instead. Setuptools older than 65.4 does not read
+        it, so builds hold a lock in the project instead, and wait for each
+        other.
+
+        Build requirements need to be installed before calling this.
+        """
+        if not _supports_extra_config(env):
+            lock = f"{_ISOLATED_BUILD_DIR_NAME}.lock"
+            with file_lock(self.root.joinpath("build", lock)):
+                yield
+            return
+
+        container = self.root.joinpath(
+            "build", _ISOLATED_BUILD_DIR_NAME, env.root.name
+        )
+        container.mkdir(parents=True, exist_ok=True)
+        config = container.joinpath("setup.cfg")
+        config.write_text(
+            f"[build]\nbuild_base = {container.joinpath('build')}\n\n"
+            f"[egg_info]\negg_base = {container}\n"
+        )
+        previous = os.environ.get("DIST_EXTRA_CONFIG")
+        os.environ["DIST_EXTRA_CONFIG"] = os.fspath(config)
+        env.build_dir = container
+        try:
+            yield
+        finally:
+            env.build_dir = None
+            if previous is None:
+                os.environ.pop("DIST_EXTRA_CONFIG", None)
+            else:
+                os.environ["DIST_EXTRA_CONFIG"] = previous
+
+    def get_outdated_commands(
+        self,
+        env: BuildEnv,
+        commands: Sequence[str],
+        fingerprint: Dict[str, Any],
+    ) -> List[str]:
+        """Find setup.py commands that need to be run again.
+
+        A command is up-to-date if it was recorded with `record_commands()`
+        with the same fingerprint (from `get_build_fingerprint()`), and its
+        outputs still exist.
+        """
+        container = self._get_fingerprint_dir(env)
+        return [
+            command
+            for command in commands
+            if read_json(container.joinpath(f"{command}.json")) != fingerprint
+            or not self._has_outputs(env, command)
         ]
-        return subprocess.run(cmd, cwd=self.root, check=check)
+
+    def record_commands(
+        self,
+        env: BuildEnv,
+        commands: Sequence[str],
+        fingerprint: Dict[str, Any],
+    ):
+        """Record setup.py commands as up-to-date with the fingerprint.
+
+        :param fingerprint: From `get_build_fingerprint()`, taken before the
+            commands were run.
+        """
+        container = self._get_fingerprint_dir(env)
+        for command in commands:
+            write_json(container.joinpath(f"{command}.json"), fingerprint)
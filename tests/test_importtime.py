@@ -0,0 +1,41 @@
+"""Setl's CLI should start up quickly.
+
+The checks are shared with ``benchmarks/importtime.py``.
+"""
+
+import importlib.util
+import pathlib
+
+import pytest
+
+
+def _load_benchmark():
+    path = (
+        pathlib.Path(__file__)
+        .resolve()
+        .parent.parent.joinpath("benchmarks", "importtime.py")
+    )
+    spec = importlib.util.spec_from_file_location("importtime", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)  # type: ignore
+    return module
+
+
+importtime = _load_benchmark()
+
+RUNS = 5
+
+
+@pytest.fixture(scope="module")
+def results():
+    return [importtime.run_import() for _ in range(RUNS)]
+
+
+def test_import_time_within_budget(results):
+    best = min(importtime.get_import_time(r) for r in results)
+    assert best <= importtime.BUDGET, f"setl.cmds imported in {best:.1f}ms"
+
+
+@pytest.mark.parametrize("name", importtime.DEFERRED_MODULES)
+def test_deferred_module_not_imported(results, name):
+    assert not importtime.is_imported(results[0], name)
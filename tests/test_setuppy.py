@@ -0,0 +1,90 @@
+import json
+import os
+import pathlib
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+
+RUNNER = (
+    pathlib.Path(__file__)
+    .resolve()
+    .parent.parent.joinpath("src", "setl", "projects", "_setuppy.py")
+)
+
+# Runs the compiler, recording how many are running at the same time.
+_CC_WRAPPER = """
+import fcntl, json, subprocess, sys, time
+
+def update(delta):
+    with open(sys.argv[1], "r+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        running, peak = json.load(f)
+        running += delta
+        f.seek(0)
+        f.truncate()
+        json.dump([running, max(running, peak)], f)
+
+update(1)
+try:
+    time.sleep(0.2)
+    returncode = subprocess.call(sys.argv[2:])
+finally:
+    update(-1)
+sys.exit(returncode)
+"""
+
+_SETUP_PY = """
+from setuptools import Extension, setup
+
+setup(
+    name="demo",
+    version="0.1",
+    ext_modules=[
+        Extension(m, [f"{m}_{i}.c" for i in range(3)]) for m in "abc"
+    ],
+)
+"""
+
+_SOURCE = """
+#include <Python.h>
+int {name}(void) {{ return 0; }}
+"""
+
+
+@pytest.fixture()
+def project(tmp_path):
+    for m in "abc":
+        for i in range(3):
+            source = _SOURCE.format(name=f"{m}_{i}")
+            tmp_path.joinpath(f"{m}_{i}.c").write_text(source)
+    tmp_path.joinpath("setup.py").write_text(_SETUP_PY)
+    return tmp_path
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="needs a Unix compiler")
+@pytest.mark.skipif(not shutil.which("cc"), reason="needs a C compiler")
+@pytest.mark.parametrize("jobs", [2, 3])
+def test_build_jobs_limit_concurrent_compilers(project, tmp_path, jobs):
+    wrapper = tmp_path.joinpath("cc.py")
+    wrapper.write_text(_CC_WRAPPER)
+    state = tmp_path.joinpath("state.json")
+    state.write_text("[0, 0]")
+
+    environ = os.environ.copy()
+    environ["CC"] = f"{sys.executable} {wrapper} {state} cc"
+    environ["SETL_BUILD_JOBS"] = str(jobs)
+    subprocess.run(
+        [sys.executable, os.fspath(RUNNER), "setup.py", "build_ext"],
+        cwd=project,
+        env=environ,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        check=True,
+    )
+
+    running, peak = json.loads(state.read_text())
+    assert running == 0
+    assert peak == jobs
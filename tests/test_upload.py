@@ -0,0 +1,148 @@
+import hashlib
+import http.server
+import json
+import threading
+import urllib.parse
+import zipfile
+
+import pytest
+
+from setl.cmds import _upload
+from setl.cmds._upload import UploadFailed, upload
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urllib.parse.urlsplit(self.path).path
+        parts = [p for p in path.split("/") if p]
+        if len(parts) != 2 or parts[0] != "simple":
+            self._send(404, "text/plain", b"Not Found")
+            return
+        files = [
+            {"filename": name, "url": name, "hashes": {"sha256": digest}}
+            for name, digest in self.server.existing.items()
+        ]
+        body = json.dumps({"meta": {"api-version": "1.0"}, "files": files})
+        self._send(200, _upload._SIMPLE_JSON, body.encode("utf-8"))
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.posts += 1
+            status = (
+                self.server.statuses.pop(0) if self.server.statuses else 200
+            )
+        self._send(status, "text/plain", b"Error" if status >= 400 else b"OK")
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.lock = threading.Lock()
+        self.existing = {}  # Filename to SHA256 digest, served in the index.
+        self.statuses = []  # Responses to send to uploads, in order.
+        self.posts = 0
+
+
+@pytest.fixture()
+def server(monkeypatch):
+    monkeypatch.setenv("TWINE_USERNAME", "user")
+    monkeypatch.setenv("TWINE_PASSWORD", "password")
+    server = _Server()
+    thread = threading.Thread(
+        target=server.serve_forever, args=(0.01,), daemon=True
+    )
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(_upload.time, "sleep", sleeps.append)
+    return sleeps
+
+
+@pytest.fixture()
+def wheel(tmp_path):
+    path = tmp_path.joinpath("demo-0.1-py3-none-any.whl")
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("demo.py", "")
+        zf.writestr(
+            "demo-0.1.dist-info/METADATA",
+            "Metadata-Version: 2.1\nName: demo\nVersion: 0.1\n",
+        )
+        zf.writestr(
+            "demo-0.1.dist-info/WHEEL",
+            "Wheel-Version: 1.0\nRoot-Is-Purelib: true\nTag: py3-none-any\n",
+        )
+        zf.writestr("demo-0.1.dist-info/RECORD", "")
+    return path
+
+
+def _upload_to(server, targets, **kwargs):
+    host, port = server.server_address[:2]
+    url = f"http://{host}:{port}/legacy/"
+    upload(targets, None, url, jobs=2, backoff=0.5, **kwargs)
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_retry_with_backoff(server, sleeps, wheel, status):
+    server.statuses = [status, status]
+    _upload_to(server, [wheel])
+    assert server.posts == 3
+    assert sleeps == [0.5, 1.0]
+
+
+def test_retry_gives_up(server, sleeps, wheel):
+    server.statuses = [503] * 3
+    with pytest.raises(UploadFailed) as ctx:
+        _upload_to(server, [wheel], retries=2)
+    assert server.posts == 3
+    assert sleeps == [0.5, 1.0]
+    [(target, message)] = ctx.value.failures
+    assert target == wheel
+    assert message.startswith("503")
+
+
+def test_client_error_not_retried(server, sleeps, wheel):
+    server.statuses = [400]
+    with pytest.raises(UploadFailed) as ctx:
+        _upload_to(server, [wheel])
+    assert server.posts == 1
+    assert sleeps == []
+    [(_, message)] = ctx.value.failures
+    assert message.startswith("400")
+
+
+def test_skip_uploaded(server, sleeps, wheel):
+    digest = hashlib.sha256(wheel.read_bytes()).hexdigest()
+    server.existing = {wheel.name: digest}
+    _upload_to(server, [wheel])
+    assert server.posts == 0
+
+
+def test_fail_on_digest_mismatch(server, sleeps, wheel):
+    server.existing = {wheel.name: "0" * 64}
+    with pytest.raises(UploadFailed) as ctx:
+        _upload_to(server, [wheel])
+    assert server.posts == 0
+    [(target, message)] = ctx.value.failures
+    assert target == wheel
+    assert "different file" in message